@@ -3,23 +3,35 @@ import io
 import os
 import sys
 
+import threading
+
 import gradio as gr
-import chromadb
-from langchain.document_loaders import DirectoryLoader
-from langchain.embeddings import OpenAIEmbeddings, HuggingFaceEmbeddings
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.vectorstores.chroma import Chroma
+from Rainbow_utils.lazy_import import lazy_import
+
+# chromadb 延迟到首次使用时导入，langchain 相关内容在各方法内导入
+chromadb = lazy_import("chromadb")
 
 
 class ChromaDBGradioUI:
     def __init__(self):
         self.path = ".chromadb/"
         self.persist_directory = self.path
-        self.client = chromadb.PersistentClient(path=self.path)
-        self.collections = self.client.list_collections()
+        # chromadb 客户端在页面加载或首次操作时创建
+        self.client = None
+        self.collections = []
+        self.client_lock = threading.Lock()
         self.docsearch_db = None
         self.create_interface()
 
+    def warm_up(self):
+        """
+        Create the chromadb client once and load the collection list.
+        """
+        with self.client_lock:
+            if self.client is None:
+                self.client = chromadb.PersistentClient(path=self.path)
+                self.collections = self.client.list_collections()
+
     def create_interface(self):
         with gr.Blocks() as self.interface:
             # 使用行和列来组织布局
@@ -65,11 +77,18 @@ class ChromaDBGradioUI:
                                 outputs=[self.log_text]
                                 )
 
-        # 初始显示集合信息
-        self.update_collection_info()
+            # 页面加载时再读取集合信息
+            self.interface.load(fn=self.refresh_collections, inputs=None,
+                                outputs=[self.collection_info_text, self.collections_combo])
 
     def create_new_collection(self, new_collection_name, Embedding_Model_select, input_chunk_size, uploaded_files,
                               intput_chunk_overlap):
+        from langchain.document_loaders import DirectoryLoader
+        from langchain.embeddings import OpenAIEmbeddings, HuggingFaceEmbeddings
+        from langchain.text_splitter import CharacterTextSplitter
+        from langchain.vectorstores.chroma import Chroma
+
+        self.warm_up()
         response = f"{Embedding_Model_select} 模型加载中....."
         print(response)
         for i in range(0, len(response), int(3)):
@@ -186,12 +205,14 @@ class ChromaDBGradioUI:
         return "\n".join([collection.name for collection in self.collections])
 
     def refresh_collections(self):
+        self.warm_up()
         # 刷新集合列表
         self.collections = self.client.list_collections()
         updated_info = "\n".join([collection.name for collection in self.collections])
         return updated_info, gr.Dropdown.update(choices=[collection.name for collection in self.collections])
 
     def delete_collection(self, collection_name):
+        self.warm_up()
         try:
             # Ensure a valid collection name is selected
             if collection_name == "...":
@@ -218,6 +239,7 @@ class ChromaDBGradioUI:
             choices=[collection.name for collection in self.collections])
 
     def update_collections(self):
+        self.warm_up()
         # 更新集合列表
         self.collections = self.client.list_collections()
         updated_info = "\n".join([collection.name for collection in self.collections])
@@ -1,4 +1,7 @@
+import threading
+import time
 import gradio as gr
+from loguru import logger
 import RainbowKnowledge_Agent
 import RainbowSQL_Agent
 import RainbowStock_Analysis
@@ -8,10 +11,16 @@ from Rainbow_utils.set_csv_2_MySQL_uploader import CSVToMySQLUploader
 
 seafoam = Seafoam()
 
-RainbowKnowledge_Agent = RainbowKnowledge_Agent.RainbowKnowledge_Agent().launch()
-RainbowSQL_Agent = RainbowSQL_Agent.RainbowSQLAgent().launch()
-RainbowStock_Analysis = RainbowStock_Analysis.RainbowStock_Analysis().launch()
-ChromaDBGradioUI = RainbowChromadb_Option.ChromaDBGradioUI().launch()
+# 各模块只构建界面，重量级后端（langchain、chromadb、akshare 等）在首次交互或端口绑定后的后台预热中初始化
+RainbowKnowledge_Agent_backend = RainbowKnowledge_Agent.RainbowKnowledge_Agent()
+RainbowSQL_Agent_backend = RainbowSQL_Agent.RainbowSQLAgent()
+RainbowStock_Analysis_backend = RainbowStock_Analysis.RainbowStock_Analysis()
+ChromaDBGradioUI_backend = RainbowChromadb_Option.ChromaDBGradioUI()
+
+RainbowKnowledge_Agent = RainbowKnowledge_Agent_backend.launch()
+RainbowSQL_Agent = RainbowSQL_Agent_backend.launch()
+RainbowStock_Analysis = RainbowStock_Analysis_backend.launch()
+ChromaDBGradioUI = ChromaDBGradioUI_backend.launch()
 CSVToMySQLUploader = CSVToMySQLUploader().launch()
 
 RainbowGPT_TabbedInterface = gr.TabbedInterface(
@@ -23,5 +32,23 @@ RainbowGPT_TabbedInterface = gr.TabbedInterface(
      "Rainbow-Stock-Analysis"]
     , theme=seafoam)
 
+
+def warm_up_backends():
+    """
+    Initialize every tab backend in the background once the server is listening.
+    """
+    for backend in [RainbowKnowledge_Agent_backend, ChromaDBGradioUI_backend,
+                    RainbowSQL_Agent_backend, RainbowStock_Analysis_backend]:
+        start_time = time.monotonic()
+        try:
+            backend.warm_up()
+            logger.info(f"{type(backend).__name__} warmed up in {time.monotonic() - start_time:.2f}s")
+        except Exception as e:
+            # 预热失败不影响服务，首次交互时会再次尝试初始化
+            logger.warning(f"{type(backend).__name__} warm up failed: {e}")
+
+
 if __name__ == "__main__":
-    RainbowGPT_TabbedInterface.queue().launch()
+    RainbowGPT_TabbedInterface.queue().launch(prevent_thread_lock=True)
+    threading.Thread(target=warm_up_backends, name="backend-warm-up", daemon=True).start()
+    RainbowGPT_TabbedInterface.block_thread()
@@ -1,45 +1,21 @@
-import queue
 import threading
-import chromadb
-import openai
 import time
 import os
 from dotenv import load_dotenv
 import gradio as gr
 from loguru import logger
-# 导入 langchain 模块的相关内容
-from langchain.retrievers.document_compressors import EmbeddingsFilter, DocumentCompressorPipeline
-from langchain.agents import load_tools, ZeroShotAgent
-from langchain.callbacks import FileCallbackHandler
-from langchain.chains import LLMChain
-from langchain.document_transformers import EmbeddingsRedundantFilter
-from langchain.embeddings import OpenAIEmbeddings, HuggingFaceEmbeddings
-from langchain.prompts import PromptTemplate
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.tools import Tool
-from langchain.vectorstores import Chroma
-from langchain.memory import ConversationBufferMemory
-from langchain.retrievers import (
-    ContextualCompressionRetriever,
-    BM25Retriever,
-    EnsembleRetriever
-)
-from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.tools.render import format_tool_to_openai_function
-from langchain.agents.format_scratchpad import format_to_openai_function_messages
-from langchain.agents.output_parsers import OpenAIFunctionsAgentOutputParser
-from langchain import hub
-from langchain.agents.format_scratchpad import format_log_to_str
-from langchain.agents.output_parsers import ReActJsonSingleInputOutputParser
-from langchain.tools.render import render_text_description
-from langchain.agents import AgentExecutor
-from langchain.chat_models import ChatOpenAI
 # Rainbow_utils
 from Rainbow_utils.get_tokens_cal_filter import filter_chinese_english_punctuation, num_tokens_from_string, \
     truncate_string_to_max_tokens, concatenate_if_dissimilar
 from Rainbow_utils import get_google_result
 from Rainbow_utils import get_prompt_templates
-from Rainbow_utils.image_genearation import ImageGen
+from Rainbow_utils.task_graph_executor import TaskGraphExecutor
+from Rainbow_utils.chunk_dedup import deduplicate_documents
+from Rainbow_utils.lazy_import import lazy_import
+
+# 重量级依赖延迟到首次使用时再导入，langchain 相关内容在各方法内导入
+chromadb = lazy_import("chromadb")
+openai = lazy_import("openai")
 
 
 class RainbowKnowledge_Agent:
@@ -56,9 +32,12 @@ class RainbowKnowledge_Agent:
         self.script_name = os.path.basename(__file__)
         self.logfile = "./logs/" + self.script_name + ".log"
         logger.add(self.logfile, colorize=True, enqueue=True)
-        self.handler = FileCallbackHandler(self.logfile)
+        self.handler = None
         self.persist_directory = ".chromadb/"
-        self.client = chromadb.PersistentClient(path=self.persist_directory)
+        self.client = None
+        # 后端（chromadb 客户端、langchain 对象）在首次交互或端口绑定后的后台预热中初始化
+        self.backend_ready = False
+        self.backend_lock = threading.Lock()
         self.collection_name_select_global = None
         # local private llm name
         self.local_private_llm_name_global = None
@@ -91,14 +70,40 @@ class RainbowKnowledge_Agent:
         #     "extra_prompt_messages": [MessagesPlaceholder(variable_name="memory")],
         # }
         # self.memory = ConversationBufferMemory(memory_key="memory", return_messages=True)
-        self.memory = ConversationBufferMemory(memory_key="chat_history")
+        self.memory = None
 
         self.Google_Search_tool = None
+        # Google 搜索工具的整体延迟预算及各分支超时（秒）
+        self.google_search_latency_budget = 30
+        self.google_answer_box_timeout = 20
+        self.google_custom_search_timeout = 10
+        self.google_page_fetch_timeout = 15
         self.Local_Search_tool = None
         self.llm_Agent_checkbox_group = None
         self.intermediate_steps_log = ""
 
+    def warm_up(self):
+        """
+        Initialize the heavy backend once: langchain, the chromadb client and the agent memory.
+        """
+        with self.backend_lock:
+            if self.backend_ready:
+                return
+            from langchain.callbacks import FileCallbackHandler
+            from langchain.memory import ConversationBufferMemory
+            self.handler = FileCallbackHandler(self.logfile)
+            self.client = chromadb.PersistentClient(path=self.persist_directory)
+            self.memory = ConversationBufferMemory(memory_key="chat_history")
+            self.backend_ready = True
+
     def ask_local_vector_db(self, question):
+        from langchain.chains import LLMChain
+        from langchain.chat_models import ChatOpenAI
+        from langchain.prompts import PromptTemplate
+        from langchain.retrievers import ContextualCompressionRetriever, BM25Retriever, EnsembleRetriever
+        from langchain.retrievers.document_compressors import EmbeddingsFilter, DocumentCompressorPipeline
+        from langchain.text_splitter import CharacterTextSplitter
+
         if self.llm_name_global == "Private-LLM-Model":
             llm = ChatOpenAI(
                 model_name=self.local_private_llm_name_global,
@@ -129,12 +134,11 @@ class RainbowKnowledge_Agent:
             # 将稀疏检索器（如 BM25）与密集检索器（如嵌入相似性）相结合
             chroma_retriever = self.docsearch_db.as_retriever(search_kwargs={"k": 30})
 
-            # 将压缩器和文档转换器串在一起
+            # 将压缩器和文档转换器串在一起，去重统一在检索结果合并后进行
             splitter = CharacterTextSplitter(chunk_size=300, chunk_overlap=0, separator=". ")
-            redundant_filter = EmbeddingsRedundantFilter(embeddings=self.embeddings)
             relevant_filter = EmbeddingsFilter(embeddings=self.embeddings, similarity_threshold=0.76)
             pipeline_compressor = DocumentCompressorPipeline(
-                transformers=[splitter, redundant_filter, relevant_filter]
+                transformers=[splitter, relevant_filter]
             )
             compression_retriever = ContextualCompressionRetriever(base_compressor=pipeline_compressor,
                                                                    base_retriever=chroma_retriever)
@@ -143,7 +147,8 @@ class RainbowKnowledge_Agent:
             the_collection = self.client.get_collection(name=self.collection_name_select_global)
             the_metadata = the_collection.get()
             the_doc_llist = the_metadata['documents']
-            bm25_retriever = BM25Retriever.from_texts(the_doc_llist)
+            bm25_retriever = BM25Retriever.from_texts(the_doc_llist,
+                                                      metadatas=[m or {} for m in the_metadata['metadatas']])
             bm25_retriever.k = 30
 
             # 设置最大尝试次数
@@ -180,7 +185,8 @@ class RainbowKnowledge_Agent:
             the_collection = self.client.get_collection(name=self.collection_name_select_global)
             the_metadata = the_collection.get()
             the_doc_llist = the_metadata['documents']
-            bm25_retriever = BM25Retriever.from_texts(the_doc_llist)
+            bm25_retriever = BM25Retriever.from_texts(the_doc_llist,
+                                                      metadatas=[m or {} for m in the_metadata['metadatas']])
             bm25_retriever.k = 30
 
             # 初始化 ensemble 检索器
@@ -189,6 +195,9 @@ class RainbowKnowledge_Agent:
             )
             docs = ensemble_retriever.get_relevant_documents(question)
 
+        if docs:
+            docs = self.deduplicate_retrieved_docs(docs, the_collection, the_metadata)
+
         cleaned_matches = []
         total_toknes = 0
         last_index = 0
@@ -211,7 +220,23 @@ class RainbowKnowledge_Agent:
                                      human_input_first=self.human_input_global)
         return answer
 
+    def deduplicate_retrieved_docs(self, docs, the_collection, the_metadata):
+        # 用 chromadb 中已存储的向量做余弦去重，合并同一来源的重叠块，大批量时退化为 MinHash
+        doc_ids = dict(zip(the_metadata['documents'], the_metadata['ids']))
+        candidate_ids = [doc_ids.get(doc.page_content) for doc in docs]
+        known_ids = list(dict.fromkeys(doc_id for doc_id in candidate_ids if doc_id is not None))
+        embeddings = None
+        if known_ids:
+            stored = the_collection.get(ids=known_ids, include=["embeddings"])
+            id_to_embedding = dict(zip(stored['ids'], stored['embeddings']))
+            embeddings = [id_to_embedding.get(doc_id) for doc_id in candidate_ids]
+        deduplicated_docs = deduplicate_documents(docs, embeddings=embeddings)
+        print("检索结果去重: ", len(docs), " -> ", len(deduplicated_docs), " 个知识库文档块")
+        return deduplicated_docs
+
     def createImageByBing(self, input):
+        from Rainbow_utils.image_genearation import ImageGen
+
         auth_cooker = os.getenv('BINGCOKKIE')
         sync_gen = ImageGen(auth_cookie=auth_cooker)
         image_list = sync_gen.get_images(input)
@@ -224,41 +249,33 @@ class RainbowKnowledge_Agent:
                     response.append(url)
             return response
 
-    def get_google_answer(self, question, result_queue):
+    def get_google_answer(self, question):
         google_answer_box = get_google_result.selenium_google_answer_box(
             question, "Rainbow_utils/chromedriver.exe")
         # 使用正则表达式保留中文、英文和标点符号
-        google_answer_box = filter_chinese_english_punctuation(google_answer_box)
-        result_queue.put(("google_answer_box", google_answer_box))
+        return filter_chinese_english_punctuation(google_answer_box)
 
-    def process_data_title_summary(self, data_title_Summary, result_queue):
-        data_title_Summary_str = ''.join(data_title_Summary)
-        result_queue.put(("data_title_Summary_str", data_title_Summary_str))
+    def process_data_title_summary(self, custom_search_result):
+        _, data_title_Summary = custom_search_result
+        return ''.join(data_title_Summary)
 
-    def process_custom_search_link(self, custom_search_link, result_queue):
+    def process_custom_search_link(self, custom_search_result):
+        custom_search_link, _ = custom_search_result
         link_detail_res = []
         for link in custom_search_link[:1]:
-            website_content = get_google_result.get_website_content(link)
+            website_content = get_google_result.get_website_main_content(
+                link, max_tokens=self.local_data_embedding_token_max_global)
             if website_content:
                 link_detail_res.append(website_content)
 
         link_detail_string = '\n'.join(link_detail_res)
-        link_detail_string = filter_chinese_english_punctuation(link_detail_string)
-        result_queue.put(("link_detail_string", link_detail_string))
-
-    def custom_search_and_fetch_content(self, question, result_queue):
-        custom_search_link, data_title_Summary = get_google_result.google_custom_search(question)
-
-        # 创建新的线程来处理 data_title_Summary 和 custom_search_link
-        thread3 = threading.Thread(target=self.process_data_title_summary, args=(data_title_Summary, result_queue))
-        thread4 = threading.Thread(target=self.process_custom_search_link, args=(custom_search_link, result_queue))
-
-        thread3.start()
-        thread4.start()
-        thread3.join()
-        thread4.join()
+        return filter_chinese_english_punctuation(link_detail_string)
 
     def Google_Search_run(self, question):
+        from langchain.chains import LLMChain
+        from langchain.chat_models import ChatOpenAI
+        from langchain.prompts import PromptTemplate
+
         # get_google_result.set_global_proxy(self.proxy_url_global)
 
         if self.llm_name_global == "Private-LLM-Model":
@@ -283,30 +300,21 @@ class RainbowKnowledge_Agent:
             # return_final_only=True,  # 指示是否仅返回最终解析的结果
         )
 
-        # 创建一个队列来存储线程结果
-        results_queue = queue.Queue()
-        # 创建并启动线程
-        thread1 = threading.Thread(target=self.get_google_answer, args=(question, results_queue))
-        thread2 = threading.Thread(target=self.custom_search_and_fetch_content, args=(question, results_queue))
-        thread1.start()
-        thread2.start()
-        thread1.join()
-        thread2.join()
-
-        # 初始化变量
-        google_answer_box = ""
-        data_title_Summary_str = ""
-        link_detail_string = ""
-
-        # 提取并分配结果
-        while not results_queue.empty():
-            result_type, result = results_queue.get()
-            if result_type == "google_answer_box":
-                google_answer_box = result
-            elif result_type == "data_title_Summary_str":
-                data_title_Summary_str = result
-            elif result_type == "link_detail_string":
-                link_detail_string = result
+        # 答案框、CSE 搜索、网页抓取三个分支各自限时，整体受延迟预算约束，超时的分支以空结果参与合并
+        search_graph = TaskGraphExecutor(name="Google_Search", total_timeout=self.google_search_latency_budget)
+        search_graph.add_task("google_answer_box", lambda: self.get_google_answer(question),
+                              timeout=self.google_answer_box_timeout, default="")
+        search_graph.add_task("custom_search", lambda: get_google_result.google_custom_search(question),
+                              timeout=self.google_custom_search_timeout, default=([], []))
+        search_graph.add_task("data_title_Summary_str", self.process_data_title_summary, deps=["custom_search"],
+                              default="")
+        search_graph.add_task("link_detail_string", self.process_custom_search_link, deps=["custom_search"],
+                              timeout=self.google_page_fetch_timeout, default="")
+        results = search_graph.run()
+
+        google_answer_box = results["google_answer_box"]
+        data_title_Summary_str = results["data_title_Summary_str"]
+        link_detail_string = results["link_detail_string"]
 
         finally_combined_text = f"""
         当前关键字搜索的答案框数据：
@@ -335,6 +343,20 @@ class RainbowKnowledge_Agent:
              Embedding_Model_select,
              local_data_embedding_token_max, local_private_llm_api, local_private_llm_key,
              local_private_llm_name, llm_Agent_checkbox_group):
+        from langchain import hub
+        from langchain.agents import load_tools, ZeroShotAgent, AgentExecutor
+        from langchain.agents.format_scratchpad import format_to_openai_function_messages, format_log_to_str
+        from langchain.agents.output_parsers import OpenAIFunctionsAgentOutputParser, \
+            ReActJsonSingleInputOutputParser
+        from langchain.chains import LLMChain
+        from langchain.chat_models import ChatOpenAI
+        from langchain.embeddings import OpenAIEmbeddings, HuggingFaceEmbeddings
+        from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+        from langchain.tools import Tool
+        from langchain.tools.render import format_tool_to_openai_function, render_text_description
+        from langchain.vectorstores import Chroma
+
+        self.warm_up()
         self.human_input_global = message
         self.local_private_llm_name_global = str(local_private_llm_name)
         self.local_private_llm_api_global = str(local_private_llm_api)
@@ -584,6 +606,7 @@ class RainbowKnowledge_Agent:
             logger.info(response)
 
     def update_collection_name(self):
+        self.warm_up()
         # 获取已存在的collection的名称列表
         collections = self.client.list_collections()
         collection_name_choices = []
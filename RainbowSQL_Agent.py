@@ -1,18 +1,21 @@
 import os
+import threading
 from dotenv import load_dotenv
 import gradio as gr
-# 导入 langchain 模块的相关内容
-from langchain.prompts import PromptTemplate, MessagesPlaceholder
-from langchain.chat_models import ChatOpenAI
-from langchain.memory import ConversationBufferMemory
-from sqlalchemy import create_engine
-# Rainbow_utils
-from langchain.utilities import SQLDatabase
-from langchain.agents import create_sql_agent
-from langchain.agents.agent_toolkits import SQLDatabaseToolkit
-from langchain.agents.agent_types import AgentType
 from loguru import logger
-from langchain.callbacks import FileCallbackHandler
+# langchain、sqlalchemy 等重量级依赖在首次使用时于各方法内导入
+
+# 表较多时只向代理提供检索到的相关表结构，省去列表/查看表结构的迭代
+RELEVANT_SCHEMA_PROMPT = """
+The tables relevant to the question are listed below with their schemas and sample rows.
+Write the query against them directly, there is no need to list the tables or look up their schemas first.
+
+"""
+RELEVANT_SCHEMA_SUFFIX = """Begin!
+
+Question: {input}
+Thought: The relevant table schemas are given above, I should write the query against them.
+{agent_scratchpad}"""
 
 
 class RainbowSQLAgent:
@@ -29,7 +32,7 @@ class RainbowSQLAgent:
         self.script_name = os.path.basename(__file__)
         self.logfile = "./logs/" + self.script_name + ".log"
         logger.add(self.logfile, colorize=True, enqueue=True)
-        self.handler = FileCallbackHandler(self.logfile)
+        self.handler = None
         self.local_private_llm_name_global = None
         self.local_private_llm_api_global = None
         self.local_private_llm_key_global = None
@@ -38,30 +41,74 @@ class RainbowSQLAgent:
         self.llm_name_global = None
         self.temperature_num_global = 0
         self.human_input_global = None
-        self.agent_kwargs = {
-            "extra_prompt_messages": [MessagesPlaceholder(variable_name="memory")],
-        }
-        self.memory = ConversationBufferMemory(memory_key="memory", return_messages=True)
+        self.agent_kwargs = None
+        self.memory = None
+        # 按连接 URI 复用的连接池与数据库结构缓存
+        self.sql_registry = None
+        self.sql_pool_size = int(os.getenv("RAINBOW_SQL_POOL_SIZE", "5"))
+        self.sql_schema_check_interval = float(os.getenv("RAINBOW_SQL_SCHEMA_CHECK_INTERVAL", "30"))
+        # 查询结果缓存：按规范化 SQL 与相关表的变更标记命中
+        self.sql_query_cache_ttl = float(os.getenv("RAINBOW_SQL_QUERY_CACHE_TTL", "600"))
+        self.sql_query_cache_mb = float(os.getenv("RAINBOW_SQL_QUERY_CACHE_MB", "32"))
+        # 查询保护：EXPLAIN 估算扫描行数上限、语句超时（毫秒）与返回结果的行数/大小上限
+        self.sql_max_rows_examined = float(os.getenv("RAINBOW_SQL_MAX_ROWS_EXAMINED", "1000000"))
+        self.sql_max_execution_time = int(os.getenv("RAINBOW_SQL_MAX_EXECUTION_TIME", "30000"))
+        self.sql_max_result_rows = int(os.getenv("RAINBOW_SQL_MAX_RESULT_ROWS", "100"))
+        self.sql_max_result_kb = int(os.getenv("RAINBOW_SQL_MAX_RESULT_KB", "16"))
+        # 相关表检索：表数超过 top_k 时启用
+        self.sql_schema_top_k = int(os.getenv("RAINBOW_SQL_SCHEMA_TOP_K", "8"))
+        self.sql_schema_embedding = os.getenv("RAINBOW_SQL_SCHEMA_EMBEDDING", "huggingface")
+        self.sql_schema_index_dir = "./data/sql_schema_index"
+        self.schema_embeddings = None
+        self.schema_indexes = {}
+        self.schema_index_lock = threading.Lock()
+        # 后端在首次交互或端口绑定后的后台预热中初始化
+        self.backend_ready = False
+        self.backend_lock = threading.Lock()
+
+    def warm_up(self):
+        """
+        Initialize the heavy backend once: langchain, sqlalchemy, the engine registry with its query
+        cache and guard, and the agent memory.
+        """
+        with self.backend_lock:
+            if self.backend_ready:
+                return
+            from langchain.callbacks import FileCallbackHandler
+            from langchain.memory import ConversationBufferMemory
+            from langchain.prompts import MessagesPlaceholder
+            from Rainbow_utils.sql_database_registry import SQLDatabaseRegistry
+            from Rainbow_utils.sql_query_cache import QueryResultCache
+            from Rainbow_utils.sql_query_guard import QueryGuard
+            query_cache = QueryResultCache(max_bytes=int(self.sql_query_cache_mb * 1024 * 1024),
+                                           ttl=self.sql_query_cache_ttl)
+            query_guard = QueryGuard(max_rows_examined=self.sql_max_rows_examined,
+                                     max_execution_time=self.sql_max_execution_time,
+                                     max_rows=self.sql_max_result_rows, max_bytes=self.sql_max_result_kb * 1024)
+            self.sql_registry = SQLDatabaseRegistry(pool_size=self.sql_pool_size,
+                                                    check_interval=self.sql_schema_check_interval,
+                                                    query_cache=query_cache, query_guard=query_guard)
+            self.handler = FileCallbackHandler(self.logfile)
+            self.agent_kwargs = {
+                "extra_prompt_messages": [MessagesPlaceholder(variable_name="memory")],
+            }
+            self.memory = ConversationBufferMemory(memory_key="memory", return_messages=True)
+            self.backend_ready = True
+
+    @staticmethod
+    def database_uri(host, username, password, db_name=""):
+        return f"mysql+pymysql://{username}:{password}@{host}/{db_name}"
 
     def get_database_tables(self, host, username, password):
-        try:
-            # 构建数据库连接字符串
-            connection_string = f"mysql+pymysql://{username}:{password}@{host}/"
-            # 创建数据库引擎
-            engine = create_engine(connection_string)
-            # 获取数据库连接
-            connection = engine.connect()
-            # 查询所有数据库
-            result = connection.execute("SHOW DATABASES")
-            # 获取查询结果
-            databases = [row[0] for row in result]
-            # # 打印数据库列表
-            # print("Databases:")
-            # for db in databases:
-            #     print(db)
-            # 关闭连接
-            connection.close()
+        from sqlalchemy import text
 
+        self.warm_up()
+        try:
+            # 复用该服务器的连接池
+            engine = self.sql_registry.engine(self.database_uri(host, username, password))
+            # 查询所有数据库，连接用完即归还连接池
+            with engine.connect() as connection:
+                databases = [row[0] for row in connection.execute(text("SHOW DATABASES"))]
             return databases
         except Exception as e:
             print(f"Error: {e}")
@@ -71,10 +118,57 @@ class RainbowSQLAgent:
     def update_tables_list(self, host, username, password):
         return gr.Dropdown.update(choices=self.get_database_tables(host, username, password))
 
+    def refresh_schema_cache(self, host, username, password, db_name):
+        """
+        Reflect the selected database again and drop its cached table info.
+        """
+        self.warm_up()
+        try:
+            db = self.sql_registry.database(self.database_uri(host, username, password, db_name), refresh=True)
+            return f"Schema cache refreshed: {len(db.get_usable_table_names())} tables"
+        except Exception as e:
+            logger.error(f"刷新数据库结构失败: {e}")
+            return f"Error: {e}"
+
+    def get_schema_embeddings(self):
+        from langchain.embeddings import HuggingFaceEmbeddings, OpenAIEmbeddings
+
+        if self.schema_embeddings is None:
+            if self.sql_schema_embedding == "openai":
+                self.schema_embeddings = OpenAIEmbeddings()
+            else:
+                self.schema_embeddings = HuggingFaceEmbeddings(cache_folder="models")
+        return self.schema_embeddings
+
+    def relevant_tables(self, uri, db, question):
+        """
+        Retrieve the tables relevant to question from the schema index of the database.
+
+        The index is built on first use and again whenever the registry reflected the schema
+        anew; embeddings of unchanged tables are reused from disk.
+        """
+        from Rainbow_utils.sql_schema_index import SchemaIndex
+
+        with self.schema_index_lock:
+            indexed_db, index = self.schema_indexes.get(uri, (None, None))
+            if indexed_db is not db:
+                index = SchemaIndex(self.get_schema_embeddings(),
+                                    os.path.join(self.sql_schema_index_dir, f"{self.sql_schema_embedding}.pkl"))
+                index.build(db)
+                self.schema_indexes[uri] = (db, index)
+        return index.search(question, self.sql_schema_top_k)
+
     def echo(self, message, history, llm_options_checkbox_group,
              local_private_llm_api,
              local_private_llm_key, local_private_llm_name, input_datatable_name,
              input_database_url, input_database_name, input_database_passwd):
+        from langchain.agents import create_sql_agent
+        from langchain.agents.agent_toolkits import SQLDatabaseToolkit
+        from langchain.agents.agent_toolkits.sql.prompt import SQL_PREFIX
+        from langchain.agents.agent_types import AgentType
+        from langchain.chat_models import ChatOpenAI
+
+        self.warm_up()
         print_speed_step = 10
         temperature_num_global = 0
 
@@ -103,9 +197,30 @@ class RainbowSQLAgent:
             return
 
         db_name = input_datatable_name
-        # 创建数据库连接
-        db = SQLDatabase.from_uri(
-            f"mysql+pymysql://{input_database_name}:{input_database_passwd}@{input_database_url}/{db_name}")
+        # 复用已反射的数据库结构与连接池
+        uri = self.database_uri(input_database_url, input_database_name, input_database_passwd, db_name)
+        try:
+            db = self.sql_registry.database(uri)
+        except Exception as e:
+            yield f"发生错误：{str(e)}"
+            return
+
+        # 表较多时只把检索到的相关表结构直接写入提示词
+        prompt_kwargs = {}
+        if len(db.get_usable_table_names()) > self.sql_schema_top_k:
+            from Rainbow_utils.get_tokens_cal_filter import num_tokens_from_string
+
+            try:
+                tables = self.relevant_tables(uri, db, message)
+                db = db.scoped(tables)
+                # 前缀会经过两次 format，表结构中的花括号需双重转义
+                schema = db.get_table_info(tables).replace("{", "{{{{").replace("}", "}}}}")
+                prompt_kwargs = {"prefix": SQL_PREFIX + RELEVANT_SCHEMA_PROMPT + schema + "\n",
+                                 "suffix": RELEVANT_SCHEMA_SUFFIX}
+                logger.info(f"相关表：{', '.join(tables)}；表结构约 "
+                            f"{num_tokens_from_string(schema, 'cl100k_base')} tokens")
+            except Exception as e:
+                logger.error(f"相关表检索失败，改为提供全部表: {e}")
 
         # 创建代理执行器
         agent_executor = create_sql_agent(
@@ -118,6 +233,7 @@ class RainbowSQLAgent:
             memory=self.memory,
             max_iterations=5,
             callbacks=[self.handler],
+            **prompt_kwargs,
         )
 
         try:
@@ -127,6 +243,7 @@ class RainbowSQLAgent:
         for i in range(0, len(response), int(print_speed_step)):
             yield response[: i + int(print_speed_step)]
         logger.info(response)
+        logger.info(self.sql_registry.query_cache.report())
 
     def create_interface(self):
         with gr.Blocks() as self.interface:
@@ -162,6 +279,12 @@ class RainbowSQLAgent:
                                                 inputs=[input_database_url, input_database_name,
                                                         input_database_passwd],
                                                 outputs=input_datatable_name)
+                            refresh_schema_button = gr.Button("Refresh Schema Cache")
+                            schema_cache_status = gr.Markdown()
+                            refresh_schema_button.click(fn=self.refresh_schema_cache,
+                                                        inputs=[input_database_url, input_database_name,
+                                                                input_database_passwd, input_datatable_name],
+                                                        outputs=schema_cache_status)
                 with gr.Column(scale=5):
                     # 右侧列: Chat Interface
                     gr.ChatInterface(
@@ -1,24 +1,39 @@
-import threading
-import pandas as pd
-import openai
 import datetime
+import hashlib
 import os
-import dashscope
 from dotenv import load_dotenv
 import gradio as gr
-import akshare as ak
 from Rainbow_utils import get_news_stock
 from Rainbow_utils import get_concept_data
 from Rainbow_utils import get_google_result
+from Rainbow_utils import pdf_stream_extractor
+from Rainbow_utils import watchlist_batch
+from Rainbow_utils import stock_screener
+from Rainbow_utils import prediction_backtest
+from Rainbow_utils.stock_price_store import StockPriceStore
+from Rainbow_utils.indicator_state import IncrementalIndicatorStore
+from Rainbow_utils.prompt_encoder import PromptEncoder, format_token_report
+from Rainbow_utils.concept_catalog import get_concept_catalog
+from Rainbow_utils.llm_fanout import FanOutEngine, ModelTarget
+from Rainbow_utils.analysis_cache import AnalysisCache, prompt_fingerprint
+from Rainbow_utils.data_source_cache import DataSourceCache
+from Rainbow_utils.prefetch_scheduler import PrefetchScheduler, DEFAULT_PREFETCH_PLAN
+from Rainbow_utils.news_condenser import condense_news
+from Rainbow_utils.task_graph_executor import TaskGraphExecutor
 from datetime import datetime
 import time
 import re
 from Rainbow_utils.get_tokens_cal_filter import filter_chinese_english_punctuation, \
     truncate_string_to_max_tokens
 import concurrent.futures
-import requests
-import PyPDF2
-from io import BytesIO
+from Rainbow_utils.lazy_import import lazy_import, preload
+
+# 重量级依赖延迟到首次使用时再导入
+pd = lazy_import("pandas")
+openai = lazy_import("openai")
+dashscope = lazy_import("dashscope")
+ak = lazy_import("akshare")
+PyPDF2 = lazy_import("PyPDF2")
 
 
 class RainbowStock_Analysis:
@@ -35,99 +50,56 @@ class RainbowStock_Analysis:
         self.DASHSCOPE_API_KEY = os.getenv('DASHSCOPE_API_KEY')
         openai.api_key = self.OPENAI_API_KEY
         dashscope.api_key = self.DASHSCOPE_API_KEY
-        self.concept_name = pd.read_csv('./Rainbow_utils/concept_name.csv')
-
-    def openai_0_28_1_api_call(self, model="gpt-3.5-turbo-1106",
-                               instruction="",
-                               message="你好啊？", timestamp_str="", result=None, index=None, stock_name=None):
-        gpt_response = ""
-        try:
-            print("openai_0_28_1_api_call..................")
-            response = openai.ChatCompletion.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": instruction},
-                    {"role": "user", "content": message}
-                ]
-            )
-            gpt_response = response['choices'][0]['message']['content']
-            gpt_file_name = f"{stock_name}_gpt_response_{timestamp_str}.txt"
-            gpt_file_name = "./logs/" + gpt_file_name
-            with open(gpt_file_name, 'w', encoding='utf-8') as gpt_file:
-                gpt_file.write(gpt_response)
-            print(f"OpenAI API 响应已保存到文件: {gpt_file_name}")
-            # return gpt_response
-            result[index] = gpt_response  # 将结果存储在结果列表中，使用给定的索引
-        except Exception as e:
-            print("发生异常:" + str(gpt_response))
-            # 在这里可以添加适当的异常处理代码，例如记录异常日志或采取其他适当的措施
-            result[index] = "发生异常:" + str(gpt_response)
-
-    def qwen_api_call(self, model="qwen-72b-chat",
-                      instruction="",
-                      message="你好啊？", timestamp_str="", result=None, index=None, stock_name=None):
-        try:
-            print("qwen_api_call............................")
-            messages = [
-                {"role": "system", "content": instruction},
-                {"role": "user", "content": message}
-            ]
-            qwen_response = dashscope.Generation.call(
-                model=model,
-                messages=messages,
-                result_format='message',  # set the result is message format.
-            )
-            qwen_response = qwen_response["output"]["choices"][0]["message"]["content"]
-            qwen_file_name = f"{stock_name}_qwen_response_{timestamp_str}.txt"
-            qwen_file_name = "./logs/" + qwen_file_name
-            with open(qwen_file_name, 'w', encoding='utf-8') as qwen_file:
-                qwen_file.write(qwen_response)
-            print(f"qwen API 响应已保存到文件: {qwen_file_name}")
-            # return qwen_response
-            result[index] = qwen_response  # 将结果存储在结果列表中，使用给定的索引
-        except Exception as e:
-            print("发生异常:" + str(qwen_response))
-            # 在这里可以添加适当的异常处理代码，例如记录异常日志或采取其他适当的措施
-            result[index] = "发生异常:" + str(qwen_response)
-
-    def calculate_technical_indicators(self, stock_zh_a_hist_df,
-                                       ma_window=5, macd_windows=(12, 26, 9),
-                                       rsi_window=14, cci_window=20):
-        # 丢弃NaN值
-        stock_zh_a_hist_df = stock_zh_a_hist_df.dropna()
-
-        # 检查是否有足够的数据来计算均线
-        if len(stock_zh_a_hist_df) < ma_window:
-            print("历史数据不足，无法计算均线。请提供更多的历史数据。")
-            return None
-
-        # 计算最小的均线
-        column_name = f'MA_{ma_window}'
-        stock_zh_a_hist_df[column_name] = stock_zh_a_hist_df['收盘'].rolling(window=ma_window).mean()
-
-        # 计算MACD
-        short_window, long_window, signal_window = macd_windows
-        stock_zh_a_hist_df['ShortEMA'] = stock_zh_a_hist_df['收盘'].ewm(span=short_window, adjust=False).mean()
-        stock_zh_a_hist_df['LongEMA'] = stock_zh_a_hist_df['收盘'].ewm(span=long_window, adjust=False).mean()
-        stock_zh_a_hist_df['MACD'] = stock_zh_a_hist_df['ShortEMA'] - stock_zh_a_hist_df['LongEMA']
-        stock_zh_a_hist_df['SIGNAL'] = stock_zh_a_hist_df['MACD'].ewm(span=signal_window, adjust=False).mean()
-
-        # 计算RSI
-        delta = stock_zh_a_hist_df['收盘'].diff(1)
-        gain = delta.where(delta > 0, 0)
-        loss = -delta.where(delta < 0, 0)
-        avg_gain = gain.rolling(window=rsi_window, min_periods=1).mean()
-        avg_loss = loss.rolling(window=rsi_window, min_periods=1).mean()
-        rs = avg_gain / avg_loss
-        stock_zh_a_hist_df['RSI'] = 100 - (100 / (1 + rs))
-
-        # 计算CCI
-        TP = (stock_zh_a_hist_df['最高'] + stock_zh_a_hist_df['最低'] + stock_zh_a_hist_df['收盘']) / 3
-        SMA = TP.rolling(window=cci_window, min_periods=1).mean()
-        MAD = (TP - SMA).abs().rolling(window=cci_window, min_periods=1).mean()
-        stock_zh_a_hist_df['CCI'] = (TP - SMA) / (0.015 * MAD)
-
-        return stock_zh_a_hist_df[['日期', f'MA_{ma_window}', 'MACD', 'SIGNAL', 'RSI', 'CCI']]
+        # 概念板块目录（名称 -> 代码），过期时在后台刷新
+        self.concept_catalog = get_concept_catalog()
+        # 本地日线存储，只增量获取缺失的交易日
+        self.price_store = StockPriceStore()
+        # 技术指标状态与日线存储放在一起，每次只推进新增的K线
+        self.indicator_store = IncrementalIndicatorStore(self.price_store)
+        # 各数据接口按更新频率（交易时段、财报披露期）持久化缓存，过期后先返回旧数据并在后台刷新
+        self.source_cache = DataSourceCache()
+        # 自选股数据后台预取：自选股 CSV、计划（见 prefetch_scheduler.parse_plan）、并发数及日线预取天数
+        self.prefetch_watchlist_path = os.getenv("RAINBOW_PREFETCH_WATCHLIST", "")
+        self.prefetch_history_days = 365
+        self.prefetch_scheduler = PrefetchScheduler(
+            os.getenv("RAINBOW_PREFETCH_PLAN", DEFAULT_PREFETCH_PLAN), self.prefetch_jobs,
+            max_workers=int(os.getenv("RAINBOW_PREFETCH_WORKERS", 4)))
+        # 数据采集阶段的整体延迟预算及各数据源超时（秒），失败的数据源以占位文本参与分析
+        self.stock_data_latency_budget = 60
+        self.stock_source_timeout = 20
+        self.stock_news_timeout = 40
+        self.stock_data_missing_text = "暂无数据"
+        # 个股新闻抓取条数及合并近似重复后的 token 预算
+        self.news_page_size = int(os.getenv("RAINBOW_NEWS_PAGE_SIZE", 50))
+        self.news_token_budget = 1500
+        # 分析 prompt 中各数据段落的总 token 预算
+        self.prompt_encoder = PromptEncoder(total_tokens=int(os.getenv("RAINBOW_STOCK_PROMPT_TOKENS", 6000)))
+        self.analysis_instruction = "你作为A股分析专家,请详细分析市场趋势、行业前景，揭示潜在投资机会,请确保提供充分的数据支持和专业见解。"
+        # 自选股批量分析：并发分析的股票数、报告目录，以及各模型接口的共享限流（每分钟调用数、并发数）
+        self.batch_max_workers = int(os.getenv("RAINBOW_BATCH_MAX_WORKERS", 4))
+        self.batch_output_root = "./logs"
+        # 全市场日线同步的并发数
+        self.screener_sync_workers = int(os.getenv("RAINBOW_SCREENER_SYNC_WORKERS", 8))
+        self.gpt_rate_limiter = watchlist_batch.RateLimiter(
+            calls_per_minute=float(os.getenv("RAINBOW_GPT_CALLS_PER_MINUTE", 20)), max_concurrent=2)
+        self.qwen_rate_limiter = watchlist_batch.RateLimiter(
+            calls_per_minute=float(os.getenv("RAINBOW_QWEN_CALLS_PER_MINUTE", 20)), max_concurrent=2)
+        # 模型调用超时、对冲重试等待时间（秒，未设置则不对冲）及调用耗时/token 记录文件
+        self.llm_call_timeout = float(os.getenv("RAINBOW_LLM_TIMEOUT", 300))
+        hedge_after = os.getenv("RAINBOW_LLM_HEDGE_AFTER")
+        self.llm_hedge_after = float(hedge_after) if hedge_after else None
+        self.llm_call_record_path = "./logs/llm_calls.jsonl"
+        # 分析结果缓存：同一股票、交易日、模型和 prompt 的分析直接复用
+        self.analysis_cache = AnalysisCache()
+
+    def warm_up(self):
+        """
+        Load the heavy data-source modules and the concept-board map ahead of the first analysis.
+        """
+        preload(pd, openai, dashscope, ak, PyPDF2)
+        if self.prefetch_watchlist_path:
+            self.prefetch_scheduler.start()
+        return self.concept_catalog.load()
 
     def process_prompt(self, stock_zyjs_ths_df, stock_individual_info_em_df, stock_zh_a_hist_df, stock_news_em_df,
                        stock_individual_fund_flow_df, technical_indicators_df,
@@ -160,16 +132,20 @@ class RainbowStock_Analysis:
         {stock_financial_analysis_indicator_df}
 
         """
-        prompt_filled = prompt_template.format(stock_zyjs_ths_df=stock_zyjs_ths_df,
-                                               stock_individual_info_em_df=stock_individual_info_em_df,
-                                               stock_zh_a_hist_df=stock_zh_a_hist_df,
-                                               stock_news_em_df=stock_news_em_df,
-                                               stock_individual_fund_flow_df=stock_individual_fund_flow_df,
-                                               technical_indicators_df=technical_indicators_df,
-                                               stock_financial_analysis_indicator_df=stock_financial_analysis_indicator_df,
-                                               single_industry_df=single_industry_df,
-                                               concept_info_df=concept_info_df
-                                               )
+        # 各段落按 token 预算紧凑编码（CSV、差值价格、较早K线按周汇总），替代 to_string 的定宽文本
+        sections, token_report = self.prompt_encoder.encode({
+            "stock_zyjs_ths_df": stock_zyjs_ths_df,
+            "single_industry_df": single_industry_df,
+            "concept_info_df": concept_info_df,
+            "stock_individual_info_em_df": stock_individual_info_em_df,
+            "stock_zh_a_hist_df": stock_zh_a_hist_df,
+            "technical_indicators_df": technical_indicators_df,
+            "stock_news_em_df": stock_news_em_df,
+            "stock_individual_fund_flow_df": stock_individual_fund_flow_df,
+            "stock_financial_analysis_indicator_df": stock_financial_analysis_indicator_df,
+        })
+        print(format_token_report(token_report))
+        prompt_filled = prompt_template.format(**sections)
         return prompt_filled
 
     def format_date(self, input_date):
@@ -193,25 +169,11 @@ class RainbowStock_Analysis:
                 return datetime(int(match.group(6)), month, int(match.group(5)))
         return None
 
-    def extract_text_from_pdf(self, pdf_url):
+    def extract_text_from_pdf(self, pdf_url, max_tokens=300):
         try:
-            # Send a GET request to download the PDF
-            response = requests.get(pdf_url)
-
-            # Check if the request was successful
-            if response.status_code == 200:
-                # Read the PDF content from the response
-                with BytesIO(response.content) as pdf_file:
-                    reader = PyPDF2.PdfReader(pdf_file)
-
-                    # Extract text from each page
-                    pdf_text = [page.extract_text() for page in reader.pages]
-
-                    # Combine the text from all pages
-                    full_text = "\n".join(filter(None, pdf_text))
-                    return full_text
-            else:
-                return "Failed to retrieve the PDF file."
+            # 逐页提取，达到 token 预算即停止；服务器支持 Range 时只下载用到的部分
+            return pdf_stream_extractor.extract_pdf_text(pdf_url, max_tokens=max_tokens,
+                                                         text_filter=filter_chinese_english_punctuation)
         except Exception as e:
             return f"Error: {e}"
 
@@ -221,15 +183,14 @@ class RainbowStock_Analysis:
     def process_link(self, link):
         """Function to process each link."""
         if self.is_pdf_url(link):
-            result_text = self.extract_text_from_pdf(link)
-            website_content = filter_chinese_english_punctuation(result_text)
+            website_content = self.extract_text_from_pdf(link, max_tokens=300)
             truncated_text = truncate_string_to_max_tokens(website_content,
                                                            300,
                                                            "cl100k_base",
                                                            step_size=150)
             return truncated_text
         else:
-            website_content = get_google_result.get_website_content(link)
+            website_content = get_google_result.get_website_main_content(link, max_tokens=300)
             if website_content:
                 website_content = filter_chinese_english_punctuation(website_content)
                 truncated_text = truncate_string_to_max_tokens(website_content,
@@ -239,15 +200,13 @@ class RainbowStock_Analysis:
             return truncated_text
         return None
 
-    def get_stock_data(self, llm_options_checkbox_group, llm_options_checkbox_group_qwen,
-                       market, symbol, stock_name,
-                       start_date, end_date, concept, http_proxy):
-        instruction = "你作为A股分析专家,请详细分析市场趋势、行业前景，揭示潜在投资机会,请确保提供充分的数据支持和专业见解。"
-
-        # 主营业务介绍-根据主营业务网络搜索相关事件报道
-        get_google_result.set_global_proxy(http_proxy)
+    def search_main_business_news(self, stock_zyjs_ths_df, end_date):
+        """
+        Search the latest news about the main business and keep the two most recent dated snippets.
 
-        stock_zyjs_ths_df = ak.stock_zyjs_ths(symbol=symbol)
+        Returns:
+        - tuple: (snippets string, links of the snippets)
+        """
         formatted_date = self.format_date(end_date)
         IN_Q = str(formatted_date) + "的有关" + stock_zyjs_ths_df['产品类型'].to_string(index=False) + "产品类型的新闻动态"
         custom_search_link, data_title_Summary = get_google_result.google_custom_search(IN_Q)
@@ -265,6 +224,10 @@ class RainbowStock_Analysis:
         # 将这三个文本片段转换为字符串，并提取相应的链接
         first_three_snippets = " ".join([snippet for _, snippet, _ in first_three_snippets_with_links])
         sorted_links = [link for _, _, link in first_three_snippets_with_links]
+        return first_three_snippets, sorted_links
+
+    def fetch_link_details(self, search_result):
+        first_three_snippets, sorted_links = search_result
         # Using ThreadPoolExecutor
         link_detail_res = []
         with concurrent.futures.ThreadPoolExecutor() as executor:
@@ -277,64 +240,216 @@ class RainbowStock_Analysis:
         # Concatenate the strings in the list into a single string
         link_datial_string = '\n'.join(link_detail_res)
 
-        stock_zyjs_ths_df = first_three_snippets + " " + link_datial_string
+        return first_three_snippets + " " + link_datial_string
 
-        # 个股信息查询
-        stock_individual_info_em_df = ak.stock_individual_info_em(symbol=symbol)
-        # 提取上市时间
-        list_date = stock_individual_info_em_df[stock_individual_info_em_df['item'] == '上市时间']['value'].values[0]
+    def extract_single_industry(self, stock_individual_info_em_df, stock_sector_fund_flow_rank_df):
         # 提取行业
         industry = stock_individual_info_em_df[stock_individual_info_em_df['item'] == '行业']['value'].values[0]
-        stock_individual_info_em_df = stock_individual_info_em_df.to_string(index=False)
+        return stock_sector_fund_flow_rank_df[stock_sector_fund_flow_rank_df['名称'] == industry]
 
-        # 获取当前个股所在行业板块情况
-        stock_sector_fund_flow_rank_df = ak.stock_sector_fund_flow_rank(indicator="今日", sector_type="行业资金流")
-        single_industry_df = stock_sector_fund_flow_rank_df[stock_sector_fund_flow_rank_df['名称'] == industry]
-        single_industry_df = single_industry_df.to_string(index=False)
+    def fetch_stock_news(self, symbol, page_size=10):
+        return get_news_stock.stock_news_em(symbol=symbol, pageSize=page_size,
+                                            chrome_driver_path="Rainbow_utils/chromedriver.exe")
 
-        # 获取概念板块的数据情况
-        concept_info_df = get_concept_data.stock_board_concept_info_ths(symbol=concept,
-                                                                        stock_board_ths_map_df=self.concept_name)
-        concept_info_df = concept_info_df.to_string(index=False)
-
-        # 个股历史数据查询
-        stock_zh_a_hist_df = ak.stock_zh_a_hist(symbol=symbol, period="daily", start_date=start_date, end_date=end_date,
-                                                adjust="")
-        # 个股技术指标计算
-        technical_indicators_df = self.calculate_technical_indicators(stock_zh_a_hist_df)
-        stock_zh_a_hist_df = stock_zh_a_hist_df.to_string(index=False)
-        technical_indicators_df = technical_indicators_df.to_string(index=False)
-
-        # 个股新闻
-        stock_news_em_df = get_news_stock.stock_news_em(symbol=symbol, pageSize=10,
-                                                        chrome_driver_path="Rainbow_utils/chromedriver.exe")
-        # 删除指定列
-        stock_news_em_df = stock_news_em_df.drop(["文章来源", "新闻链接"], axis=1)
-        stock_news_em_df = stock_news_em_df.to_string(index=False)
+    def get_stock_news(self, stock_news_em_df):
+        # 合并转载的近似重复新闻，按时间倒序保留在 token 预算内
+        return condense_news(stock_news_em_df, max_tokens=self.news_token_budget)
 
+    def get_recent_fund_flow(self, stock_individual_fund_flow_df):
         # 历史的个股资金流
-        stock_individual_fund_flow_df = ak.stock_individual_fund_flow(stock=symbol, market=market)
+        stock_individual_fund_flow_df = stock_individual_fund_flow_df.copy()
         # 转换日期列为 datetime 类型，以便进行排序
         stock_individual_fund_flow_df['日期'] = pd.to_datetime(stock_individual_fund_flow_df['日期'])
         # 按日期降序排序
         sorted_data = stock_individual_fund_flow_df.sort_values(by='日期', ascending=False)
         num_records = min(20, len(sorted_data))
         # 提取最近的至少20条记录，如果不足20条则提取所有记录
-        recent_data = sorted_data.head(num_records)
-        stock_individual_fund_flow_df = recent_data.to_string(index=False)
+        return sorted_data.head(num_records)
+
+    def fetch_concept_info(self, concept):
+        return get_concept_data.stock_board_concept_info_ths(symbol=concept,
+                                                             symbol_code=self.concept_catalog.code(concept))
 
+    def market_data_sources(self, concept=""):
+        """
+        Market-wide source calls as name -> (endpoint, fetch, kwargs): the industry fund-flow
+        ranking and, when given, the concept board.
+        """
+        sources = {
+            "stock_sector_fund_flow_rank": ("stock_sector_fund_flow_rank", ak.stock_sector_fund_flow_rank,
+                                            {"indicator": "今日", "sector_type": "行业资金流"}),
+        }
+        if concept:
+            sources["concept_info_df"] = ("stock_board_concept_info_ths", self.fetch_concept_info,
+                                          {"concept": concept})
+        return sources
+
+    def symbol_data_sources(self, market, symbol):
+        """
+        Per-symbol source calls as name -> (endpoint, fetch, kwargs).
+
+        collect_stock_data reads these through the source cache and the prefetch scheduler
+        warms the very same entries, so both use identical cache keys.
+        """
+        return {
+            "stock_zyjs_ths": ("stock_zyjs_ths", ak.stock_zyjs_ths, {"symbol": symbol}),
+            "stock_individual_info_em": ("stock_individual_info_em", ak.stock_individual_info_em,
+                                         {"symbol": symbol}),
+            "stock_individual_fund_flow": ("stock_individual_fund_flow", ak.stock_individual_fund_flow,
+                                           {"stock": symbol, "market": market}),
+            "stock_news_em": ("stock_news_em", self.fetch_stock_news,
+                              {"symbol": symbol, "page_size": self.news_page_size}),
+            "stock_financial_analysis_indicator": ("stock_financial_analysis_indicator",
+                                                   ak.stock_financial_analysis_indicator,
+                                                   {"symbol": symbol, "start_year": "2023"}),
+        }
+
+    def read_source(self, source):
+        endpoint, fetch, kwargs = source
+        return self.source_cache.call(endpoint, fetch, **kwargs)
+
+    def prefetch_jobs(self):
+        """
+        Jobs warming the caches of every symbol of the prefetch watchlist: daily bars and
+        indicators, per-symbol sources, the industry fund-flow ranking and each concept board.
+        """
+        if not self.prefetch_watchlist_path or not os.path.exists(self.prefetch_watchlist_path):
+            return []
+        watchlist = watchlist_batch.load_watchlist(self.prefetch_watchlist_path)
+        today = datetime.now()
+        start_date = (today - pd.Timedelta(days=self.prefetch_history_days)).strftime("%Y%m%d")
+        end_date = today.strftime("%Y%m%d")
+
+        def warm(source):
+            endpoint, fetch, kwargs = source
+            return lambda: self.source_cache.warm(endpoint, fetch, **kwargs)
+
+        def daily_bars(symbol):
+            def update():
+                self.price_store.update(symbol, start_date, end_date, adjust="")
+                self.indicator_store.advance(symbol, adjust="")
+            return update
+
+        jobs = []
+        concepts = sorted({item["concept"] for item in watchlist if item["concept"]})
+        for name, source in self.market_data_sources().items():
+            jobs.append((name, warm(source)))
+        for concept in concepts:
+            jobs.append((f"concept:{concept}", warm(self.market_data_sources(concept)["concept_info_df"])))
+        for item in watchlist:
+            symbol = item["symbol"]
+            jobs.append((f"{symbol}:daily_bars", daily_bars(symbol)))
+            for name, source in self.symbol_data_sources(item["market"], symbol).items():
+                jobs.append((f"{symbol}:{name}", warm(source)))
+        return jobs
+
+    def start_prefetch(self, watchlist_file=None):
+        """
+        Use the given watchlist (or the configured one) for prefetching, start warming the
+        caches in the background and keep them warm according to the prefetch plan.
+
+        Returns:
+        - str: Scheduler status, returned without waiting for the first run.
+        """
+        if watchlist_file is not None:
+            self.prefetch_watchlist_path = getattr(watchlist_file, "name", watchlist_file)
+        if not self.prefetch_watchlist_path:
+            return "未配置预取自选股列表"
+        self.prefetch_scheduler.start()
+        self.prefetch_scheduler.trigger()
+        return self.prefetch_scheduler.status()
+
+    def collect_stock_data(self, market, symbol, start_date, end_date, concept, shared_data=None):
+        """
+        Fetch every data source of the analysis prompt through a dependency-aware task graph.
+
+        Independent sources run concurrently with their own timeout; a source that fails or
+        times out is replaced by a placeholder so the analysis continues with partial data.
+        shared_data maps source task names (stock_sector_fund_flow_rank, concept_info_df) to
+        values already fetched for a whole batch; those sources are not fetched again.
+
+        Returns:
+        - dict: Keyword arguments of process_prompt.
+        """
+        missing = self.stock_data_missing_text
+        source_timeout = self.stock_source_timeout
+        shared_data = shared_data or {}
+        sources = dict(self.symbol_data_sources(market, symbol), **self.market_data_sources(concept))
+
+        def cached(name):
+            return self.read_source(sources[name])
+
+        def source(name, fetch):
+            if name in shared_data:
+                return lambda: shared_data[name]
+            return fetch
+
+        data_graph = TaskGraphExecutor(name=f"stock_data_{symbol}", total_timeout=self.stock_data_latency_budget)
+        # 主营业务介绍-根据主营业务网络搜索相关事件报道
+        data_graph.add_task("stock_zyjs_ths", lambda: cached("stock_zyjs_ths"), timeout=source_timeout)
+        # 搜索结果和链接正文按天缓存，同一股票同一天重复分析时提示词保持不变
+        data_graph.add_task("main_business_search",
+                            lambda df: self.source_cache.call(
+                                "main_business_search",
+                                lambda symbol, end_date: self.search_main_business_news(df, end_date),
+                                symbol=symbol, end_date=end_date),
+                            deps=["stock_zyjs_ths"], timeout=source_timeout)
+        data_graph.add_task("stock_zyjs_ths_df",
+                            lambda search_result: self.source_cache.call(
+                                "main_business_link_details",
+                                lambda symbol, end_date: self.fetch_link_details(search_result),
+                                symbol=symbol, end_date=end_date),
+                            deps=["main_business_search"], timeout=source_timeout, default=missing)
+        # 个股信息查询
+        data_graph.add_task("stock_individual_info_em", lambda: cached("stock_individual_info_em"),
+                            timeout=source_timeout)
+        data_graph.add_task("stock_individual_info_em_df", lambda df: df,
+                            deps=["stock_individual_info_em"], default=missing)
+        # 获取当前个股所在行业板块情况（行业来自个股信息）
+        data_graph.add_task("stock_sector_fund_flow_rank",
+                            source("stock_sector_fund_flow_rank", lambda: cached("stock_sector_fund_flow_rank")),
+                            timeout=source_timeout)
+        data_graph.add_task("single_industry_df", self.extract_single_industry,
+                            deps=["stock_individual_info_em", "stock_sector_fund_flow_rank"], default=missing)
+        # 获取概念板块的数据情况
+        data_graph.add_task("concept_info_df", source("concept_info_df", lambda: cached("concept_info_df")),
+                            timeout=source_timeout, default=missing)
+        # 个股历史数据查询（本地存储 + 增量更新）及技术指标计算
+        data_graph.add_task("stock_zh_a_hist",
+                            lambda: self.price_store.get_daily_bars(symbol, start_date, end_date, adjust=""),
+                            timeout=source_timeout)
+        data_graph.add_task("stock_zh_a_hist_df", lambda df: df,
+                            deps=["stock_zh_a_hist"], default=missing)
+        data_graph.add_task("technical_indicators_df",
+                            lambda df: self.indicator_store.read_frame(symbol, start_date, end_date, adjust=""),
+                            deps=["stock_zh_a_hist"], default=missing)
+        # 个股新闻（Selenium 渲染较慢，单独限时）
+        data_graph.add_task("stock_news_em_df", lambda: self.get_stock_news(cached("stock_news_em")),
+                            timeout=self.stock_news_timeout, default=missing)
+        data_graph.add_task("stock_individual_fund_flow_df",
+                            lambda: self.get_recent_fund_flow(cached("stock_individual_fund_flow")),
+                            timeout=source_timeout, default=missing)
         # 财务指标
-        stock_financial_analysis_indicator_df = ak.stock_financial_analysis_indicator(symbol=symbol, start_year="2023")
-        stock_financial_analysis_indicator_df = stock_financial_analysis_indicator_df.to_string(index=False)
-
-        # 构建最终prompt
-        finally_prompt = self.process_prompt(stock_zyjs_ths_df, stock_individual_info_em_df, stock_zh_a_hist_df,
-                                             stock_news_em_df,
-                                             stock_individual_fund_flow_df, technical_indicators_df
-                                             , stock_financial_analysis_indicator_df, single_industry_df,
-                                             concept_info_df)
-        # return finally_prompt
-        user_message = (
+        data_graph.add_task("stock_financial_analysis_indicator_df",
+                            lambda: cached("stock_financial_analysis_indicator"),
+                            timeout=source_timeout, default=missing)
+        results = data_graph.run()
+        print(self.source_cache.report())
+
+        prompt_sections = ["stock_zyjs_ths_df", "stock_individual_info_em_df", "stock_zh_a_hist_df",
+                           "stock_news_em_df", "stock_individual_fund_flow_df", "technical_indicators_df",
+                           "stock_financial_analysis_indicator_df", "single_industry_df", "concept_info_df"]
+        return {section: results[section] for section in prompt_sections}
+
+    def missing_sections(self, prompt_data):
+        """
+        Names of the prompt sections replaced by the missing-data placeholder.
+        """
+        return [name for name, value in prompt_data.items()
+                if isinstance(value, str) and value == self.stock_data_missing_text]
+
+    def build_user_message(self, finally_prompt):
+        return (
             f"{finally_prompt}\n"
             f"请基于以上收集到的实时的真实数据，发挥你的A股分析专业知识，对未来3天该股票的价格走势做出深度预测。\n"
             f"在预测中请全面考虑主营业务、基本数据、所在行业数据、所在概念板块数据、历史行情、最近新闻以及资金流动等多方面因素。\n"
@@ -355,6 +470,112 @@ class RainbowStock_Analysis:
             f"你可以一步一步的去思考，期待你深刻的分析，将有力指导我的投资决策。"
         )
 
+    def prompt_version(self):
+        """
+        Short hash of the analysis instruction and question template, identifying the prompt version.
+        """
+        template = self.analysis_instruction + self.build_user_message("")
+        return hashlib.sha1(template.encode("utf-8")).hexdigest()[:8]
+
+    def build_llm_targets(self, llm_options_checkbox_group, llm_options_checkbox_group_qwen):
+        """
+        Build the fan-out targets of one analysis; every provider is throttled by its shared rate limiter.
+        """
+        return [
+            ModelTarget("gpt", "openai", llm_options_checkbox_group, timeout=self.llm_call_timeout,
+                        hedge_after=self.llm_hedge_after, rate_limiter=self.gpt_rate_limiter),
+            ModelTarget("qwen", "dashscope", llm_options_checkbox_group_qwen, timeout=self.llm_call_timeout,
+                        hedge_after=self.llm_hedge_after, rate_limiter=self.qwen_rate_limiter),
+        ]
+
+    def stream_llms(self, llm_options_checkbox_group, llm_options_checkbox_group_qwen, user_message, timestamp_str,
+                    stock_name, symbol, end_date, statuses=None, cache_responses=True):
+        """
+        Ask all models concurrently and yield the responses each time one of them answers.
+
+        Responses cached for the same symbol, end date, model and prompt are returned without
+        calling the model again.
+
+        Parameters:
+        - statuses (dict): Filled with label -> "cached", "ok", "error" or "timeout" of every target.
+        - cache_responses (bool): Store the new responses; False for prompts built from incomplete
+          data, which must neither be served later nor evict the entries built from complete data.
+
+        Yields:
+        - list: The response of every target so far (None while still waiting), in target order.
+        """
+        targets = self.build_llm_targets(llm_options_checkbox_group, llm_options_checkbox_group_qwen)
+        fingerprint = prompt_fingerprint(self.analysis_instruction, user_message)
+        responses = [None] * len(targets)
+        uncached = []
+        for index, target in enumerate(targets):
+            cached = self.analysis_cache.get(symbol, end_date, target.model, fingerprint)
+            if cached is None:
+                uncached.append(index)
+            else:
+                print(f"{target.label} 命中分析缓存: {symbol} {end_date} {target.model}")
+                responses[index] = cached["response"]
+                if statuses is not None:
+                    statuses[target.label] = "cached"
+        if len(uncached) < len(targets):
+            yield list(responses)
+        if not uncached:
+            return
+
+        engine = FanOutEngine([targets[index] for index in uncached], record_path=self.llm_call_record_path)
+        for event in engine.stream(self.analysis_instruction, user_message, {"stock_name": stock_name}):
+            target = engine.targets[event["index"]]
+            responses[uncached[event["index"]]] = event["text"]
+            if statuses is not None:
+                statuses[event["label"]] = event["status"]
+            print(f"{event['label']} 响应 {event['status']}，耗时 {event['latency']:.1f} 秒，token 用量 {event['usage']}")
+            if event["status"] == "ok":
+                file_name = f"./logs/{stock_name}_{event['label']}_response_{timestamp_str}.txt"
+                with open(file_name, 'w', encoding='utf-8') as response_file:
+                    response_file.write(event["text"])
+                print(f"{event['label']} 响应已保存到文件: {file_name}")
+                if cache_responses:
+                    self.analysis_cache.put(symbol, end_date, target.model, fingerprint, event["text"],
+                                            stock_name=stock_name, label=event["label"], latency=event["latency"],
+                                            usage=event["usage"], prompt_version=self.prompt_version())
+            yield list(responses)
+
+    def call_llms(self, llm_options_checkbox_group, llm_options_checkbox_group_qwen, user_message, timestamp_str,
+                  stock_name, symbol, end_date, cache_responses=True):
+        """
+        Ask GPT and Qwen concurrently and wait for both.
+
+        Returns:
+        - tuple: (gpt_response, qwen_response, statuses), statuses maps each label to its status
+          (see stream_llms()); failed and timed-out responses hold the error text.
+        """
+        responses = [None, None]
+        statuses = {}
+        for responses in self.stream_llms(llm_options_checkbox_group, llm_options_checkbox_group_qwen, user_message,
+                                          timestamp_str, stock_name, symbol, end_date, statuses=statuses,
+                                          cache_responses=cache_responses):
+            pass
+        return responses[0], responses[1], statuses
+
+    def get_stock_data(self, llm_options_checkbox_group, llm_options_checkbox_group_qwen,
+                       market, symbol, stock_name,
+                       start_date, end_date, concept, http_proxy):
+        """
+        Collect the stock data, then stream each model's answer to its output panel as it arrives.
+
+        Yields:
+        - tuple: (gpt_response, qwen_response)
+        """
+        get_google_result.set_global_proxy(http_proxy)
+        yield "正在收集股票数据...", "正在收集股票数据..."
+
+        prompt_data = self.collect_stock_data(market, symbol, start_date, end_date, concept)
+        missing_sections = self.missing_sections(prompt_data)
+        if missing_sections:
+            print(f"数据不完整，分析结果不写入缓存：{', '.join(missing_sections)}")
+        finally_prompt = self.process_prompt(**prompt_data)
+        user_message = self.build_user_message(finally_prompt)
+
         print(user_message)
 
         # 获取当前时间戳字符串
@@ -365,40 +586,215 @@ class RainbowStock_Analysis:
             file.write(user_message)
         print(f"{stock_name}_已保存到文件: {file_name}")
 
-        # 创建一个列表来存储结果
-        result = [None, None]
+        yield "等待模型响应...", "等待模型响应..."
+        for gpt_response, qwen_response in self.stream_llms(llm_options_checkbox_group,
+                                                             llm_options_checkbox_group_qwen, user_message,
+                                                             timestamp_str, stock_name, symbol, end_date,
+                                                             cache_responses=not missing_sections):
+            yield gpt_response or "等待模型响应...", qwen_response or "等待模型响应..."
 
-        # 创建两个线程，分别调用不同的API，并把结果保存在列表中
-        gpt_thread = threading.Thread(
-            target=self.openai_0_28_1_api_call,
-            args=(
-                llm_options_checkbox_group, instruction,
-                user_message, timestamp_str, result, 0, stock_name)  # 注意这里多传了两个参数，分别是列表和索引
-        )
-        qwen_thread = threading.Thread(
-            target=self.qwen_api_call,
-            args=(
-                llm_options_checkbox_group_qwen,
-                instruction,
-                user_message, timestamp_str, result, 1, stock_name)  # 同上
-        )
+    def list_cached_analyses(self, symbol=""):
+        """
+        List the cached analyses (optionally of one symbol), newest first.
+        """
+        columns = ["symbol", "stock_name", "end_date", "model", "created_at", "entry_id"]
+        entries = self.analysis_cache.entries(symbol.strip() or None)
+        return pd.DataFrame([[entry.get(column, "") for column in columns] for entry in entries], columns=columns)
+
+    def fetch_market_wide_data(self, concepts):
+        """
+        Fetch the datasets shared by every symbol of a batch once: the industry fund-flow ranking
+        and the data of each distinct concept board.
+
+        Returns:
+        - tuple: (industry fund-flow DataFrame or None, dict concept -> concept board DataFrame)
+        """
+        market_graph = TaskGraphExecutor(name="market_wide_data", total_timeout=self.stock_data_latency_budget,
+                                         max_workers=self.batch_max_workers)
+        market_graph.add_task("stock_sector_fund_flow_rank",
+                              lambda: self.read_source(self.market_data_sources()["stock_sector_fund_flow_rank"]),
+                              timeout=self.stock_source_timeout)
+        for concept in concepts:
+            market_graph.add_task(f"concept:{concept}",
+                                  lambda concept=concept: self.read_source(
+                                      self.market_data_sources(concept)["concept_info_df"]),
+                                  timeout=self.stock_source_timeout, default=self.stock_data_missing_text)
+        results = market_graph.run()
+        concept_data = {concept: results[f"concept:{concept}"] for concept in concepts}
+        return results["stock_sector_fund_flow_rank"], concept_data
+
+    def analyze_watchlist_symbol(self, item, llm_options_checkbox_group, llm_options_checkbox_group_qwen,
+                                 start_date, end_date, shared_data, progress):
+        symbol, stock_name = item["symbol"], item["stock_name"]
+        prompt_data = self.collect_stock_data(item["market"], symbol, start_date, end_date, item["concept"],
+                                              shared_data=shared_data)
+        missing_sections = self.missing_sections(prompt_data)
+        user_message = self.build_user_message(self.process_prompt(**prompt_data))
+        timestamp_str = time.strftime("%Y%m%d%H%M%S", time.localtime())
+        gpt_response, qwen_response, statuses = self.call_llms(llm_options_checkbox_group,
+                                                               llm_options_checkbox_group_qwen, user_message,
+                                                               timestamp_str, stock_name, symbol, end_date,
+                                                               cache_responses=not missing_sections)
+        report = (f"# {stock_name}({symbol}) {end_date}\n\n"
+                  f"## GPT ({llm_options_checkbox_group})\n\n{gpt_response}\n\n"
+                  f"## Qwen ({llm_options_checkbox_group_qwen})\n\n{qwen_response}\n\n"
+                  f"## Prompt\n\n{user_message}\n")
+        report_path = progress.write_report(f"{symbol}_{stock_name}.md", report)
+        # 任一模型失败、超时或未返回都不记为完成（由 run_batch 记为 failed），重新运行批次时会再次分析
+        failed = {label: status for label, status in statuses.items() if status not in ("ok", "cached")}
+        if failed or gpt_response is None or qwen_response is None:
+            raise RuntimeError(f"模型响应失败 {failed or statuses}，报告已保存：{report_path}")
+        progress.record(symbol, "done", report=report_path)
+        return report_path
+
+    def analyze_watchlist(self, watchlist_file, llm_options_checkbox_group, llm_options_checkbox_group_qwen,
+                          start_date, end_date, http_proxy):
+        """
+        Analyze every symbol of a watchlist CSV (columns: symbol, stock_name, market, concept).
+
+        Market-wide and per-concept datasets are fetched once for the whole batch, symbols are
+        analyzed with bounded concurrency and every report is written to disk as soon as it is
+        done. Re-running a batch with the same end date skips the symbols already reported.
+
+        Yields:
+        - str: The progress log, for streaming to the UI.
+        """
+        get_google_result.set_global_proxy(http_proxy)
+        watchlist = watchlist_batch.load_watchlist(getattr(watchlist_file, "name", watchlist_file))
+        yield from self.run_batch(watchlist, os.path.join(self.batch_output_root, f"batch_{end_date}"),
+                                  llm_options_checkbox_group, llm_options_checkbox_group_qwen, start_date, end_date)
 
-        # 把两个线程对象保存在一个列表中
-        threads = [gpt_thread, qwen_thread]
+    def run_batch(self, items, output_dir, llm_options_checkbox_group, llm_options_checkbox_group_qwen,
+                  start_date, end_date):
+        """
+        Analyze a list of symbols (dicts with symbol, stock_name, market, concept) into output_dir.
 
-        # 启动所有的线程
-        for thread in threads:
-            thread.start()
+        Yields:
+        - str: The progress log, for streaming to the UI.
+        """
+        progress = watchlist_batch.BatchProgress(output_dir)
+        completed = progress.completed()
+        pending = [item for item in items if item["symbol"] not in completed]
+        log_lines = [f"股票 {len(items)} 只，已完成 {len(items) - len(pending)} 只，"
+                     f"本次分析 {len(pending)} 只，报告目录：{progress.output_dir}"]
+        yield "\n".join(log_lines)
+        if not pending:
+            return
+
+        # 全市场数据及各概念板块数据整批只获取一次
+        concepts = sorted({item["concept"] for item in pending if item["concept"]})
+        sector_fund_flow_df, concept_data = self.fetch_market_wide_data(concepts)
+        log_lines.append(f"已获取行业资金流及 {len(concepts)} 个概念板块数据")
+        yield "\n".join(log_lines)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.batch_max_workers) as executor:
+            future_to_item = {}
+            for item in pending:
+                shared_data = {"concept_info_df": concept_data.get(item["concept"], self.stock_data_missing_text)}
+                if sector_fund_flow_df is not None:
+                    shared_data["stock_sector_fund_flow_rank"] = sector_fund_flow_df
+                future = executor.submit(self.analyze_watchlist_symbol, item, llm_options_checkbox_group,
+                                         llm_options_checkbox_group_qwen, start_date, end_date, shared_data, progress)
+                future_to_item[future] = item
+            for future in concurrent.futures.as_completed(future_to_item):
+                item = future_to_item[future]
+                try:
+                    log_lines.append(f"{item['stock_name']}({item['symbol']}) 完成：{future.result()}")
+                except Exception as e:
+                    progress.record(item["symbol"], "failed", error=str(e))
+                    log_lines.append(f"{item['stock_name']}({item['symbol']}) 失败：{e}")
+                yield "\n".join(log_lines)
+
+    def stock_names(self):
+        """
+        Map every A-share code to its name (cached daily).
+        """
+        names_df = self.source_cache.call("stock_info_a_code_name", ak.stock_info_a_code_name)
+        return dict(zip(names_df["code"].astype(str).str.zfill(6), names_df["name"]))
 
-        # 等待所有的线程结束
-        for thread in threads:
-            thread.join()
+    def sync_market_data(self, start_date, end_date):
+        """
+        Download the missing daily bars of every A-share symbol into the local price store.
+        """
+        symbols = list(self.stock_names())
+        errors = stock_screener.sync_price_store(self.price_store, symbols, start_date, end_date,
+                                                 max_workers=self.screener_sync_workers)
+        return f"已同步 {len(symbols) - len(errors)} / {len(symbols)} 只股票的日线数据" + (
+            f"，失败 {len(errors)} 只：{', '.join(list(errors)[:20])}" if errors else "")
 
-        # 获取结果
-        gpt_response = result[0]  # 通过列表和索引来访问结果
-        qwen_response = result[1]
+    def screen_market(self, screen_preset, filter_expression, score_expression, top_n, start_date, end_date):
+        """
+        Screen every symbol of the local price store with vectorized filter expressions.
 
-        return gpt_response, qwen_response
+        Parameters:
+        - screen_preset (str): Name of a PRESET_SCREENS entry, used when filter_expression is empty.
+        - filter_expression (str): Custom boolean expression over fields and indicators.
+        - score_expression (str): Custom ranking expression (higher first).
+        - top_n (int): Number of candidates.
+
+        Returns:
+        - pandas.DataFrame: The top-N candidates with symbol, stock_name, market, date, close, pct_change, score.
+        """
+        preset = stock_screener.PRESET_SCREENS.get(screen_preset, {})
+        filter_expression = (filter_expression or "").strip() or preset.get("filter")
+        if not filter_expression:
+            raise gr.Error("请选择预置条件或输入筛选表达式")
+        score_expression = (score_expression or "").strip() or (
+            preset.get("score") if filter_expression == preset.get("filter") else None)
+        panel = stock_screener.MarketPanel.from_store(self.price_store, start_date, end_date)
+        try:
+            candidates = panel.screen(filter_expression, score_expression, top_n=int(top_n))
+        except (SyntaxError, ValueError, NameError) as e:
+            raise gr.Error(f"筛选表达式错误: {e}")
+        try:
+            names = self.stock_names()
+        except Exception as e:
+            print(f"股票名称获取失败: {e}")
+            names = {}
+        candidates.insert(1, "stock_name", [names.get(symbol, symbol) for symbol in candidates["symbol"]])
+        candidates.insert(2, "market", [watchlist_batch.guess_market(symbol) for symbol in candidates["symbol"]])
+        return candidates
+
+    def analyze_screened(self, candidates, llm_options_checkbox_group, llm_options_checkbox_group_qwen,
+                         start_date, end_date, http_proxy):
+        """
+        Run the LLM analysis for the screened candidates.
+
+        Yields:
+        - str: The progress log, for streaming to the UI.
+        """
+        get_google_result.set_global_proxy(http_proxy)
+        if candidates is None or not len(candidates):
+            yield "没有可分析的候选股票"
+            return
+        items = [{"symbol": str(row["symbol"]).zfill(6), "stock_name": row["stock_name"], "market": row["market"],
+                  "concept": ""} for _, row in candidates.iterrows()]
+        yield from self.run_batch(items, os.path.join(self.batch_output_root, f"screen_{end_date}"),
+                                  llm_options_checkbox_group, llm_options_checkbox_group_qwen, start_date, end_date)
+
+    def backtest_predictions(self, horizon, include_logs):
+        """
+        Score the stored model predictions against the bars that followed them.
+
+        Returns:
+        - tuple: (summary per model and prompt version, per-prediction results) DataFrames
+        """
+        predictions = prediction_backtest.load_cached_predictions(self.analysis_cache)
+        if include_logs:
+            symbols_by_name = {name: symbol for symbol, name in self.stock_names().items()}
+            log_predictions = prediction_backtest.load_log_predictions("./logs", symbols_by_name, self.analysis_cache)
+            predictions = pd.concat([predictions, log_predictions], ignore_index=True)
+        if not len(predictions):
+            raise gr.Error("没有可回测的预测结果")
+        # 补齐预测日之后的日线
+        end_date = datetime.now().strftime("%Y%m%d")
+        errors = stock_screener.sync_price_store(self.price_store, sorted(predictions["symbol"].unique()),
+                                                 predictions["end_date"].min(), end_date,
+                                                 max_workers=self.screener_sync_workers)
+        for symbol, error in errors.items():
+            print(f"{symbol} 日线更新失败: {error}")
+        results = prediction_backtest.backtest_predictions(predictions, self.price_store, horizon=int(horizon))
+        return prediction_backtest.summarize_backtest(results), results
 
     def create_interface(self):
         with gr.Blocks() as self.interface:
@@ -452,5 +848,69 @@ class RainbowStock_Analysis:
                 outputs=[gpt_response, qwen_response]
             )
 
+            # 自选股批量分析：CSV 列为 symbol, stock_name, market, concept
+            with gr.Accordion("Watchlist Batch Analysis", open=False):
+                with gr.Row():
+                    watchlist_file = gr.File(label="Watchlist CSV (symbol, stock_name, market, concept)",
+                                             file_types=[".csv"])
+                    batch_log = gr.Textbox(label="Batch Progress", lines=10)
+                with gr.Row():
+                    batch_button = gr.Button("Run Batch")
+                    prefetch_button = gr.Button("Prefetch & Keep Warm")
+                prefetch_status = gr.Textbox(label="Prefetch Status", lines=3)
+                prefetch_button.click(fn=self.start_prefetch, inputs=[watchlist_file], outputs=[prefetch_status])
+                batch_button.click(
+                    fn=self.analyze_watchlist,
+                    inputs=[watchlist_file, llm_options_checkbox_group, llm_options_checkbox_group_qwen,
+                            start_date, end_date, http_proxy],
+                    outputs=[batch_log]
+                )
+
+            # 全市场选股：在本地日线存储上向量化筛选，候选股票送入模型分析
+            with gr.Accordion("Market Screener", open=False):
+                with gr.Row():
+                    screen_preset = gr.Dropdown(list(stock_screener.PRESET_SCREENS), label="Preset Screen",
+                                                value=list(stock_screener.PRESET_SCREENS)[0])
+                    screen_top_n = gr.Number(value=10, label="Top N", precision=0)
+                with gr.Row():
+                    screen_filter = gr.Textbox(label="Filter Expression (overrides preset)",
+                                               placeholder="cross_over(MACD, SIGNAL) & (RSI < 50)")
+                    screen_score = gr.Textbox(label="Score Expression", placeholder="change(close, 5)")
+                with gr.Row():
+                    sync_button = gr.Button("Sync Market Data")
+                    screen_button = gr.Button("Screen")
+                    analyze_screened_button = gr.Button("Analyze Candidates")
+                screen_status = gr.Textbox(label="Screener Progress", lines=5)
+                screen_results = gr.Dataframe(label="Candidates")
+                sync_button.click(fn=self.sync_market_data, inputs=[start_date, end_date], outputs=[screen_status])
+                screen_button.click(
+                    fn=self.screen_market,
+                    inputs=[screen_preset, screen_filter, screen_score, screen_top_n, start_date, end_date],
+                    outputs=[screen_results]
+                )
+                analyze_screened_button.click(
+                    fn=self.analyze_screened,
+                    inputs=[screen_results, llm_options_checkbox_group, llm_options_checkbox_group_qwen,
+                            start_date, end_date, http_proxy],
+                    outputs=[screen_status]
+                )
+
+            # 模型预测回测：按模型和 prompt 版本统计命中率
+            with gr.Accordion("Prediction Backtest", open=False):
+                with gr.Row():
+                    backtest_horizon = gr.Number(value=3, label="Horizon (trading days)", precision=0)
+                    backtest_include_logs = gr.Checkbox(value=False, label="Include ./logs response files")
+                    backtest_button = gr.Button("Run Backtest")
+                backtest_summary = gr.Dataframe(label="Hit Rate by Model and Prompt Version")
+                backtest_details = gr.Dataframe(label="Predictions")
+                backtest_button.click(fn=self.backtest_predictions, inputs=[backtest_horizon, backtest_include_logs],
+                                      outputs=[backtest_summary, backtest_details])
+
+            # 已缓存的分析结果索引
+            with gr.Accordion("Cached Analyses", open=False):
+                cached_analyses = gr.Dataframe(label="Cached Analyses")
+                cached_button = gr.Button("List Cached Analyses")
+                cached_button.click(fn=self.list_cached_analyses, inputs=[symbol], outputs=[cached_analyses])
+
     def launch(self):
         return self.interface
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+DEFAULT_ANALYSIS_CACHE_DIR = os.getenv("RAINBOW_ANALYSIS_CACHE_DIR", "./data/analysis_cache")
+
+
+def prompt_fingerprint(instruction, user_message):
+    """
+    SHA-256 of the system instruction and the assembled user prompt.
+
+    The prompt embeds every upstream dataset of the analysis, so any change of the data
+    (new bar, fund flow, news, financial report...) yields a different fingerprint.
+    """
+    return hashlib.sha256(f"{instruction}\n\x00\n{user_message}".encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """
+    On-disk cache of model analyses keyed by (symbol, end date, model, prompt fingerprint).
+
+    Every response is stored as one JSON file under {root}/{symbol}/{end_date}/ and listed in
+    {root}/index.json. When a symbol and day is analyzed with a new prompt fingerprint, the
+    upstream data of that day has changed and the entries built from the old data are dropped.
+
+    Parameters:
+    - root (str): Directory of the cache.
+    """
+
+    def __init__(self, root=DEFAULT_ANALYSIS_CACHE_DIR):
+        self.root = root
+        self.index_path = os.path.join(root, "index.json")
+        self.lock = threading.Lock()
+        self.index = None
+
+    @staticmethod
+    def entry_id(symbol, end_date, model, fingerprint):
+        return f"{symbol}/{end_date}/{model}_{fingerprint[:16]}"
+
+    def _load_index(self):
+        if self.index is None:
+            self.index = {}
+            if os.path.exists(self.index_path):
+                with open(self.index_path, "r", encoding="utf-8") as index_file:
+                    self.index = json.load(index_file)
+        return self.index
+
+    def _save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as index_file:
+            json.dump(self.index, index_file, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+    def _path(self, entry_id):
+        return os.path.join(self.root, entry_id + ".json")
+
+    def get(self, symbol, end_date, model, fingerprint):
+        """
+        Return the cached entry (with the "response" text) or None.
+        """
+        entry_id = self.entry_id(symbol, end_date, model, fingerprint)
+        with self.lock:
+            record = self._load_index().get(entry_id)
+            if record is None or record["fingerprint"] != fingerprint:
+                return None
+            try:
+                with open(self._path(entry_id), "r", encoding="utf-8") as entry_file:
+                    return json.load(entry_file)
+            except (OSError, ValueError):
+                # 条目文件丢失或损坏，从索引中移除
+                self.index.pop(entry_id, None)
+                self._save_index()
+                return None
+
+    def put(self, symbol, end_date, model, fingerprint, response, **details):
+        """
+        Store one response; entries of the same symbol and day built from other data are invalidated.
+
+        Parameters:
+        - details: Extra metadata kept in the index (e.g. stock_name, label, latency, usage).
+
+        Returns:
+        - str: Path of the entry file.
+        """
+        entry_id = self.entry_id(symbol, end_date, model, fingerprint)
+        record = {"symbol": symbol, "end_date": end_date, "model": model, "fingerprint": fingerprint,
+                  "created_at": datetime.now().isoformat(timespec="seconds")}
+        record.update(details)
+        path = self._path(entry_id)
+        with self.lock:
+            index = self._load_index()
+            stale = [other_id for other_id, other in index.items()
+                     if other["symbol"] == symbol and other["end_date"] == end_date
+                     and other["fingerprint"] != fingerprint]
+            for other_id in stale:
+                self._remove(other_id)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "w", encoding="utf-8") as entry_file:
+                json.dump(dict(record, response=response), entry_file, ensure_ascii=False)
+            os.replace(path + ".tmp", path)
+            index[entry_id] = record
+            self._save_index()
+        return path
+
+    def _remove(self, entry_id):
+        self.index.pop(entry_id, None)
+        try:
+            os.remove(self._path(entry_id))
+        except FileNotFoundError:
+            pass
+
+    def invalidate(self, symbol, end_date=None):
+        """
+        Drop the entries of a symbol (optionally only of one end date).
+
+        Returns:
+        - int: Number of entries removed.
+        """
+        with self.lock:
+            index = self._load_index()
+            removed = [entry_id for entry_id, record in index.items()
+                       if record["symbol"] == symbol and (end_date is None or record["end_date"] == end_date)]
+            for entry_id in removed:
+                self._remove(entry_id)
+            if removed:
+                self._save_index()
+        return len(removed)
+
+    def entries(self, symbol=None):
+        """
+        List the cached reports, newest first.
+        """
+        with self.lock:
+            records = [dict(record, entry_id=entry_id) for entry_id, record in self._load_index().items()
+                       if symbol is None or record["symbol"] == symbol]
+        return sorted(records, key=lambda record: (record["end_date"], record["created_at"]), reverse=True)
+
+
+if __name__ == "__main__":
+    cache = AnalysisCache("./data/analysis_cache_demo")
+    fingerprint = prompt_fingerprint("instruction", "prompt v1")
+    cache.put("002665", "20231212", "qwen-72b-chat", fingerprint, "看涨 3%", stock_name="首航高科")
+    print(cache.get("002665", "20231212", "qwen-72b-chat", fingerprint)["response"])
+    cache.put("002665", "20231212", "qwen-72b-chat", prompt_fingerprint("instruction", "prompt v2"), "看跌 1%")
+    print(cache.get("002665", "20231212", "qwen-72b-chat", fingerprint), cache.entries())
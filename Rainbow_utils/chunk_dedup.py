@@ -0,0 +1,224 @@
+import hashlib
+import re
+
+import numpy as np
+
+# MinHash 签名长度及 LSH 分段（16 段 x 4 行，Jaccard 约 0.5 以上的文本对才会成为候选）
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16
+_MINHASH_PRIME = np.uint64(4294967311)
+_minhash_random = np.random.RandomState(20231215)
+_MINHASH_A = _minhash_random.randint(1, 1 << 31, size=MINHASH_PERMUTATIONS).astype(np.uint64)
+_MINHASH_B = _minhash_random.randint(0, 1 << 31, size=MINHASH_PERMUTATIONS).astype(np.uint64)
+
+
+def text_shingles(text, shingle_size=4):
+    """
+    Split a text into a set of character shingles (works for Chinese and English alike).
+
+    Args:
+    - text (str): The text to split.
+    - shingle_size (int): Number of characters per shingle.
+
+    Returns:
+    - Set of shingle strings.
+    """
+    text = re.sub(r"\s+", " ", text or "").strip().lower()
+    if len(text) <= shingle_size:
+        return {text} if text else set()
+    return {text[i:i + shingle_size] for i in range(len(text) - shingle_size + 1)}
+
+
+def minhash_signatures(texts, shingle_size=4):
+    """
+    Compute MinHash signatures of the given texts over their character shingles.
+
+    Args:
+    - texts (list): The texts to sign.
+    - shingle_size (int): Number of characters per shingle.
+
+    Returns:
+    - numpy.ndarray of shape (len(texts), MINHASH_PERMUTATIONS).
+    """
+    signatures = np.full((len(texts), MINHASH_PERMUTATIONS), _MINHASH_PRIME, dtype=np.uint64)
+    for row, text in enumerate(texts):
+        shingles = text_shingles(text, shingle_size)
+        if not shingles:
+            continue
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+             for shingle in shingles),
+            dtype=np.uint64, count=len(shingles))
+        # 所有排列一次性向量化计算：(a * x + b) mod p，a、x 均小于 2^32 不会溢出
+        permuted = (_MINHASH_A[:, None] * hashes[None, :] + _MINHASH_B[:, None]) % _MINHASH_PRIME
+        signatures[row] = permuted.min(axis=1)
+    return signatures
+
+
+def near_duplicate_groups(texts, threshold=0.7, shingle_size=4):
+    """
+    Group near-duplicate texts by MinHash-estimated Jaccard similarity of their shingles.
+
+    Candidate pairs come from LSH banding instead of comparing every pair, so the cost stays
+    close to linear for large candidate sets.
+
+    Args:
+    - texts (list): The texts to group.
+    - threshold (float): Estimated Jaccard similarity at or above which two texts are near-duplicates.
+    - shingle_size (int): Number of characters per shingle.
+
+    Returns:
+    - List with the group id of every text; the group id is the index of the group's first text.
+    """
+    signatures = minhash_signatures(texts, shingle_size)
+    parent = list(range(len(texts)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    rows = MINHASH_PERMUTATIONS // MINHASH_BANDS
+    for band in range(MINHASH_BANDS):
+        buckets = {}
+        band_signatures = signatures[:, band * rows:(band + 1) * rows]
+        for index, band_signature in enumerate(band_signatures):
+            buckets.setdefault(band_signature.tobytes(), []).append(index)
+        for members in buckets.values():
+            for position, i in enumerate(members):
+                for j in members[position + 1:]:
+                    root_i, root_j = find(i), find(j)
+                    if root_i == root_j:
+                        continue
+                    if np.mean(signatures[i] == signatures[j]) >= threshold:
+                        # 较早的文本作为代表
+                        parent[max(root_i, root_j)] = min(root_i, root_j)
+    return [find(i) for i in range(len(texts))]
+
+
+def cosine_keep_mask(embeddings, threshold=0.95):
+    """
+    Greedily keep items whose cosine similarity to every already kept item is below threshold.
+
+    The full similarity matrix is computed in one vectorized product; items are visited in
+    their given (rank) order.
+
+    Args:
+    - embeddings (array-like): Matrix of shape (n, dim).
+    - threshold (float): Cosine similarity at or above which an item counts as redundant.
+
+    Returns:
+    - numpy.ndarray boolean mask of the items to keep.
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    if vectors.ndim != 2 or len(vectors) == 0:
+        return np.ones(len(vectors), dtype=bool)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors = vectors / norms
+    redundant = (vectors @ vectors.T) >= threshold
+    keep = np.zeros(len(vectors), dtype=bool)
+    for i in range(len(vectors)):
+        keep[i] = not redundant[i, keep].any()
+    return keep
+
+
+def _overlap_length(left, right, min_overlap):
+    # 最长的 left 后缀 == right 前缀
+    seed = right[:min_overlap]
+    if len(seed) < min_overlap:
+        return 0
+    tail = left[-len(right):]
+    position = tail.find(seed)
+    while position != -1:
+        if right.startswith(tail[position:]):
+            return len(tail) - position
+        position = tail.find(seed, position + 1)
+    return 0
+
+
+def _merge_pair(left, right, min_overlap):
+    if right in left:
+        return left
+    if left in right:
+        return right
+    overlap = _overlap_length(left, right, min_overlap)
+    if overlap:
+        return left + right[overlap:]
+    overlap = _overlap_length(right, left, min_overlap)
+    if overlap:
+        return right + left[overlap:]
+    return None
+
+
+def merge_adjacent_chunks(docs, min_overlap=12, source_key="source"):
+    """
+    Merge chunks of the same source whose text overlaps (the ingestion chunk_overlap) into one span.
+
+    Args:
+    - docs (list): langchain Documents in rank order.
+    - min_overlap (int): Minimum number of overlapping characters required to merge two chunks.
+    - source_key (str): Metadata key identifying the source document.
+
+    Returns:
+    - List of Documents; a merged span takes the rank of its best-ranked chunk.
+    """
+    merged = list(docs)
+    changed = True
+    while changed:
+        changed = False
+        for i in range(len(merged)):
+            source = (merged[i].metadata or {}).get(source_key)
+            if source is None:
+                continue
+            for j in range(i + 1, len(merged)):
+                if (merged[j].metadata or {}).get(source_key) != source:
+                    continue
+                text = _merge_pair(merged[i].page_content, merged[j].page_content, min_overlap)
+                if text is None:
+                    continue
+                merged[i] = type(merged[i])(page_content=text, metadata=dict(merged[i].metadata))
+                del merged[j]
+                changed = True
+                break
+            if changed:
+                break
+    return merged
+
+
+def deduplicate_documents(docs, embeddings=None, cosine_threshold=0.95, jaccard_threshold=0.7,
+                          minhash_min_docs=64, min_overlap=12):
+    """
+    Remove redundant retrieval results before they are packed into the prompt.
+
+    1. Small candidate sets with precomputed embeddings are filtered by cosine similarity.
+    2. Overlapping chunks of the same source are merged into one span.
+    3. Remaining near-duplicates (and every large candidate set) are removed by MinHash.
+
+    Args:
+    - docs (list): langchain Documents in rank order.
+    - embeddings (list): Optional precomputed embeddings aligned with docs; items may be None.
+    - cosine_threshold (float): Cosine similarity at or above which a chunk is redundant.
+    - jaccard_threshold (float): Estimated shingle Jaccard similarity at or above which two chunks
+      are near-duplicates.
+    - minhash_min_docs (int): Candidate count from which only MinHash is used.
+    - min_overlap (int): Minimum overlap in characters for merging adjacent chunks.
+
+    Returns:
+    - List of the remaining Documents in rank order.
+    """
+    if not docs:
+        return []
+    docs = list(docs)
+    if embeddings is not None and len(docs) < minhash_min_docs:
+        with_embedding = [i for i, embedding in enumerate(embeddings) if embedding is not None]
+        if len(with_embedding) > 1:
+            keep = cosine_keep_mask([embeddings[i] for i in with_embedding], cosine_threshold)
+            dropped = {index for index, kept in zip(with_embedding, keep) if not kept}
+            docs = [doc for i, doc in enumerate(docs) if i not in dropped]
+
+    docs = merge_adjacent_chunks(docs, min_overlap=min_overlap)
+
+    groups = near_duplicate_groups([doc.page_content for doc in docs], threshold=jaccard_threshold)
+    return [doc for i, doc in enumerate(docs) if groups[i] == i]
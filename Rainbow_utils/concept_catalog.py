@@ -0,0 +1,166 @@
+import csv
+import json
+import os
+import threading
+import time
+
+from Rainbow_utils.stock_price_store import DEFAULT_STORE_ROOT
+
+DEFAULT_CATALOG_PATH = os.path.join(DEFAULT_STORE_ROOT, "concept_catalog.json")
+# 随仓库发布的概念板块快照，本地目录为空时作为初始数据
+SEED_CATALOG_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "concept_name.csv")
+
+
+class ConceptCatalog:
+    """
+    On-disk catalog of the THS concept boards (name -> code, url, listing date, size).
+
+    The catalog is persisted as JSON with the time of the last refresh and kept in memory
+    as a dict, so lookups by concept name are O(1). When the catalog is older than max_age
+    it is refreshed in a background thread while lookups keep using the current data; a
+    name that is missing triggers one synchronous refresh (at most every miss_refresh_interval).
+
+    Parameters:
+    - path (str): JSON file of the catalog.
+    - max_age (float): Age in seconds after which the catalog is refreshed in the background.
+    - miss_refresh_interval (float): Minimum seconds between refreshes triggered by unknown names.
+    """
+
+    def __init__(self, path=DEFAULT_CATALOG_PATH, max_age=7 * 24 * 3600, miss_refresh_interval=600):
+        self.path = path
+        self.max_age = max_age
+        self.miss_refresh_interval = miss_refresh_interval
+        self.concepts = None
+        self.updated_at = 0.0
+        self.lock = threading.Lock()
+        self.refresh_lock = threading.Lock()
+        self.refresh_thread = None
+        self.last_refresh_attempt = 0.0
+
+    def load(self):
+        """
+        Load the persisted catalog (or the bundled snapshot) and start a background refresh when stale.
+        """
+        with self.lock:
+            if self.concepts is None:
+                if os.path.exists(self.path):
+                    with open(self.path, "r", encoding="utf-8") as catalog_file:
+                        data = json.load(catalog_file)
+                    self.concepts, self.updated_at = data["concepts"], data["updated_at"]
+                else:
+                    # 快照日期未知，视为过期以便尽快刷新
+                    self.concepts, self.updated_at = self._load_seed(), 0.0
+        if self.is_stale():
+            self.refresh_async()
+        return self
+
+    def _load_seed(self):
+        concepts = {}
+        if not os.path.exists(SEED_CATALOG_CSV):
+            return concepts
+        with open(SEED_CATALOG_CSV, "r", encoding="utf-8-sig", newline="") as seed_file:
+            for row in csv.DictReader(seed_file):
+                concepts[row["概念名称"]] = {"code": row["代码"] or row["网址"].split("/")[-2], "url": row["网址"],
+                                         "date": row["日期"],
+                                         "count": int(row["成分股数量"]) if row["成分股数量"].isdigit() else ""}
+        return concepts
+
+    def is_stale(self):
+        return time.time() - self.updated_at > self.max_age
+
+    def refresh(self):
+        """
+        Re-scrape the concept list from THS and persist it.
+
+        Returns:
+        - int: Number of concepts in the refreshed catalog.
+        """
+        from Rainbow_utils import get_concept_data
+
+        with self.refresh_lock:
+            # 绕过进程内的 lru_cache，获取最新数据
+            get_concept_data.stock_board_concept_name_ths.cache_clear()
+            concept_df = get_concept_data.stock_board_concept_name_ths()
+            concepts = {}
+            for row in concept_df.itertuples(index=False):
+                concepts[row.概念名称] = {
+                    "code": str(row.代码 or row.网址.split("/")[-2]),
+                    "url": row.网址,
+                    "date": str(row.日期) if row.日期 else "",
+                    "count": "" if row.成分股数量 is None or row.成分股数量 != row.成分股数量 else int(row.成分股数量),
+                }
+            updated_at = time.time()
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as catalog_file:
+                json.dump({"updated_at": updated_at, "concepts": concepts}, catalog_file, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            with self.lock:
+                self.concepts, self.updated_at = concepts, updated_at
+            return len(concepts)
+
+    def _refresh_quietly(self):
+        try:
+            print(f"概念板块目录已刷新，共 {self.refresh()} 个概念")
+        except Exception as e:
+            print(f"概念板块目录刷新失败: {e}")
+
+    def refresh_async(self):
+        """
+        Refresh the catalog in a background thread unless a refresh is already running
+        or was attempted less than miss_refresh_interval seconds ago.
+        """
+        with self.lock:
+            if self.refresh_thread is not None and self.refresh_thread.is_alive():
+                return self.refresh_thread
+            if time.time() - self.last_refresh_attempt < self.miss_refresh_interval:
+                return self.refresh_thread
+            self.last_refresh_attempt = time.time()
+            self.refresh_thread = threading.Thread(target=self._refresh_quietly, name="concept-catalog-refresh",
+                                                   daemon=True)
+            self.refresh_thread.start()
+            return self.refresh_thread
+
+    def lookup(self, name):
+        """
+        Return the catalog entry of a concept name (code, url, date, count).
+
+        Raises:
+        - KeyError: The concept is unknown even after a refresh.
+        """
+        self.load()
+        entry = self.concepts.get(name)
+        if entry is None and time.time() - self.last_refresh_attempt > self.miss_refresh_interval:
+            self.last_refresh_attempt = time.time()
+            self.refresh()
+            entry = self.concepts.get(name)
+        if entry is None:
+            raise KeyError(f"Unknown concept board: {name}")
+        return entry
+
+    def code(self, name):
+        return self.lookup(name)["code"]
+
+    def names(self):
+        self.load()
+        return list(self.concepts)
+
+
+_default_catalog = None
+_default_catalog_lock = threading.Lock()
+
+
+def get_concept_catalog():
+    """
+    Return the process-wide ConceptCatalog stored at DEFAULT_CATALOG_PATH.
+    """
+    global _default_catalog
+    with _default_catalog_lock:
+        if _default_catalog is None:
+            _default_catalog = ConceptCatalog()
+        return _default_catalog
+
+
+if __name__ == "__main__":
+    catalog = get_concept_catalog().load()
+    print(len(catalog.names()), catalog.lookup("光热发电"))
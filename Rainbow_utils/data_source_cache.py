@@ -0,0 +1,274 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from datetime import datetime, timedelta
+
+DEFAULT_SOURCE_CACHE_DIR = os.getenv("RAINBOW_SOURCE_CACHE_DIR", "./data/source_cache")
+
+# A股交易时段（本地时间），未接入交易所日历，节假日按工作日处理
+MORNING_OPEN, MORNING_CLOSE = (9, 30), (11, 30)
+AFTERNOON_OPEN, AFTERNOON_CLOSE = (13, 0), (15, 0)
+# 收盘后数据源完成当日更新的时间
+DAILY_SETTLE = (16, 0)
+# 定期报告披露窗口（月份）：年报/一季报 1-4 月，半年报 7-8 月，三季报 10 月
+REPORTING_MONTHS = {1, 2, 3, 4, 7, 8, 10}
+
+
+def _at(moment, hour_minute):
+    return moment.replace(hour=hour_minute[0], minute=hour_minute[1], second=0, microsecond=0)
+
+
+def _next_weekday_at(moment, hour_minute):
+    candidate = _at(moment, hour_minute)
+    while candidate <= moment or candidate.weekday() >= 5:
+        candidate = _at(candidate + timedelta(days=1), hour_minute)
+    return candidate
+
+
+def intraday_expiry(fetched_at, interval=300):
+    """
+    Intraday data (fund flows, board quotes): interval seconds during a trading session,
+    otherwise until the next session opens.
+    """
+    if fetched_at.weekday() < 5:
+        for session_open, session_close in [(MORNING_OPEN, MORNING_CLOSE), (AFTERNOON_OPEN, AFTERNOON_CLOSE)]:
+            if _at(fetched_at, session_open) <= fetched_at < _at(fetched_at, session_close):
+                return min(fetched_at + timedelta(seconds=interval), _at(fetched_at, session_close))
+        if fetched_at < _at(fetched_at, MORNING_OPEN):
+            return _at(fetched_at, MORNING_OPEN)
+        if fetched_at < _at(fetched_at, AFTERNOON_OPEN):
+            return _at(fetched_at, AFTERNOON_OPEN)
+    return _next_weekday_at(fetched_at, MORNING_OPEN)
+
+
+def daily_expiry(fetched_at):
+    """
+    Data updated once per trading day: valid until the next daily settlement after the close.
+    """
+    return _next_weekday_at(fetched_at, DAILY_SETTLE)
+
+
+def quarterly_expiry(fetched_at):
+    """
+    Financial statements: daily during the reporting windows, otherwise until the next window opens.
+    """
+    if fetched_at.month in REPORTING_MONTHS:
+        return daily_expiry(fetched_at)
+    month_start = fetched_at.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while month_start.month not in REPORTING_MONTHS:
+        month_start = (month_start + timedelta(days=32)).replace(day=1)
+    return month_start
+
+
+def static_expiry(fetched_at, days=30):
+    """
+    Slowly changing reference data (business profile, company info).
+    """
+    return fetched_at + timedelta(days=days)
+
+
+EXPIRY_POLICIES = {
+    "intraday": intraday_expiry,
+    "daily": daily_expiry,
+    "quarterly": quarterly_expiry,
+    "static": static_expiry,
+}
+
+# 各数据接口的缓存策略
+ENDPOINT_POLICIES = {
+    "stock_zyjs_ths": "static",
+    "stock_individual_info_em": "static",
+    "stock_financial_analysis_indicator": "quarterly",
+    "stock_individual_fund_flow": "intraday",
+    "stock_sector_fund_flow_rank": "intraday",
+    "stock_board_concept_info_ths": "intraday",
+    "stock_news_em": "intraday",
+    "stock_info_a_code_name": "daily",
+    # 主营业务新闻搜索及链接正文（按股票和截止日期缓存）
+    "main_business_search": "daily",
+    "main_business_link_details": "daily",
+}
+
+# 各策略过期后仍可先返回旧值、后台刷新的最长时间（秒）
+MAX_STALE = {
+    "intraday": 5 * 60,
+    "daily": 6 * 3600,
+    "quarterly": 3 * 24 * 3600,
+    "static": 7 * 24 * 3600,
+}
+
+
+class DataSourceCache:
+    """
+    Persistent memoization of data-source calls with a per-endpoint expiry policy.
+
+    Results are keyed by endpoint and keyword arguments and pickled under {root}/{endpoint}/.
+    A fresh entry is returned directly. An expired entry within the max_stale window of its
+    policy is returned as well while a background thread fetches the new value
+    (stale-while-revalidate); older or missing entries are fetched synchronously, and a failing
+    fetch falls back to the stale entry when there is one. Intraday entries expiring at the
+    morning open hold the previous session and are never served stale. Hits, stale hits,
+    misses and errors are counted per endpoint.
+
+    Parameters:
+    - root (str): Directory of the cache.
+    - policies (dict): Endpoint -> name of an EXPIRY_POLICIES entry, defaults to ENDPOINT_POLICIES.
+    - max_stale (dict): Policy name -> maximum seconds past expiry an entry is still served while
+      revalidating, defaults to MAX_STALE.
+    """
+
+    def __init__(self, root=DEFAULT_SOURCE_CACHE_DIR, policies=None, max_stale=None):
+        self.root = root
+        self.policies = dict(ENDPOINT_POLICIES, **(policies or {}))
+        self.max_stale = dict(MAX_STALE, **(max_stale or {}))
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.refreshing = set()
+        self.stats = {}
+
+    @staticmethod
+    def key(endpoint, kwargs):
+        arguments = json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=str)
+        return endpoint, hashlib.sha1(arguments.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, key[0], key[1] + ".pkl")
+
+    def _count(self, endpoint, outcome):
+        with self.lock:
+            endpoint_stats = self.stats.setdefault(endpoint, {"hit": 0, "stale": 0, "miss": 0, "error": 0})
+            endpoint_stats[outcome] += 1
+
+    def _load(self, key):
+        entry = self.entries.get(key)
+        if entry is None and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key), "rb") as entry_file:
+                    entry = pickle.load(entry_file)
+                self.entries[key] = entry
+            except (OSError, EOFError, pickle.UnpicklingError):
+                entry = None
+        return entry
+
+    def _fetch(self, key, endpoint, fetch, kwargs):
+        value = fetch(**kwargs)
+        fetched_at = datetime.now()
+        expiry = EXPIRY_POLICIES[self.policies.get(endpoint, "daily")](fetched_at)
+        entry = {"endpoint": endpoint, "kwargs": kwargs, "fetched_at": fetched_at.timestamp(),
+                 "expires_at": expiry.timestamp(), "value": value}
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as entry_file:
+            pickle.dump(entry, entry_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.entries[key] = entry
+        return value
+
+    def _stale_window(self, endpoint, entry):
+        policy = self.policies.get(endpoint, "daily")
+        expires_at = datetime.fromtimestamp(entry["expires_at"])
+        if policy == "intraday" and expires_at == _at(expires_at, MORNING_OPEN):
+            # 开盘前或上一交易日获取的盘中数据，开盘后不能再当作当前行情返回
+            return 0
+        return self.max_stale.get(policy, 0)
+
+    def _revalidate(self, key, endpoint, fetch, kwargs):
+        try:
+            self._fetch(key, endpoint, fetch, kwargs)
+        except Exception as e:
+            self._count(endpoint, "error")
+            print(f"{endpoint} 后台刷新失败: {e}")
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def call(self, endpoint, fetch, **kwargs):
+        """
+        Return fetch(**kwargs) through the cache.
+
+        Parameters:
+        - endpoint (str): Name of the endpoint, selects the expiry policy.
+        - fetch (callable): Function performing the actual request.
+        """
+        key = self.key(endpoint, kwargs)
+        with self.lock:
+            entry = self._load(key)
+        now = time.time()
+        if entry is not None and now < entry["expires_at"]:
+            self._count(endpoint, "hit")
+            return entry["value"]
+        if entry is not None and now - entry["expires_at"] < self._stale_window(endpoint, entry):
+            self._count(endpoint, "stale")
+            with self.lock:
+                start_refresh = key not in self.refreshing
+                self.refreshing.add(key)
+            if start_refresh:
+                threading.Thread(target=self._revalidate, args=(key, endpoint, fetch, kwargs),
+                                 name=f"revalidate-{endpoint}", daemon=True).start()
+            return entry["value"]
+
+        self._count(endpoint, "miss")
+        try:
+            return self._fetch(key, endpoint, fetch, kwargs)
+        except Exception:
+            self._count(endpoint, "error")
+            if entry is not None:
+                # 请求失败时退回到过期数据
+                return entry["value"]
+            raise
+
+    def warm(self, endpoint, fetch, **kwargs):
+        """
+        Fetch and store fetch(**kwargs) unless a fresh entry exists (used by prefetching).
+
+        Errors are raised to the caller, so it can retry.
+
+        Returns:
+        - bool: True when the value was fetched.
+        """
+        key = self.key(endpoint, kwargs)
+        with self.lock:
+            entry = self._load(key)
+        if entry is not None and time.time() < entry["expires_at"]:
+            return False
+        self._fetch(key, endpoint, fetch, kwargs)
+        return True
+
+    def wrap(self, endpoint, fetch):
+        """
+        Return a cached version of fetch taking the same keyword arguments.
+        """
+        return lambda **kwargs: self.call(endpoint, fetch, **kwargs)
+
+    def report(self):
+        """
+        Format the per-endpoint hit/stale/miss/error counts for the log.
+        """
+        with self.lock:
+            stats = {endpoint: dict(counts) for endpoint, counts in self.stats.items()}
+        outcomes = ("hit", "stale", "miss", "error")
+        total = {outcome: sum(counts[outcome] for counts in stats.values()) for outcome in outcomes}
+        lines = [f"data source cache: {total['hit']} hit, {total['stale']} stale, {total['miss']} miss, "
+                 f"{total['error']} error"]
+        for endpoint, counts in sorted(stats.items()):
+            lines.append(f"  {endpoint}: {counts['hit']} hit, {counts['stale']} stale, {counts['miss']} miss, "
+                         f"{counts['error']} error")
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    for moment in ["2023-12-12 10:00", "2023-12-12 12:00", "2023-12-12 15:30", "2023-12-15 17:00"]:
+        fetched_at = datetime.strptime(moment, "%Y-%m-%d %H:%M")
+        print(moment, {name: str(policy(fetched_at)) for name, policy in EXPIRY_POLICIES.items()})
+
+    cache = DataSourceCache("./data/source_cache_demo")
+    slow_square = cache.wrap("demo", lambda x: (time.sleep(0.5), x * x)[1])
+    for _ in range(2):
+        start_time = time.monotonic()
+        print(slow_square(x=3), f"{time.monotonic() - start_time:.2f}s")
+    print(cache.report())
@@ -5,18 +5,22 @@ Date: 2023/10/15 18:00
 Desc: 同花顺-板块-概念板块
 http://q.10jqka.com.cn/gn/detail/code/301558/
 """
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from functools import lru_cache
 from io import StringIO
 
 import pandas as pd
-import requests
 from bs4 import BeautifulSoup
 from py_mini_racer import py_mini_racer
 from tqdm import tqdm
 
-from akshare.datasets import get_ths_js
-from akshare.utils import demjson
+from Rainbow_utils import http_session
+
+THS_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36"
+# 并发翻页的最大线程数，过高容易触发同花顺的访问限制
+THS_PAGE_WORKERS = 4
 
 
 def stock_board_concept_graph_ths(symbol: str = "通用航空") -> pd.DataFrame:
@@ -38,7 +42,7 @@ def stock_board_concept_graph_ths(symbol: str = "通用航空") -> pd.DataFrame:
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36",
     }
-    r = requests.get(url, headers=headers)
+    r = http_session.get_session("10jqka").get(url, headers=headers)
     temp_df = pd.read_html(StringIO(r.text))[0]
     new_list = []
     for col in temp_df.columns:
@@ -55,6 +59,7 @@ def stock_board_concept_graph_ths(symbol: str = "通用航空") -> pd.DataFrame:
     return temp_df
 
 
+@lru_cache()
 def _get_file_content_ths(file: str = "ths.js") -> str:
     """
     获取 JS 文件的内容
@@ -63,12 +68,101 @@ def _get_file_content_ths(file: str = "ths.js") -> str:
     :return: 文件内容
     :rtype: str
     """
+    from akshare.datasets import get_ths_js
+
     setting_file_path = get_ths_js(file)
     with open(setting_file_path) as f:
         file_data = f.read()
     return file_data
 
 
+class ThsVCodeProvider:
+    """
+    线程安全的同花顺 v 参数（Cookie）生成器
+    ths.js 只在首次使用时加载并执行一次，之后每次调用只生成新的 v 值；
+    MiniRacer 上下文不支持多线程并发调用，因此用锁串行化
+    """
+
+    def __init__(self, file: str = "ths.js"):
+        self.file = file
+        self._js_code = None
+        self._lock = threading.Lock()
+
+    def get(self) -> str:
+        """
+        生成一个新的 v 值
+        :return: v 值
+        :rtype: str
+        """
+        with self._lock:
+            if self._js_code is None:
+                js_code = py_mini_racer.MiniRacer()
+                js_code.eval(_get_file_content_ths(self.file))
+                self._js_code = js_code
+            return self._js_code.call("v")
+
+
+_ths_v_code_provider = ThsVCodeProvider()
+
+
+def _ths_headers() -> dict:
+    """
+    带新 v 值 Cookie 的请求头
+    :return: 请求头
+    :rtype: dict
+    """
+    return {
+        "User-Agent": THS_USER_AGENT,
+        "Cookie": f"v={_ths_v_code_provider.get()}",
+    }
+
+
+def _fetch_ths_pages(url_template: str, page_num: int, parse_page, max_workers: int = THS_PAGE_WORKERS) -> pd.DataFrame:
+    """
+    并发获取同花顺分页数据，按页码顺序一次性合并
+    :param url_template: 含 {page} 占位符的分页地址
+    :type url_template: str
+    :param page_num: 总页数
+    :type page_num: int
+    :param parse_page: 解析单页响应文本的函数，返回 DataFrame
+    :type parse_page: callable
+    :param max_workers: 最大并发数
+    :type max_workers: int
+    :return: 所有分页的数据
+    :rtype: pandas.DataFrame
+    """
+
+    def fetch_page(page):
+        r = http_session.get_session("10jqka").get(url_template.format(page=page), headers=_ths_headers())
+        return parse_page(r.text)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, page_num))) as executor:
+        # map 保持页码顺序
+        page_df_list = list(tqdm(executor.map(fetch_page, range(1, page_num + 1)), total=page_num, leave=False))
+    if not page_df_list:
+        return pd.DataFrame()
+    return pd.concat(objs=page_df_list, ignore_index=True)
+
+
+def _read_first_table(text: str) -> pd.DataFrame:
+    return pd.read_html(StringIO(text))[0]
+
+
+def _parse_concept_name_page(text: str) -> pd.DataFrame:
+    soup = BeautifulSoup(text, features="lxml")
+    url_list = []
+    for item in (
+            soup.find(name="table", attrs={"class": "m-table m-pager-table"})
+                    .find("tbody")
+                    .find_all("tr")
+    ):
+        inner_url = item.find_all("td")[1].find("a")["href"]
+        url_list.append(inner_url)
+    temp_df = pd.read_html(StringIO(text))[0]
+    temp_df["网址"] = url_list
+    return temp_df
+
+
 @lru_cache()
 def stock_board_concept_name_ths() -> pd.DataFrame:
     """
@@ -78,41 +172,15 @@ def stock_board_concept_name_ths() -> pd.DataFrame:
     :rtype: pandas.DataFrame
     """
     url = "http://q.10jqka.com.cn/gn/index/field/addtime/order/desc/page/1/ajax/1/"
-    js_code = py_mini_racer.MiniRacer()
-    js_content = _get_file_content_ths("ths.js")
-    js_code.eval(js_content)
-    v_code = js_code.call("v")
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36",
-        "Cookie": f"v={v_code}",
-    }
-    r = requests.get(url, headers=headers)
+    headers = _ths_headers()
+    r = http_session.get_session("10jqka").get(url, headers=headers)
     soup = BeautifulSoup(r.text, features="lxml")
     total_page = soup.find(name="span", attrs={"class": "page_info"}).text.split("/")[1]
-    big_df = pd.DataFrame()
-    for page in tqdm(range(1, int(total_page) + 1), leave=False):
-        url = f"http://q.10jqka.com.cn/gn/index/field/addtime/order/desc/page/{page}/ajax/1/"
-        js_code = py_mini_racer.MiniRacer()
-        js_content = _get_file_content_ths("ths.js")
-        js_code.eval(js_content)
-        v_code = js_code.call("v")
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36",
-            "Cookie": f"v={v_code}",
-        }
-        r = requests.get(url, headers=headers)
-        soup = BeautifulSoup(r.text, features="lxml")
-        url_list = []
-        for item in (
-                soup.find(name="table", attrs={"class": "m-table m-pager-table"})
-                        .find("tbody")
-                        .find_all("tr")
-        ):
-            inner_url = item.find_all("td")[1].find("a")["href"]
-            url_list.append(inner_url)
-        temp_df = pd.read_html(StringIO(r.text))[0]
-        temp_df["网址"] = url_list
-        big_df = pd.concat(objs=[big_df, temp_df], ignore_index=True)
+    big_df = _fetch_ths_pages(
+        "http://q.10jqka.com.cn/gn/index/field/addtime/order/desc/page/{page}/ajax/1/",
+        int(total_page),
+        _parse_concept_name_page,
+    )
     big_df = big_df[["日期", "概念名称", "成分股数量", "网址"]]
     big_df["日期"] = pd.to_datetime(big_df["日期"], errors="coerce").dt.date
     big_df["成分股数量"] = pd.to_numeric(big_df["成分股数量"], errors="coerce")
@@ -122,7 +190,7 @@ def stock_board_concept_name_ths() -> pd.DataFrame:
 
     # 处理遗漏的板块
     url = "http://q.10jqka.com.cn/gn/detail/code/301558/"
-    r = requests.get(url, headers=headers)
+    r = http_session.get_session("10jqka").get(url, headers=headers)
     soup = BeautifulSoup(r.text, "lxml")
     need_list = [
         item.find_all("a") for item in soup.find_all(attrs={"class": "cate_group"})
@@ -177,32 +245,19 @@ def stock_board_concept_cons_ths(symbol: str = "阿里巴巴概念") -> pd.DataF
         .values[0]
         .split("/")[-2]
     )
-    js_code = py_mini_racer.MiniRacer()
-    js_content = _get_file_content_ths("ths.js")
-    js_code.eval(js_content)
-    v_code = js_code.call("v")
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36",
-        "Cookie": f"v={v_code}",
-    }
+    headers = _ths_headers()
     url = f"http://q.10jqka.com.cn/gn/detail/field/264648/order/desc/page/1/ajax/1/code/{symbol}"
-    r = requests.get(url, headers=headers)
+    r = http_session.get_session("10jqka").get(url, headers=headers)
     soup = BeautifulSoup(r.text, features="lxml")
     try:
         page_num = int(soup.find_all(name="a", attrs={"class": "changePage"})[-1]["page"])
     except IndexError as e:
         page_num = 1
-    big_df = pd.DataFrame()
-    for page in tqdm(range(1, page_num + 1), leave=False):
-        v_code = js_code.call("v")
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36",
-            "Cookie": f"v={v_code}",
-        }
-        url = f"http://q.10jqka.com.cn/gn/detail/field/264648/order/desc/page/{page}/ajax/1/code/{symbol}"
-        r = requests.get(url, headers=headers)
-        temp_df = pd.read_html(StringIO(r.text))[0]
-        big_df = pd.concat(objs=[big_df, temp_df], ignore_index=True)
+    big_df = _fetch_ths_pages(
+        "http://q.10jqka.com.cn/gn/detail/field/264648/order/desc/page/{page}/ajax/1/code/" + symbol,
+        page_num,
+        _read_first_table,
+    )
     big_df.rename(
         mapper={
             "涨跌幅(%)": "涨跌幅",
@@ -219,25 +274,35 @@ def stock_board_concept_cons_ths(symbol: str = "阿里巴巴概念") -> pd.DataF
     return big_df
 
 
-def stock_board_concept_info_ths(symbol: str = "阿里巴巴概念", stock_board_ths_map_df=None) -> pd.DataFrame:
+def stock_board_concept_info_ths(symbol: str = "阿里巴巴概念", stock_board_ths_map_df=None,
+                                 symbol_code: str = None) -> pd.DataFrame:
     """
     同花顺-板块-概念板块-板块简介
     http://q.10jqka.com.cn/gn/detail/code/301558/
     :param symbol: 板块简介
     :type symbol: str
+    :param stock_board_ths_map_df: 概念板块名称与网址的映射表，未提供时从概念板块目录中查找
+    :type stock_board_ths_map_df: pandas.DataFrame
+    :param symbol_code: 概念板块代码，提供时直接使用
+    :type symbol_code: str
     :return: 板块简介
     :rtype: pandas.DataFrame
     """
-    symbol_code = (
-        stock_board_ths_map_df[stock_board_ths_map_df["概念名称"] == symbol]["网址"]
-        .values[0]
-        .split("/")[-2]
-    )
+    if symbol_code is None and stock_board_ths_map_df is not None:
+        symbol_code = (
+            stock_board_ths_map_df[stock_board_ths_map_df["概念名称"] == symbol]["网址"]
+            .values[0]
+            .split("/")[-2]
+        )
+    elif symbol_code is None:
+        from Rainbow_utils.concept_catalog import get_concept_catalog
+
+        symbol_code = get_concept_catalog().code(symbol)
     url = f"http://q.10jqka.com.cn/gn/detail/code/{symbol_code}/"
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36",
     }
-    r = requests.get(url, headers=headers)
+    r = http_session.get_session("10jqka").get(url, headers=headers)
     soup = BeautifulSoup(r.text, features="lxml")
     name_list = [
         item.text
@@ -265,12 +330,14 @@ def stock_board_concept_hist_ths(
     :return: 板块简介
     :rtype: pandas.DataFrame
     """
+    from akshare.utils import demjson
+
     code_map = _stock_board_concept_code_ths()
     symbol_url = f"http://q.10jqka.com.cn/gn/detail/code/{code_map[symbol]}/"
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36",
     }
-    r = requests.get(symbol_url, headers=headers)
+    r = http_session.get_session("10jqka").get(symbol_url, headers=headers)
     soup = BeautifulSoup(r.text, "lxml")
     symbol_code = soup.find("div", attrs={"class": "board-hq"}).find("span").text
     big_df = pd.DataFrame()
@@ -282,7 +349,7 @@ def stock_board_concept_hist_ths(
             "Referer": "http://q.10jqka.com.cn",
             "Host": "d.10jqka.com.cn",
         }
-        r = requests.get(url, headers=headers)
+        r = http_session.get_session("10jqka").get(url, headers=headers)
         data_text = r.text
         try:
             demjson.decode(data_text[data_text.find("{"): -1])
@@ -352,38 +419,25 @@ def stock_board_cons_ths(symbol: str = "301558") -> pd.DataFrame:
     :return: 行业板块或者概念板块的成份股
     :rtype: pandas.DataFrame
     """
-    js_code = py_mini_racer.MiniRacer()
-    js_content = _get_file_content_ths("ths.js")
-    js_code.eval(js_content)
-    v_code = js_code.call("v")
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36",
-        "Cookie": f"v={v_code}",
-    }
+    headers = _ths_headers()
     url = f"http://q.10jqka.com.cn/thshy/detail/field/199112/order/desc/page/1/ajax/1/code/{symbol}"
-    r = requests.get(url, headers=headers)
+    r = http_session.get_session("10jqka").get(url, headers=headers)
     soup = BeautifulSoup(r.text, "lxml")
     url_flag = "thshy"
     if soup.find("td", attrs={"colspan": "14"}):
         url = f"http://q.10jqka.com.cn/gn/detail/field/199112/order/desc/page/1/ajax/1/code/{symbol}"
-        r = requests.get(url, headers=headers)
+        r = http_session.get_session("10jqka").get(url, headers=headers)
         soup = BeautifulSoup(r.text, "lxml")
         url_flag = "gn"
     try:
         page_num = int(soup.find_all("a", attrs={"class": "changePage"})[-1]["page"])
     except IndexError as e:
         page_num = 1
-    big_df = pd.DataFrame()
-    for page in tqdm(range(1, page_num + 1), leave=False):
-        v_code = js_code.call("v")
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36",
-            "Cookie": f"v={v_code}",
-        }
-        url = f"http://q.10jqka.com.cn/{url_flag}/detail/field/199112/order/desc/page/{page}/ajax/1/code/{symbol}"
-        r = requests.get(url, headers=headers)
-        temp_df = pd.read_html(StringIO(r.text))[0]
-        big_df = pd.concat([big_df, temp_df], ignore_index=True)
+    big_df = _fetch_ths_pages(
+        f"http://q.10jqka.com.cn/{url_flag}/detail/field/199112/order/desc/page/{{page}}/ajax/1/code/{symbol}",
+        page_num,
+        _read_first_table,
+    )
     big_df.rename(
         {
             "涨跌幅(%)": "涨跌幅",
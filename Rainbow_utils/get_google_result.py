@@ -1,17 +1,17 @@
 import httplib2
-import pandas as pd
-from googleapiclient.discovery import build
 import json
 import urllib.parse
 import urllib.request
 import requests
 from bs4 import BeautifulSoup
-import winreg
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
+from lxml import etree
 from dotenv import load_dotenv
 import os
-import requests
+from Rainbow_utils import http_session
+from Rainbow_utils.lazy_import import lazy_import
+
+# googleapiclient、selenium 在首次搜索时于函数内导入
+tiktoken = lazy_import("tiktoken")
 
 load_dotenv()
 
@@ -19,30 +19,22 @@ load_dotenv()
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
 GOOGLE_CSE_ID = os.getenv('GOOGLE_CSE_ID')
 
+# 正文提取时整棵跳过的样板标签
+BOILERPLATE_TAGS = {"head", "script", "style", "noscript", "nav", "header", "footer", "aside", "form", "iframe",
+                    "svg", "template", "button", "select"}
+# 结束时输出文本的块级标签
+BLOCK_TAGS = {"p", "div", "li", "td", "th", "dd", "dt", "pre", "blockquote", "article", "section", "main",
+              "h1", "h2", "h3", "h4", "h5", "h6", "table", "ul", "ol", "body", "html"}
 
-def get_windows_proxy():
-    proxy_settings = {"http": None, "https": None}
-    try:
-        with winreg.OpenKey(winreg.HKEY_CURRENT_USER,
-                            r"Software\Microsoft\Windows\CurrentVersion\Internet Settings") as key:
-            proxy_enable = winreg.QueryValueEx(key, "ProxyEnable")[0]
-            proxy_server = winreg.QueryValueEx(key, "ProxyServer")[0]
-
-            if proxy_enable:
-                # 处理可能的多个代理设置
-                if ';' in proxy_server:
-                    for proxy in proxy_server.split(';'):
-                        if proxy.startswith("http="):
-                            proxy_settings["http"] = proxy.split('=')[1]
-                        elif proxy.startswith("https="):
-                            proxy_settings["https"] = proxy.split('=')[1]
-                else:
-                    proxy_settings["http"] = proxy_settings["https"] = proxy_server
 
-    except Exception as e:
-        print(f"Error retrieving proxy settings: {e}")
+def set_global_proxy(proxy):
+    """
+    Use the given proxy (e.g. the one entered in the UI) for all subsequent requests.
 
-    return proxy_settings
+    Parameters:
+    - proxy (str): Proxy URL such as http://localhost:7890.
+    """
+    http_session.set_proxy(proxy)
 
 
 def get_published_date(item):
@@ -68,22 +60,26 @@ def google_custom_search(query, api_key=GOOGLE_API_KEY, custom_search_engine_id=
     Returns:
     - tuple: Tuple containing two lists, the first with the links and the second with the merged titles and snippets.
     """
+    from googleapiclient.discovery import build
+
     print("google_custom_search......")
 
-    # Automatically detect and set system proxy
-    proxies = get_windows_proxy()
-    http_proxy = proxies.get('http')
-    https_proxy = proxies.get('https')
+    # Use the shared, once-resolved proxy settings
+    proxies = http_session.get_proxies()
+    http_proxy = proxies.get('https') or proxies.get('http')
 
     # Create an Http object with proxy support
-    proxy_info = httplib2.ProxyInfo(
-        httplib2.socks.PROXY_TYPE_HTTP,
-        http_proxy.split(':')[0],
-        int(http_proxy.split(':')[1]),
-        proxy_rdns=True
-    ) if http_proxy else None
-
-    http = httplib2.Http(proxy_info=proxy_info) if proxy_info else httplib2.Http()
+    proxy_info = None
+    if http_proxy:
+        parsed_proxy = urllib.parse.urlparse(http_proxy if "://" in http_proxy else "http://" + http_proxy)
+        proxy_info = httplib2.ProxyInfo(
+            httplib2.socks.PROXY_TYPE_HTTP,
+            parsed_proxy.hostname,
+            parsed_proxy.port,
+            proxy_rdns=True
+        )
+
+    http = httplib2.Http(proxy_info=proxy_info, timeout=http_session.DEFAULT_TIMEOUT)
 
     # Setup Google Custom Search API service
     service = build("customsearch", "v1", developerKey=api_key, http=http)
@@ -174,6 +170,9 @@ def selenium_google_answer_box(query, chrome_driver_path):
     Returns:
     - list: Extracted information from the Google answer box.
     """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
     # print("selenium_google_answer_box......", os.environ['http_proxy'])
     print("selenium_google_answer_box......")
     options = webdriver.ChromeOptions()
@@ -201,7 +200,7 @@ def selenium_google_answer_box(query, chrome_driver_path):
 
 def get_website_content(url):
     """
-    Get the main content of a website using system proxy settings.
+    Get the main content of a website using the shared HTTP session.
 
     Parameters:
     - url (str): The URL of the website.
@@ -211,11 +210,8 @@ def get_website_content(url):
     """
     print("get_website_content.....")
 
-    # Get system proxy settings
-    proxies = get_windows_proxy()
-
     try:
-        response = requests.get(url, proxies=proxies)
+        response = http_session.get_session().get(url)
         if response.status_code == 200:
             html_content = response.text
             soup = BeautifulSoup(html_content, 'html.parser')
@@ -232,9 +228,91 @@ def get_website_content(url):
         return None
 
 
-print(get_windows_proxy())
+def get_website_main_content(url, max_tokens=300, max_bytes=2 * 1024 * 1024, chunk_size=16 * 1024,
+                             encoding_name="cl100k_base", timeout=10):
+    """
+    Stream the main text content of a website until the token budget is filled.
+
+    The response body is read in chunks (never more than max_bytes) and fed into an
+    incremental lxml parser. Boilerplate subtrees (script, style, nav, footer...) are
+    dropped, and the download stops as soon as max_tokens tokens of text are collected.
+
+    Parameters:
+    - url (str): The URL of the website.
+    - max_tokens (int): Token budget of the returned text.
+    - max_bytes (int): Maximum number of response bytes to download.
+    - chunk_size (int): Size of each streamed chunk in bytes.
+    - encoding_name (str): The tiktoken encoding used to count tokens.
+    - timeout (int): Connect/read timeout in seconds.
+
+    Returns:
+    - str: The main content of the website, or None if the request fails.
+    """
+    print("get_website_main_content.....")
+
+    encoding = tiktoken.get_encoding(encoding_name)
+    parser = etree.HTMLPullParser(events=("start", "end"), recover=True, no_network=True)
+    fragments = []
+    used_tokens = 0
+    skip_depth = 0
+
+    def collect(events):
+        # 返回 True 表示 token 预算已满
+        nonlocal used_tokens, skip_depth
+        for event, element in events:
+            tag = element.tag if isinstance(element.tag, str) else ""
+            tag = tag.lower()
+            if tag in BOILERPLATE_TAGS:
+                if event == "start":
+                    skip_depth += 1
+                else:
+                    skip_depth -= 1
+                    element.clear(keep_tail=True)
+                continue
+            if event != "end" or skip_depth > 0 or tag not in BLOCK_TAGS:
+                continue
+            text = " ".join(" ".join(element.itertext()).split())
+            # 已输出的块清空，避免祖先块重复输出
+            element.clear(keep_tail=True)
+            if not text:
+                continue
+            tokens = encoding.encode(text)
+            if used_tokens + len(tokens) >= max_tokens:
+                fragments.append(encoding.decode(tokens[:max_tokens - used_tokens]))
+                used_tokens = max_tokens
+                return True
+            fragments.append(text)
+            used_tokens += len(tokens)
+        return False
+
+    try:
+        with http_session.get_session().get(url, stream=True, timeout=timeout) as response:
+            if response.status_code != 200:
+                print(f"Failed to retrieve content. Status code: {response.status_code}")
+                return None
+            received_bytes = 0
+            budget_filled = False
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                received_bytes += len(chunk)
+                parser.feed(chunk)
+                budget_filled = collect(parser.read_events())
+                if budget_filled or received_bytes >= max_bytes:
+                    break
+        if not budget_filled:
+            try:
+                parser.close()
+            except etree.LxmlError:
+                pass
+            collect(parser.read_events())
+    except requests.RequestException as e:
+        print(f"Request failed: {e}")
+        return None
+
+    return " ".join(fragments)
+
+
 if __name__ == "__main__":
-    # print(get_windows_proxy())
+    print(http_session.get_proxies())
 
     google_search_results, google_search_results2 = google_custom_search("2023年12月7日新闻", GOOGLE_API_KEY,
                                                                          GOOGLE_CSE_ID)
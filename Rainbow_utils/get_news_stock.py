@@ -7,8 +7,6 @@ https://so.eastmoney.com/news/s?keyword=%E4%B8%AD%E5%9B%BD%E4%BA%BA%E5%AF%BF&pag
 import json
 from datetime import datetime
 
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 import pandas as pd
 import re
 from urllib.parse import quote
@@ -23,6 +21,9 @@ def stock_news_em(symbol: str = "601628", pageSize: int = 10, chrome_driver_path
     :return: 个股新闻
     :rtype: pandas.DataFrame
     """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
     options = webdriver.ChromeOptions()
     options.add_experimental_option('excludeSwitches', ['enable-logging'])  # 禁止打印日志
     options.add_argument('--ignore-certificate-errors')
@@ -1,8 +1,9 @@
 import re
-import langid
-import tiktoken
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from Rainbow_utils.lazy_import import lazy_import
+
+# 重量级依赖延迟到首次使用时再导入
+langid = lazy_import("langid")
+tiktoken = lazy_import("tiktoken")
 
 
 def detect_language(text):
@@ -83,6 +84,9 @@ def truncate_string_to_max_tokens(input_string, max_tokens, tokenizer_name, step
 
 
 def cosine_sim(str1, str2):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics.pairwise import cosine_similarity
+
     vectorizer = TfidfVectorizer().fit([str1, str2])
     tfidf = vectorizer.transform([str1, str2])
     return cosine_similarity(tfidf)[0, 1]
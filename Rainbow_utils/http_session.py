@@ -0,0 +1,180 @@
+import os
+import sys
+import threading
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 默认网络参数，可通过环境变量覆盖
+DEFAULT_TIMEOUT = float(os.getenv("RAINBOW_HTTP_TIMEOUT", "15"))
+DEFAULT_POOL_CONNECTIONS = int(os.getenv("RAINBOW_HTTP_POOL_CONNECTIONS", "16"))
+DEFAULT_POOL_MAXSIZE = int(os.getenv("RAINBOW_HTTP_POOL_MAXSIZE", "8"))
+DEFAULT_RETRIES = int(os.getenv("RAINBOW_HTTP_RETRIES", "2"))
+DEFAULT_BACKOFF_FACTOR = float(os.getenv("RAINBOW_HTTP_BACKOFF_FACTOR", "0.5"))
+RETRY_STATUS_FORCELIST = (429, 500, 502, 503, 504)
+
+_proxy_lock = threading.Lock()
+_proxy_settings = None
+_session_lock = threading.Lock()
+_sessions = {}
+
+
+def _read_env_proxy():
+    http_proxy = os.environ.get("http_proxy") or os.environ.get("HTTP_PROXY")
+    https_proxy = os.environ.get("https_proxy") or os.environ.get("HTTPS_PROXY")
+    all_proxy = os.environ.get("all_proxy") or os.environ.get("ALL_PROXY")
+    return {"http": http_proxy or all_proxy, "https": https_proxy or all_proxy}
+
+
+def _read_windows_registry_proxy():
+    proxy_settings = {"http": None, "https": None}
+    if sys.platform != "win32":
+        return proxy_settings
+    try:
+        import winreg
+        with winreg.OpenKey(winreg.HKEY_CURRENT_USER,
+                            r"Software\Microsoft\Windows\CurrentVersion\Internet Settings") as key:
+            proxy_enable = winreg.QueryValueEx(key, "ProxyEnable")[0]
+            proxy_server = winreg.QueryValueEx(key, "ProxyServer")[0]
+
+            if proxy_enable:
+                # 处理可能的多个代理设置
+                if ';' in proxy_server:
+                    for proxy in proxy_server.split(';'):
+                        if proxy.startswith("http="):
+                            proxy_settings["http"] = proxy.split('=')[1]
+                        elif proxy.startswith("https="):
+                            proxy_settings["https"] = proxy.split('=')[1]
+                else:
+                    proxy_settings["http"] = proxy_settings["https"] = proxy_server
+    except Exception as e:
+        logging.warning(f"Error retrieving proxy settings from registry: {e}")
+    return proxy_settings
+
+
+def get_proxies(refresh=False):
+    """
+    Resolve the proxy settings once and return a copy of them.
+
+    Resolution order: the RAINBOW_HTTP_PROXY config value (.env), the standard proxy
+    environment variables, then the Windows registry (Windows only).
+
+    Parameters:
+    - refresh (bool): Resolve the settings again instead of using the cached result.
+
+    Returns:
+    - dict: {"http": proxy or None, "https": proxy or None}, usable as requests proxies.
+    """
+    global _proxy_settings
+    with _proxy_lock:
+        if _proxy_settings is None or refresh:
+            configured_proxy = os.getenv("RAINBOW_HTTP_PROXY")
+            if configured_proxy:
+                proxy_settings = {"http": configured_proxy, "https": configured_proxy}
+            else:
+                proxy_settings = _read_env_proxy()
+                if not (proxy_settings["http"] or proxy_settings["https"]):
+                    proxy_settings = _read_windows_registry_proxy()
+            _proxy_settings = proxy_settings
+            # 代理变化后已有的会话需要同步
+            for session in _sessions.values():
+                session.proxies.clear()
+                session.proxies.update(_active_proxies(_proxy_settings))
+        return dict(_proxy_settings)
+
+
+def set_proxy(proxy):
+    """
+    Override the resolved proxy, e.g. with the value typed into the UI.
+
+    Parameters:
+    - proxy (str): Proxy URL such as http://localhost:7890, empty to resolve the settings again.
+    """
+    global _proxy_settings
+    if not proxy:
+        get_proxies(refresh=True)
+        return
+    with _proxy_lock:
+        _proxy_settings = {"http": proxy, "https": proxy}
+        for session in _sessions.values():
+            session.proxies.clear()
+            session.proxies.update(_active_proxies(_proxy_settings))
+
+
+def _active_proxies(proxy_settings):
+    return {scheme: proxy for scheme, proxy in proxy_settings.items() if proxy}
+
+
+class TimeoutSession(requests.Session):
+    """
+    A requests.Session that applies a default timeout to every request.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def create_session(timeout=DEFAULT_TIMEOUT, pool_connections=DEFAULT_POOL_CONNECTIONS,
+                   pool_maxsize=DEFAULT_POOL_MAXSIZE, retries=DEFAULT_RETRIES,
+                   backoff_factor=DEFAULT_BACKOFF_FACTOR, headers=None):
+    """
+    Create a new pooled keep-alive session with the shared proxy, timeout and retry policy.
+
+    Use this for clients that keep their own cookies; otherwise prefer get_session().
+
+    Parameters:
+    - timeout (float): Default timeout of every request in seconds.
+    - pool_connections (int): Number of per-host connection pools to cache.
+    - pool_maxsize (int): Maximum number of connections kept per host.
+    - retries (int): Number of retries on connection errors and 429/5xx responses.
+    - backoff_factor (float): Exponential backoff factor between retries.
+    - headers (dict): Default headers of the session.
+
+    Returns:
+    - TimeoutSession: The configured session.
+    """
+    session = TimeoutSession(timeout=timeout)
+    retry = Retry(total=retries, connect=retries, read=retries, backoff_factor=backoff_factor,
+                  status_forcelist=RETRY_STATUS_FORCELIST, allowed_methods=frozenset(["GET", "HEAD"]),
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                          max_retries=retry, pool_block=True)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.proxies.update(_active_proxies(get_proxies()))
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def get_session(name="default", **kwargs):
+    """
+    Return the shared session registered under name, creating it on first use.
+
+    Parameters:
+    - name (str): Session name, e.g. one per scraped site.
+    - kwargs: Passed to create_session() when the session is created.
+
+    Returns:
+    - TimeoutSession: The shared session.
+    """
+    session = _sessions.get(name)
+    if session is None:
+        with _session_lock:
+            session = _sessions.get(name)
+            if session is None:
+                session = create_session(**kwargs)
+                _sessions[name] = session
+    return session
+
+
+if __name__ == "__main__":
+    print(get_proxies())
+    print(get_session().get("https://www.baidu.com").status_code)
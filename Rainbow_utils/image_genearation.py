@@ -18,6 +18,8 @@ import requests
 import os
 import logging
 
+from Rainbow_utils import http_session
+
 
 def get_proxy(proxy: str = None):
     """
@@ -124,7 +126,8 @@ class ImageGen:
     ) -> None:
         if proxy_user is None:
             proxy_user = {"http_user": "http", "https_user": "https"}
-        self.session: requests.Session = requests.Session()
+        # 使用带连接池、超时和重试策略的会话，cookie 仍然按实例隔离
+        self.session: requests.Session = http_session.create_session()
         self.proxy: str = get_proxy(proxy)
         if self.proxy is not None:
             self.session.proxies.update({
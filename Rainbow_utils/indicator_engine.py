@@ -0,0 +1,326 @@
+import numpy as np
+
+# 与 calculate_technical_indicators 一致的默认参数，另加 KDJ、布林带、ATR
+DEFAULT_PARAMS = {
+    "ma_window": 5,
+    "macd_windows": (12, 26, 9),
+    "rsi_window": 14,
+    "rsi_method": "sma",
+    "cci_window": 20,
+    "kdj_windows": (9, 3, 3),
+    "boll_window": 20,
+    "boll_width": 2.0,
+    "atr_window": 14,
+}
+
+
+def stack_bars(bars_by_symbol, fields=("open", "high", "low", "close", "volume")):
+    """
+    Align per-symbol bars on the union of their trading dates.
+
+    Args:
+    - bars_by_symbol (dict): symbol -> structured array with a "date" field sorted ascending,
+      e.g. StockPriceStore.read().
+    - fields (tuple): Fields to stack.
+
+    Returns:
+    - tuple: (symbols list, dates 1D int array, dict field -> 2D float array of shape
+      (symbols, dates) with NaN where a symbol has no bar, boolean mask of existing bars)
+    """
+    symbols = list(bars_by_symbol)
+    non_empty = [bars["date"] for bars in bars_by_symbol.values() if len(bars)]
+    dates = np.unique(np.concatenate(non_empty)) if non_empty else np.empty(0, dtype=np.int32)
+    arrays = {field: np.full((len(symbols), len(dates)), np.nan) for field in fields}
+    mask = np.zeros((len(symbols), len(dates)), dtype=bool)
+    for row, symbol in enumerate(symbols):
+        bars = bars_by_symbol[symbol]
+        if not len(bars):
+            continue
+        columns = np.searchsorted(dates, bars["date"])
+        mask[row, columns] = True
+        for field in fields:
+            arrays[field][row, columns] = bars[field]
+    return symbols, dates, arrays, mask
+
+
+def stack_price_store(store, symbols, start_date, end_date, adjust=""):
+    """
+    Read the given symbols from a StockPriceStore and align them with stack_bars().
+    """
+    return stack_bars({symbol: store.read(symbol, start_date, end_date, adjust) for symbol in symbols})
+
+
+def pack(values, mask):
+    """
+    Move the valid bars of every row to the front, so ragged histories and suspension gaps
+    become dense left-aligned rows that the recursive and windowed kernels can share.
+
+    Returns:
+    - tuple: (packed array with NaN after each row's valid bars, gather order, validity of packed cells)
+    """
+    order = np.argsort(~mask, axis=1, kind="stable")
+    packed = np.take_along_axis(values, order, axis=1)
+    lengths = mask.sum(axis=1)
+    valid = np.arange(values.shape[1])[None, :] < lengths[:, None]
+    return np.where(valid, packed, np.nan), order, valid
+
+
+def unpack(packed, order, valid):
+    """
+    Inverse of pack(): scatter packed rows back onto the date axis, NaN where there is no bar.
+    """
+    values = np.full(packed.shape, np.nan)
+    np.put_along_axis(values, order, np.where(valid, packed, np.nan), axis=1)
+    return values
+
+
+def rolling_mean(values, window, min_periods=None):
+    """
+    Trailing rolling mean along the last axis of left-aligned rows (cumulative-sum kernel).
+    """
+    min_periods = window if min_periods is None else min_periods
+    filled = np.nan_to_num(values)
+    cumsum = np.concatenate([np.zeros(values.shape[:-1] + (1,)), np.cumsum(filled, axis=-1)], axis=-1)
+    positions = np.arange(values.shape[-1])
+    window_start = np.maximum(positions + 1 - window, 0)
+    counts = positions + 1 - window_start
+    sums = cumsum[..., positions + 1] - cumsum[..., window_start]
+    with np.errstate(invalid="ignore"):
+        means = sums / counts
+    return np.where(counts >= min_periods, means, np.nan)
+
+
+def rolling_std(values, window, min_periods=None, ddof=0):
+    """
+    Trailing rolling standard deviation along the last axis of left-aligned rows.
+    """
+    min_periods = window if min_periods is None else min_periods
+    positions = np.arange(values.shape[-1])
+    counts = positions + 1 - np.maximum(positions + 1 - window, 0)
+    mean = rolling_mean(values, window, min_periods=1)
+    mean_square = rolling_mean(np.square(values), window, min_periods=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        variance = np.maximum(mean_square - np.square(mean), 0.0) * counts / (counts - ddof)
+    return np.where(counts >= max(min_periods, ddof + 1), np.sqrt(variance), np.nan)
+
+
+def _rolling_extreme(values, window, reducer, fill):
+    padded = np.concatenate([np.full(values.shape[:-1] + (window - 1,), fill), np.where(np.isnan(values), fill, values)],
+                            axis=-1)
+    return reducer(np.lib.stride_tricks.sliding_window_view(padded, window, axis=-1), axis=-1)
+
+
+def rolling_max(values, window):
+    return _rolling_extreme(values, window, np.max, -np.inf)
+
+
+def rolling_min(values, window):
+    return _rolling_extreme(values, window, np.min, np.inf)
+
+
+def ewm(values, alpha, initial=None):
+    """
+    Recursive exponential moving average (pandas ewm(adjust=False)) along the last axis.
+
+    The recursion runs over the days; every step is vectorized across all symbols.
+    """
+    result = np.empty_like(values)
+    previous = values[..., 0] if initial is None else np.full(values.shape[:-1], initial, dtype=float)
+    if initial is not None:
+        previous = (1 - alpha) * previous + alpha * values[..., 0]
+    result[..., 0] = previous
+    for t in range(1, values.shape[-1]):
+        previous = (1 - alpha) * previous + alpha * values[..., t]
+        result[..., t] = previous
+    return result
+
+
+def ema(values, span):
+    return ewm(values, 2.0 / (span + 1))
+
+
+def macd(close, windows=(12, 26, 9)):
+    short_window, long_window, signal_window = windows
+    macd_line = ema(close, short_window) - ema(close, long_window)
+    return macd_line, ema(macd_line, signal_window)
+
+
+def rsi(close, window=14, method="sma"):
+    """
+    RSI of left-aligned rows.
+
+    method="sma" reproduces calculate_technical_indicators (simple rolling mean, min_periods=1),
+    method="wilder" uses Wilder smoothing (alpha = 1 / window).
+    """
+    delta = np.diff(close, axis=-1, prepend=np.nan)
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+    if method == "wilder":
+        avg_gain, avg_loss = ewm(gain, 1.0 / window), ewm(loss, 1.0 / window)
+    else:
+        avg_gain, avg_loss = rolling_mean(gain, window, 1), rolling_mean(loss, window, 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return 100 - 100 / (1 + avg_gain / avg_loss)
+
+
+def cci(high, low, close, window=20):
+    """
+    CCI with the mean absolute deviation taken as in calculate_technical_indicators
+    (rolling mean of |TP - SMA|, min_periods=1).
+    """
+    typical_price = (high + low + close) / 3
+    sma = rolling_mean(typical_price, window, 1)
+    mad = rolling_mean(np.abs(typical_price - sma), window, 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (typical_price - sma) / (0.015 * mad)
+
+
+def kdj(high, low, close, windows=(9, 3, 3)):
+    rsv_window, k_window, d_window = windows
+    lowest, highest = rolling_min(low, rsv_window), rolling_max(high, rsv_window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rsv = np.where(highest > lowest, (close - lowest) / (highest - lowest) * 100, 50.0)
+    # K、D 以 50 为初值递推
+    k = ewm(rsv, 1.0 / k_window, initial=50.0)
+    d = ewm(k, 1.0 / d_window, initial=50.0)
+    return k, d, 3 * k - 2 * d
+
+
+def bollinger(close, window=20, width=2.0):
+    middle = rolling_mean(close, window)
+    std = rolling_std(close, window)
+    return middle + width * std, middle, middle - width * std
+
+
+def atr(high, low, close, window=14):
+    previous_close = np.concatenate([close[..., :1], close[..., :-1]], axis=-1)
+    true_range = np.maximum.reduce([high - low, np.abs(high - previous_close), np.abs(low - previous_close)])
+    return ewm(true_range, 1.0 / window)
+
+
+def compute_indicators(high, low, close, mask=None, **params):
+    """
+    Compute every indicator for all symbols in one vectorized pass.
+
+    Args:
+    - high, low, close (numpy.ndarray): Arrays of shape (symbols, days).
+    - mask (numpy.ndarray): Boolean array marking existing bars; defaults to non-NaN close.
+      Rows may start late (ragged histories) or have gaps (suspensions); indicators advance
+      over each symbol's own bars only.
+    - params: Overrides of DEFAULT_PARAMS.
+
+    Returns:
+    - dict: Indicator name -> array of shape (symbols, days), NaN where a symbol has no bar.
+    """
+    params = dict(DEFAULT_PARAMS, **params)
+    high, low, close = (np.atleast_2d(np.asarray(values, dtype=float)) for values in (high, low, close))
+    if mask is None:
+        mask = ~np.isnan(close)
+    mask = mask & ~np.isnan(high) & ~np.isnan(low) & ~np.isnan(close)
+    packed_close, order, valid = pack(close, mask)
+    packed_high, _, _ = pack(high, mask)
+    packed_low, _, _ = pack(low, mask)
+
+    macd_line, signal = macd(packed_close, params["macd_windows"])
+    k, d, j = kdj(packed_high, packed_low, packed_close, params["kdj_windows"])
+    upper, middle, lower = bollinger(packed_close, params["boll_window"], params["boll_width"])
+    packed = {
+        f"MA_{params['ma_window']}": rolling_mean(packed_close, params["ma_window"]),
+        "MACD": macd_line,
+        "SIGNAL": signal,
+        "RSI": rsi(packed_close, params["rsi_window"], params["rsi_method"]),
+        "CCI": cci(packed_high, packed_low, packed_close, params["cci_window"]),
+        "K": k,
+        "D": d,
+        "J": j,
+        "BOLL_UPPER": upper,
+        "BOLL_MIDDLE": middle,
+        "BOLL_LOWER": lower,
+        "ATR": atr(packed_high, packed_low, packed_close, params["atr_window"]),
+    }
+    return {name: unpack(values, order, valid) for name, values in packed.items()}
+
+
+def calculate_technical_indicators(stock_zh_a_hist_df, ma_window=5, macd_windows=(12, 26, 9), rsi_window=14,
+                                   cci_window=20):
+    """
+    Full pandas recomputation of MA, MACD/SIGNAL, RSI and CCI of one akshare daily-bar DataFrame.
+
+    This is the reference the vectorized engine and IndicatorState are checked against.
+
+    Returns:
+    - DataFrame: 日期, MA_n, MACD, SIGNAL, RSI and CCI, or None when there are fewer than ma_window bars.
+    """
+    # 丢弃NaN值
+    stock_zh_a_hist_df = stock_zh_a_hist_df.dropna()
+
+    # 检查是否有足够的数据来计算均线
+    if len(stock_zh_a_hist_df) < ma_window:
+        print("历史数据不足，无法计算均线。请提供更多的历史数据。")
+        return None
+
+    # 计算最小的均线
+    column_name = f'MA_{ma_window}'
+    stock_zh_a_hist_df[column_name] = stock_zh_a_hist_df['收盘'].rolling(window=ma_window).mean()
+
+    # 计算MACD
+    short_window, long_window, signal_window = macd_windows
+    stock_zh_a_hist_df['ShortEMA'] = stock_zh_a_hist_df['收盘'].ewm(span=short_window, adjust=False).mean()
+    stock_zh_a_hist_df['LongEMA'] = stock_zh_a_hist_df['收盘'].ewm(span=long_window, adjust=False).mean()
+    stock_zh_a_hist_df['MACD'] = stock_zh_a_hist_df['ShortEMA'] - stock_zh_a_hist_df['LongEMA']
+    stock_zh_a_hist_df['SIGNAL'] = stock_zh_a_hist_df['MACD'].ewm(span=signal_window, adjust=False).mean()
+
+    # 计算RSI
+    delta = stock_zh_a_hist_df['收盘'].diff(1)
+    gain = delta.where(delta > 0, 0)
+    loss = -delta.where(delta < 0, 0)
+    avg_gain = gain.rolling(window=rsi_window, min_periods=1).mean()
+    avg_loss = loss.rolling(window=rsi_window, min_periods=1).mean()
+    rs = avg_gain / avg_loss
+    stock_zh_a_hist_df['RSI'] = 100 - (100 / (1 + rs))
+
+    # 计算CCI
+    TP = (stock_zh_a_hist_df['最高'] + stock_zh_a_hist_df['最低'] + stock_zh_a_hist_df['收盘']) / 3
+    SMA = TP.rolling(window=cci_window, min_periods=1).mean()
+    MAD = (TP - SMA).abs().rolling(window=cci_window, min_periods=1).mean()
+    stock_zh_a_hist_df['CCI'] = (TP - SMA) / (0.015 * MAD)
+
+    return stock_zh_a_hist_df[['日期', f'MA_{ma_window}', 'MACD', 'SIGNAL', 'RSI', 'CCI']]
+
+
+if __name__ == "__main__":
+    import time
+
+    import pandas as pd
+
+    # 基准测试：500 只股票 x 250 个交易日，上市日期参差不齐
+    random = np.random.RandomState(7)
+    n_symbols, n_days = 500, 250
+    close = 10 * np.exp(np.cumsum(random.normal(0, 0.02, (n_symbols, n_days)), axis=1))
+    high = close * (1 + random.uniform(0, 0.03, close.shape))
+    low = close * (1 - random.uniform(0, 0.03, close.shape))
+    starts = random.randint(0, 100, n_symbols)
+    mask = np.arange(n_days)[None, :] >= starts[:, None]
+    close, high, low = (np.where(mask, values, np.nan) for values in (close, high, low))
+
+    start_time = time.perf_counter()
+    indicators = compute_indicators(high, low, close, mask)
+    engine_elapsed = time.perf_counter() - start_time
+
+    frames = [pd.DataFrame({"日期": np.arange(n_days), "收盘": close[i], "最高": high[i], "最低": low[i]})
+              for i in range(n_symbols)]
+    start_time = time.perf_counter()
+    references = [calculate_technical_indicators(frame) for frame in frames]
+    pandas_elapsed = time.perf_counter() - start_time
+
+    max_error = 0.0
+    for i, reference in enumerate(references):
+        for name in ["MA_5", "MACD", "SIGNAL", "RSI", "CCI"]:
+            expected = reference[name].to_numpy()
+            actual = indicators[name][i, mask[i]]
+            both = ~np.isnan(expected) & ~np.isnan(actual)
+            assert (np.isnan(expected) == np.isnan(actual)).all(), name
+            max_error = max(max_error, float(np.abs(expected[both] - actual[both]).max(initial=0.0)))
+    print(f"vectorized engine (12 indicators): {engine_elapsed * 1000:.1f} ms")
+    print(f"pandas per frame (5 indicators):   {pandas_elapsed * 1000:.1f} ms")
+    print(f"max abs difference: {max_error:.2e}")
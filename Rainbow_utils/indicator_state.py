@@ -0,0 +1,303 @@
+import json
+import math
+import os
+from collections import deque
+
+from Rainbow_utils.lazy_import import lazy_import
+from Rainbow_utils.stock_price_store import symbol_lock
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+INDICATOR_FIELDS = ["MA", "MACD", "SIGNAL", "RSI", "CCI"]
+HISTORY_FIELDS = [("date", "<i4")] + [(name, "<f8") for name in INDICATOR_FIELDS]
+# EMA 预热的固定起点，指标值不随本地已存储的历史长短变化
+DEFAULT_SEED_DATE = os.getenv("RAINBOW_INDICATOR_SEED_DATE", "20200101")
+
+
+def _divide(numerator, denominator):
+    # 与 pandas 的除法语义一致：0/0 为 NaN，x/0 为 ±inf
+    if denominator == 0:
+        if numerator == 0 or math.isnan(numerator):
+            return math.nan
+        return math.copysign(math.inf, numerator)
+    return numerator / denominator
+
+
+class IndicatorState:
+    """
+    Incremental state of the indicators of indicator_engine.calculate_technical_indicators.
+
+    EMA accumulators, ring buffers of the rolling windows and the RSI gain/loss windows are
+    kept so that update(bar) advances MA, MACD/SIGNAL, RSI and CCI by one bar in constant
+    time. Fed with the same bars, the values equal a full recomputation by
+    indicator_engine.calculate_technical_indicators (up to floating point rounding).
+
+    Parameters:
+    - ma_window (int): Moving average window.
+    - macd_windows (tuple): Short EMA, long EMA and signal spans.
+    - rsi_window (int): RSI window.
+    - cci_window (int): CCI window.
+    """
+
+    def __init__(self, ma_window=5, macd_windows=(12, 26, 9), rsi_window=14, cci_window=20):
+        self.ma_window = ma_window
+        self.macd_windows = tuple(macd_windows)
+        self.rsi_window = rsi_window
+        self.cci_window = cci_window
+        self.first_date = None
+        self.last_date = None
+        self.last_close = None
+        self.short_ema = None
+        self.long_ema = None
+        self.signal_ema = None
+        self.closes = deque(maxlen=ma_window)
+        self.gains = deque(maxlen=rsi_window)
+        self.losses = deque(maxlen=rsi_window)
+        self.typical_prices = deque(maxlen=cci_window)
+        self.deviations = deque(maxlen=cci_window)
+
+    def update(self, bar):
+        """
+        Advance all indicators by one bar.
+
+        Parameters:
+        - bar: Mapping (or structured array record) with date, high, low and close.
+
+        Returns:
+        - dict: date and the values of MA, MACD, SIGNAL, RSI and CCI for this bar.
+        """
+        close, high, low = float(bar["close"]), float(bar["high"]), float(bar["low"])
+        date = int(bar["date"])
+        if self.first_date is None:
+            self.first_date = date
+
+        # 均线
+        self.closes.append(close)
+        ma = sum(self.closes) / self.ma_window if len(self.closes) == self.ma_window else math.nan
+
+        # MACD（ewm adjust=False，首个值为收盘价本身）
+        short_window, long_window, signal_window = self.macd_windows
+        if self.short_ema is None:
+            self.short_ema, self.long_ema = close, close
+        else:
+            self.short_ema += (close - self.short_ema) * 2.0 / (short_window + 1)
+            self.long_ema += (close - self.long_ema) * 2.0 / (long_window + 1)
+        macd = self.short_ema - self.long_ema
+        if self.signal_ema is None:
+            self.signal_ema = macd
+        else:
+            self.signal_ema += (macd - self.signal_ema) * 2.0 / (signal_window + 1)
+
+        # RSI（涨跌幅的简单滚动均值，首个交易日的涨跌记为 0）
+        delta = close - self.last_close if self.last_close is not None else 0.0
+        self.gains.append(delta if delta > 0 else 0.0)
+        self.losses.append(-delta if delta < 0 else 0.0)
+        rs = _divide(sum(self.gains) / len(self.gains), sum(self.losses) / len(self.losses))
+        rsi = 100 - _divide(100, 1 + rs) if not math.isnan(rs) else math.nan
+
+        # CCI
+        typical_price = (high + low + close) / 3
+        self.typical_prices.append(typical_price)
+        sma = sum(self.typical_prices) / len(self.typical_prices)
+        self.deviations.append(abs(typical_price - sma))
+        mad = sum(self.deviations) / len(self.deviations)
+        cci = _divide(typical_price - sma, 0.015 * mad)
+
+        self.last_close = close
+        self.last_date = date
+        return {"date": date, "MA": ma, "MACD": macd, "SIGNAL": self.signal_ema, "RSI": rsi, "CCI": cci}
+
+    def to_dict(self):
+        return {
+            "params": {"ma_window": self.ma_window, "macd_windows": list(self.macd_windows),
+                       "rsi_window": self.rsi_window, "cci_window": self.cci_window},
+            "first_date": self.first_date,
+            "last_date": self.last_date,
+            "last_close": self.last_close,
+            "short_ema": self.short_ema,
+            "long_ema": self.long_ema,
+            "signal_ema": self.signal_ema,
+            "closes": list(self.closes),
+            "gains": list(self.gains),
+            "losses": list(self.losses),
+            "typical_prices": list(self.typical_prices),
+            "deviations": list(self.deviations),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls(**data["params"])
+        for name in ["first_date", "last_date", "last_close", "short_ema", "long_ema", "signal_ema"]:
+            setattr(state, name, data[name])
+        for name in ["closes", "gains", "losses", "typical_prices", "deviations"]:
+            getattr(state, name).extend(data[name])
+        return state
+
+    def copy(self):
+        return IndicatorState.from_dict(self.to_dict())
+
+
+class IncrementalIndicatorStore:
+    """
+    Persist IndicatorState and the per-bar indicator history next to a StockPriceStore.
+
+    Every symbol directory of the price store gets indicator_state.json and indicators.dat
+    (raw records of HISTORY_FIELDS, appended as bars are processed). The EMAs are seeded at
+    a fixed date (seed_date): the first state of a symbol fetches the price history back to
+    it, so the values do not depend on whether an analysis request or the prefetch created
+    the store first. Bars before the first bar of the state are never fed in later. Only bars
+    newer than the saved state are processed; the state is persisted up to the last
+    finalized bar (the price store's covered end), so a not yet closed bar of today is
+    computed on a copy and recomputed once it is final.
+
+    Parameters:
+    - price_store (StockPriceStore): The store holding the daily bars.
+    - seed_date (str): YYYYMMDD of the first bar fed into a new state.
+    - fetch (callable): Fetch function passed to StockPriceStore.update() when seeding.
+    - params: IndicatorState parameters.
+    """
+
+    def __init__(self, price_store, seed_date=DEFAULT_SEED_DATE, fetch=None, **params):
+        self.price_store = price_store
+        self.seed_date = seed_date
+        self.fetch = fetch
+        self.params = params
+        self.history_dtype = np.dtype(HISTORY_FIELDS)
+
+    def _paths(self, symbol, adjust):
+        symbol_dir = self.price_store.symbol_dir(symbol, adjust)
+        return os.path.join(symbol_dir, "indicator_state.json"), os.path.join(symbol_dir, "indicators.dat")
+
+    def _load_state(self, symbol, adjust):
+        state_path, history_path = self._paths(symbol, adjust)
+        if os.path.exists(state_path) and os.path.exists(history_path):
+            with open(state_path, "r", encoding="utf-8") as state_file:
+                state = IndicatorState.from_dict(json.load(state_file))
+            if state.first_date is not None and state.first_date >= int(self.seed_date):
+                return state
+        # 新建（或预热起点已调整）时清空历史
+        if os.path.exists(history_path):
+            os.remove(history_path)
+        return IndicatorState(**self.params)
+
+    def _history_length(self, history_path, state):
+        # 追加历史后、保存状态前中断时，丢弃状态之后的记录
+        if not os.path.exists(history_path):
+            return 0
+        length = os.path.getsize(history_path) // self.history_dtype.itemsize
+        if length and state.last_date is not None:
+            dates = np.memmap(history_path, dtype=self.history_dtype, mode="r", shape=(length,))["date"]
+            kept = int(np.searchsorted(dates, state.last_date, side="right"))
+            del dates
+            if kept < length:
+                with open(history_path, "r+b") as history_file:
+                    history_file.truncate(kept * self.history_dtype.itemsize)
+                length = kept
+        return length
+
+    def _append(self, symbol, adjust, state, rows):
+        state_path, history_path = self._paths(symbol, adjust)
+        with open(history_path, "ab") as history_file:
+            history_file.write(rows.tobytes())
+        with open(state_path + ".tmp", "w", encoding="utf-8") as state_file:
+            json.dump(state.to_dict(), state_file)
+        os.replace(state_path + ".tmp", state_path)
+
+    def _rows(self, bars, state):
+        rows = [tuple(values[name] for name in ["date"] + INDICATOR_FIELDS)
+                for values in (state.update(bar) for bar in bars)]
+        return np.array(rows, dtype=self.history_dtype)
+
+    def _seed_history(self, symbol, adjust):
+        # 价格存储的起点取决于先运行的是分析请求还是预取，新状态前先把历史补齐到固定的预热起点
+        meta = self.price_store.load_meta(symbol, adjust)
+        if meta and int(meta["start"]) > int(self.seed_date):
+            self.price_store.update(symbol, self.seed_date, meta["start"], adjust, fetch=self.fetch)
+
+    def _advance(self, symbol, adjust):
+        state = self._load_state(symbol, adjust)
+        if state.last_date is None:
+            self._seed_history(symbol, adjust)
+        meta = self.price_store.load_meta(symbol, adjust)
+        if not meta:
+            return state
+        _, history_path = self._paths(symbol, adjust)
+        self._history_length(history_path, state)
+        start = state.last_date + 1 if state.last_date is not None else int(self.seed_date)
+        bars = self.price_store.read(symbol, str(start), meta["end"], adjust)
+        if len(bars):
+            self._append(symbol, adjust, state, self._rows(bars, state))
+        return state
+
+    def advance(self, symbol, adjust=""):
+        """
+        Feed the finalized bars newer than the saved state, append their indicators to the
+        history and persist the state.
+
+        Returns:
+        - IndicatorState: The state after the last finalized bar.
+        """
+        with symbol_lock((symbol, adjust, "indicators")):
+            return self._advance(symbol, adjust)
+
+    def read_frame(self, symbol, start_date, end_date, adjust=""):
+        """
+        Return the indicators of [start_date, end_date] in the column layout of
+        indicator_engine.calculate_technical_indicators (日期, MA_n, MACD, SIGNAL, RSI, CCI).
+        """
+        start, end = int(str(start_date).replace("-", "")), int(str(end_date).replace("-", ""))
+        with symbol_lock((symbol, adjust, "indicators")):
+            state = self._advance(symbol, adjust)
+            _, history_path = self._paths(symbol, adjust)
+            length = self._history_length(history_path, state)
+            window = np.empty(0, dtype=self.history_dtype)
+            if length:
+                # 只复制请求窗口，映射随即释放
+                history = np.memmap(history_path, dtype=self.history_dtype, mode="r", shape=(length,))
+                left = np.searchsorted(history["date"], start, side="left")
+                right = np.searchsorted(history["date"], end, side="right")
+                window = np.array(history[left:right])
+                del history
+        if state.last_date is not None and end > state.last_date:
+            # 尚未收盘的K线只在状态副本上计算，不写回
+            pending = self.price_store.read(symbol, str(state.last_date + 1), str(end), adjust)
+            if len(pending):
+                rows = self._rows(pending, state.copy())
+                window = np.concatenate([window, rows[rows["date"] >= start]])
+        frame = pd.DataFrame({name: window[name] for name in INDICATOR_FIELDS})
+        frame.insert(0, "日期", pd.to_datetime(window["date"].astype(str), format="%Y%m%d").date)
+        return frame.rename(columns={"MA": f"MA_{state.ma_window}"})
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    from Rainbow_utils.indicator_engine import calculate_technical_indicators
+    from Rainbow_utils.stock_price_store import StockPriceStore
+
+    # 与全量重算（indicator_engine.calculate_technical_indicators）对比
+    random = np.random.RandomState(11)
+    close = 10 * np.exp(np.cumsum(random.normal(0, 0.02, 300)))
+    frame = pd.DataFrame({"日期": pd.bdate_range("2023-01-02", periods=300).date, "开盘": close, "收盘": close,
+                          "最高": close * 1.02, "最低": close * 0.98})
+    reference = calculate_technical_indicators(frame.copy())
+
+    def fetch(symbol, start_date, end_date, adjust):
+        dates = pd.to_datetime(frame["日期"]).dt.strftime("%Y%m%d")
+        return frame[(dates >= start_date) & (dates <= end_date)]
+
+    with tempfile.TemporaryDirectory() as root:
+        price_store = StockPriceStore(root)
+        indicator_store = IncrementalIndicatorStore(price_store, seed_date="20230101", fetch=fetch)
+        # 先只获取最近一段，预热时补齐到固定起点；分两次推进，结果与全量重算一致
+        price_store.update("000001", "20230901", "20231031", fetch=fetch)
+        indicator_store.advance("000001")
+        price_store.update("000001", "20230101", "20241231", fetch=fetch)
+        actual = indicator_store.read_frame("000001", "20230101", "20241231")
+    for column in ["MA_5", "MACD", "SIGNAL", "RSI", "CCI"]:
+        expected = reference[column].to_numpy()
+        values = actual[column].to_numpy()
+        assert (np.isnan(values) == np.isnan(expected)).all(), column
+        both = ~np.isnan(values)
+        print(f"{column}: max abs difference {np.abs(values[both] - expected[both]).max():.2e}")
@@ -0,0 +1,48 @@
+import importlib
+import importlib.util
+import sys
+import threading
+
+_lazy_import_lock = threading.Lock()
+
+
+def lazy_import(name):
+    """
+    Import a module lazily: the module object is returned immediately and the module body
+    only runs on first attribute access.
+
+    Use this for heavy optional subsystems (akshare, chromadb, dashscope...) so that importing
+    the UI modules does not pay for them before they are actually used.
+
+    Args:
+    - name (str): Fully qualified module name. For submodules the parent packages are
+      imported eagerly, so prefer top-level heavy packages.
+
+    Returns:
+    - The (lazy) module object.
+    """
+    with _lazy_import_lock:
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        spec = importlib.util.find_spec(name)
+        if spec is None:
+            raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+        loader = importlib.util.LazyLoader(spec.loader)
+        spec.loader = loader
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        loader.exec_module(module)
+        return module
+
+
+def preload(*modules):
+    """
+    Force lazily imported modules to load now, e.g. in a background warm-up thread.
+
+    Args:
+    - modules: Module objects returned by lazy_import().
+    """
+    for module in modules:
+        # 任意属性访问都会触发 LazyLoader 执行模块
+        getattr(module, "__name__")
@@ -0,0 +1,222 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+
+from Rainbow_utils.lazy_import import lazy_import
+
+openai = lazy_import("openai")
+dashscope = lazy_import("dashscope")
+
+# 结果状态
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_TIMEOUT = "timeout"
+
+
+def call_openai(model, instruction, message, timeout=None):
+    """
+    Chat completion through the openai 0.28 API.
+
+    Returns:
+    - tuple: (answer text, usage dict with prompt_tokens and completion_tokens)
+    """
+    response = openai.ChatCompletion.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": instruction},
+            {"role": "user", "content": message}
+        ],
+        request_timeout=timeout,
+    )
+    usage = response.get("usage") or {}
+    return response["choices"][0]["message"]["content"], {
+        "prompt_tokens": usage.get("prompt_tokens"), "completion_tokens": usage.get("completion_tokens")}
+
+
+def call_dashscope(model, instruction, message, timeout=None):
+    """
+    Chat completion through the dashscope Generation API (Qwen models).
+
+    Returns:
+    - tuple: (answer text, usage dict with prompt_tokens and completion_tokens)
+    """
+    response = dashscope.Generation.call(
+        model=model,
+        messages=[
+            {"role": "system", "content": instruction},
+            {"role": "user", "content": message}
+        ],
+        result_format='message',  # set the result is message format.
+    )
+    if getattr(response, "status_code", 200) != 200:
+        raise RuntimeError(f"{getattr(response, 'code', '')} {getattr(response, 'message', '')}".strip())
+    usage = response.get("usage") or {}
+    return response["output"]["choices"][0]["message"]["content"], {
+        "prompt_tokens": usage.get("input_tokens"), "completion_tokens": usage.get("output_tokens")}
+
+
+PROVIDERS = {
+    "openai": call_openai,
+    "dashscope": call_dashscope,
+}
+
+
+class ModelTarget:
+    """
+    One (provider, model) target of a fan-out.
+
+    Parameters:
+    - label (str): Name shown in the UI and the call records.
+    - provider (str): Key of PROVIDERS.
+    - model (str): Model name passed to the provider.
+    - timeout (float): Seconds after which the target is given up.
+    - hedge_after (float): Seconds after which a second identical request is started if the
+      first has not answered yet; the first answer wins. None disables hedging.
+    - rate_limiter: Optional context manager (e.g. watchlist_batch.RateLimiter) around every request.
+    """
+
+    def __init__(self, label, provider, model, timeout=300.0, hedge_after=None, rate_limiter=None):
+        if provider not in PROVIDERS:
+            raise ValueError(f"Unknown LLM provider: {provider}")
+        self.label = label
+        self.provider = provider
+        self.model = model
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.rate_limiter = rate_limiter
+
+    def call(self, instruction, message):
+        if self.rate_limiter is None:
+            return PROVIDERS[self.provider](self.model, instruction, message, self.timeout)
+        with self.rate_limiter:
+            return PROVIDERS[self.provider](self.model, instruction, message, self.timeout)
+
+
+class FanOutEngine:
+    """
+    Send the same prompt to several models concurrently and deliver each answer as it arrives.
+
+    Every target has its own timeout and optional hedged retry. stream() yields one event per
+    target as soon as it finishes (answer, failure or timeout), so a UI can update each
+    output panel without waiting for the slowest model. Latency and token usage of every
+    target are appended to a JSON-lines record file.
+
+    Parameters:
+    - targets (list): ModelTarget instances.
+    - record_path (str): JSON-lines file of the call records, None disables recording.
+    """
+
+    record_lock = threading.Lock()
+
+    def __init__(self, targets, record_path="./logs/llm_calls.jsonl"):
+        self.targets = list(targets)
+        self.record_path = record_path
+
+    def record(self, event, context):
+        if not self.record_path:
+            return
+        target = self.targets[event["index"]]
+        record = {"time": datetime.now().isoformat(timespec="seconds"), "label": target.label,
+                  "provider": target.provider, "model": target.model, "status": event["status"],
+                  "latency": round(event["latency"], 3), "hedged": event["hedged"]}
+        record.update(event["usage"])
+        record.update(context or {})
+        try:
+            with self.record_lock:
+                os.makedirs(os.path.dirname(self.record_path) or ".", exist_ok=True)
+                with open(self.record_path, "a", encoding="utf-8") as record_file:
+                    record_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"LLM 调用记录写入失败: {e}")
+
+    def stream(self, instruction, message, context=None):
+        """
+        Run all targets and yield their results in completion order.
+
+        Parameters:
+        - instruction (str): System prompt.
+        - message (str): User prompt.
+        - context (dict): Extra fields stored with the call records (e.g. the stock name).
+
+        Yields:
+        - dict: index, label, status, text, latency, usage and hedged of one finished target.
+        """
+        start_time = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=max(2 * len(self.targets), 1), thread_name_prefix="llm_fanout")
+        attempts = {}
+        pending = set(range(len(self.targets)))
+        hedged = set()
+
+        def submit(index):
+            future = executor.submit(self.targets[index].call, instruction, message)
+            attempts[future] = index
+
+        def finish(index, status, text="", usage=None):
+            pending.discard(index)
+            for future, attempt_index in list(attempts.items()):
+                if attempt_index == index:
+                    future.cancel()
+                    attempts.pop(future)
+            event = {"index": index, "label": self.targets[index].label, "status": status, "text": text,
+                     "latency": time.monotonic() - start_time, "usage": usage or {}, "hedged": index in hedged}
+            self.record(event, context)
+            return event
+
+        try:
+            for index in range(len(self.targets)):
+                submit(index)
+            while pending:
+                now = time.monotonic()
+                wake_times = [start_time + self.targets[index].timeout for index in pending]
+                wake_times += [start_time + self.targets[index].hedge_after for index in pending
+                               if self.targets[index].hedge_after is not None and index not in hedged]
+                done, _ = wait(list(attempts), timeout=max(min(wake_times) - now, 0), return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    index = attempts.pop(future, None)
+                    if index is None or index not in pending:
+                        continue
+                    try:
+                        text, usage = future.result()
+                        yield finish(index, STATUS_OK, text, usage)
+                    except Exception as e:
+                        # 对冲请求仍在进行时，以另一个请求的结果为准
+                        if index in attempts.values():
+                            continue
+                        yield finish(index, STATUS_FAILED, f"发生异常: {e}")
+
+                now = time.monotonic()
+                for index in sorted(pending):
+                    target = self.targets[index]
+                    if now - start_time >= target.timeout:
+                        yield finish(index, STATUS_TIMEOUT, f"请求超时（{target.timeout:.0f}秒）")
+                    elif (target.hedge_after is not None and index not in hedged
+                          and now - start_time >= target.hedge_after):
+                        hedged.add(index)
+                        submit(index)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, instruction, message, context=None):
+        """
+        Run all targets and return their events in target order.
+        """
+        events = [None] * len(self.targets)
+        for event in self.stream(instruction, message, context):
+            events[event["index"]] = event
+        return events
+
+
+if __name__ == "__main__":
+    def slow_echo(model, instruction, message, timeout=None):
+        time.sleep(float(model))
+        return f"{model}s: {message}", {"prompt_tokens": len(message), "completion_tokens": 3}
+
+    PROVIDERS["echo"] = slow_echo
+    engine = FanOutEngine([ModelTarget("fast", "echo", "0.2"), ModelTarget("slow", "echo", "1"),
+                           ModelTarget("stuck", "echo", "5", timeout=2)], record_path=None)
+    for event in engine.stream("", "你好"):
+        print(f"{event['latency']:.2f}s {event['label']} {event['status']}: {event['text']}")
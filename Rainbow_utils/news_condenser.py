@@ -0,0 +1,128 @@
+from Rainbow_utils.chunk_dedup import near_duplicate_groups
+from Rainbow_utils.get_tokens_cal_filter import num_tokens_from_string
+from Rainbow_utils.lazy_import import lazy_import
+
+pd = lazy_import("pandas")
+tiktoken = lazy_import("tiktoken")
+
+
+def _merge_partitions(*partitions):
+    # 合并多种分组结果：任一分组判为近似重复即归为同一簇
+    parent = list(range(len(partitions[0])))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for groups in partitions:
+        for index, group in enumerate(groups):
+            root_index, root_group = find(index), find(group)
+            if root_index != root_group:
+                parent[max(root_index, root_group)] = min(root_index, root_group)
+    return [find(i) for i in range(len(parent))]
+
+
+def _partial_groups(texts, threshold, min_length, **kwargs):
+    # 过短或为空的文本签名相同，不参与分组，各自成组
+    eligible = [index for index, text in enumerate(texts) if len(text.strip()) >= min_length]
+    groups = list(range(len(texts)))
+    if eligible:
+        eligible_groups = near_duplicate_groups([texts[index] for index in eligible], threshold, **kwargs)
+        for index, group in zip(eligible, eligible_groups):
+            groups[index] = eligible[group]
+    return groups
+
+
+def _truncate_tokens(text, max_tokens, encoding_name):
+    encoding = tiktoken.get_encoding(encoding_name)
+    tokens = encoding.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens]) + "…"
+
+
+def cluster_news(news_df, title_threshold=0.8, content_threshold=0.6, min_title_length=6, min_content_length=30):
+    """
+    Cluster near-duplicate articles (syndicated wire stories) by MinHash similarity.
+
+    Two articles fall into the same cluster when their titles or their contents are
+    near-duplicates. Each cluster is represented by its longest article, dated by the most
+    recent publication of the cluster. Titles and contents shorter than the minimum lengths
+    (e.g. missing contents) are not compared, so they cannot merge unrelated articles.
+
+    Args:
+    - news_df (pandas.DataFrame): stock_news_em() output with 新闻标题, 新闻内容 and 发布时间.
+    - title_threshold (float): Estimated Jaccard similarity of titles for near-duplicates.
+    - content_threshold (float): Estimated Jaccard similarity of contents for near-duplicates.
+    - min_title_length, min_content_length (int): Minimum number of characters of a compared text.
+
+    Returns:
+    - pandas.DataFrame with 发布时间, 新闻标题, 新闻内容 and 相似报道数, most recent first.
+    """
+    if not len(news_df):
+        return pd.DataFrame(columns=["发布时间", "新闻标题", "新闻内容", "相似报道数"])
+    news_df = news_df.reset_index(drop=True)
+    titles = news_df["新闻标题"].fillna("").astype(str).tolist()
+    contents = news_df["新闻内容"].fillna("").astype(str).tolist()
+    groups = _merge_partitions(_partial_groups(titles, title_threshold, min_title_length, shingle_size=2),
+                               _partial_groups(contents, content_threshold, min_content_length))
+    frame = pd.DataFrame({
+        "cluster": groups,
+        "发布时间": pd.to_datetime(news_df["发布时间"], errors="coerce"),
+        "新闻标题": titles,
+        "新闻内容": contents,
+        "length": [len(content) for content in contents],
+    })
+    representatives = frame.loc[frame.groupby("cluster")["length"].idxmax()].set_index("cluster")
+    clusters = frame.groupby("cluster").agg(latest=("发布时间", "max"), count=("新闻标题", "size"))
+    condensed = representatives.join(clusters)
+    condensed = condensed.sort_values("latest", ascending=False, na_position="last")
+    return pd.DataFrame({
+        "发布时间": condensed["latest"].dt.strftime("%Y-%m-%d %H:%M").fillna(""),
+        "新闻标题": condensed["新闻标题"],
+        "新闻内容": condensed["新闻内容"],
+        "相似报道数": condensed["count"],
+    }).reset_index(drop=True)
+
+
+def condense_news(news_df, max_tokens=1500, max_article_tokens=150, encoding_name="cl100k_base",
+                  title_threshold=0.8, content_threshold=0.6):
+    """
+    Cluster near-duplicate news and keep the most recent clusters within a token budget.
+
+    Args:
+    - news_df (pandas.DataFrame): stock_news_em() output.
+    - max_tokens (int): Token budget of titles and contents of all kept articles.
+    - max_article_tokens (int): Contents are truncated to this many tokens.
+    - encoding_name (str): tiktoken encoding used for counting.
+    - title_threshold, content_threshold (float): See cluster_news().
+
+    Returns:
+    - pandas.DataFrame with 发布时间, 新闻标题, 新闻内容 and 相似报道数, most recent first.
+    """
+    clustered = cluster_news(news_df, title_threshold, content_threshold)
+    rows = []
+    used_tokens = 0
+    for row in clustered.itertuples(index=False):
+        content = _truncate_tokens(row.新闻内容, max_article_tokens, encoding_name)
+        cost = num_tokens_from_string(f"{row.发布时间} {row.新闻标题} {content} {row.相似报道数}", encoding_name)
+        if used_tokens + cost > max_tokens:
+            break
+        rows.append((row.发布时间, row.新闻标题, content, row.相似报道数))
+        used_tokens += cost
+    return pd.DataFrame(rows, columns=["发布时间", "新闻标题", "新闻内容", "相似报道数"])
+
+
+if __name__ == "__main__":
+    news = pd.DataFrame({
+        "新闻标题": ["首航高科中标光热发电项目", "首航高科中标光热发电项目！", "首航高科：关于股东减持的公告",
+                 "光热发电板块午后拉升 首航高科涨停"],
+        "新闻内容": ["公司公告称，中标某光热发电项目，合同金额约5亿元，占公司上年营收的20%。",
+                 "公司公告称，中标某光热发电项目，合同金额约5亿元，占公司上年营收的20%。（来源：证券时报）",
+                 "公司股东计划在未来六个月内减持不超过1%的股份。",
+                 "光热发电板块午后拉升，首航高科涨停，多只个股跟涨。"],
+        "发布时间": ["2023-12-11 08:00:00", "2023-12-11 09:30:00", "2023-12-08 18:00:00", "2023-12-12 13:30:00"],
+    })
+    print(cluster_news(news).to_string(index=False))
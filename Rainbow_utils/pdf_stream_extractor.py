@@ -0,0 +1,198 @@
+import hashlib
+import io
+import json
+import os
+
+from Rainbow_utils import http_session
+from Rainbow_utils.get_tokens_cal_filter import num_tokens_from_string
+from Rainbow_utils.lazy_import import lazy_import
+
+PyPDF2 = lazy_import("PyPDF2")
+
+DEFAULT_PDF_CACHE_DIR = os.getenv("RAINBOW_PDF_CACHE_DIR", "./data/pdf_text_cache")
+# 按需读取的块大小及不支持 Range 时整包下载的上限
+RANGE_BLOCK_SIZE = 256 * 1024
+MAX_PDF_BYTES = 50 * 1024 * 1024
+
+
+class HttpRangeFile(io.RawIOBase):
+    """
+    Seekable read-only file over HTTP that downloads only the byte ranges actually read.
+
+    PyPDF2 reads the trailer and cross-reference table at the end of the file and then only
+    the objects of the pages it extracts, so pages after the token budget are never downloaded.
+
+    Parameters:
+    - url (str): URL of the file; the server must support "Range: bytes=" requests.
+    - size (int): Content length of the file.
+    - session (requests.Session): Session used for the range requests.
+    - block_size (int): Size of the aligned blocks fetched and cached.
+    """
+
+    def __init__(self, url, size, session, block_size=RANGE_BLOCK_SIZE):
+        super().__init__()
+        self.url = url
+        self.size = size
+        self.session = session
+        self.block_size = block_size
+        self.position = 0
+        self.blocks = {}
+        self.bytes_downloaded = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = min(max(offset, 0), self.size)
+        return self.position
+
+    def _block(self, index):
+        block = self.blocks.get(index)
+        if block is None:
+            start = index * self.block_size
+            end = min(start + self.block_size, self.size) - 1
+            response = self.session.get(self.url, headers={"Range": f"bytes={start}-{end}"})
+            if response.status_code != 206:
+                raise IOError(f"Range request not honoured: HTTP {response.status_code}")
+            block = response.content
+            self.bytes_downloaded += len(block)
+            self.blocks[index] = block
+        return block
+
+    def readinto(self, buffer):
+        length = min(len(buffer), self.size - self.position)
+        written = 0
+        while written < length:
+            index, offset = divmod(self.position, self.block_size)
+            chunk = self._block(index)[offset:offset + length - written]
+            if not chunk:
+                break
+            buffer[written:written + len(chunk)] = chunk
+            written += len(chunk)
+            self.position += len(chunk)
+        return written
+
+
+def _head_content_key(head):
+    """
+    Content key of the file version announced by a HEAD response (ETag/Last-Modified/size),
+    None when the server sends no validators.
+    """
+    size = int(head.headers.get("Content-Length") or 0)
+    validators = [head.headers.get("ETag"), head.headers.get("Last-Modified")]
+    if not head.ok or not size or not any(validators):
+        return None
+    return hashlib.sha256(json.dumps([head.url, size] + validators).encode("utf-8")).hexdigest()
+
+
+def _open_pdf(url, session, max_bytes, head):
+    """
+    Open a remote PDF as a seekable file.
+
+    Returns:
+    - tuple: (file object, content key identifying this version of the file)
+    """
+    content_key = _head_content_key(head)
+    if content_key and head.headers.get("Accept-Ranges", "").lower() == "bytes":
+        size = int(head.headers["Content-Length"])
+        return io.BufferedReader(HttpRangeFile(head.url, size, session), buffer_size=RANGE_BLOCK_SIZE), content_key
+
+    # 服务器不支持 Range 时流式下载，超过上限即放弃
+    response = session.get(url, stream=True)
+    response.raise_for_status()
+    buffer = io.BytesIO()
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        buffer.write(chunk)
+        if buffer.tell() > max_bytes:
+            response.close()
+            raise IOError(f"PDF larger than {max_bytes} bytes: {url}")
+    buffer.seek(0)
+    return buffer, content_key or hashlib.sha256(buffer.getvalue()).hexdigest()
+
+
+def _cache_path(cache_dir, url):
+    return os.path.join(cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+
+def extract_pdf_text(url, max_tokens=300, encoding_name="cl100k_base", text_filter=None, session=None,
+                     cache_dir=DEFAULT_PDF_CACHE_DIR, max_bytes=MAX_PDF_BYTES):
+    """
+    Extract the text of a remote PDF page by page until the token budget is met.
+
+    Pages are read in order and extraction stops as soon as the (optionally filtered) text
+    reaches max_tokens. With HTTP range support only the needed parts of the file are
+    downloaded. Results are cached by URL and content version (ETag/Last-Modified/size, or
+    the SHA-256 of the downloaded bytes). When the HEAD response carries validators the cache
+    is checked before the file is opened, so a cache hit costs a single HEAD request.
+
+    Parameters:
+    - url (str): URL of the PDF.
+    - max_tokens (int): Token budget of the extracted text.
+    - encoding_name (str): tiktoken encoding used for counting.
+    - text_filter (callable): Optional filter applied to each page text before counting.
+    - session (requests.Session): Session to use, defaults to http_session.get_session().
+    - cache_dir (str): Directory of the extracted-text cache, None disables caching.
+    - max_bytes (int): Maximum download size when the server does not support range requests.
+
+    Returns:
+    - str: The extracted (filtered) text, possibly longer than max_tokens by the last page.
+    """
+    session = session or http_session.get_session()
+    cache_path = _cache_path(cache_dir, url) if cache_dir else None
+    cached = None
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as cache_file:
+            cached = json.load(cache_file)
+        if not (cached["complete"] or cached["max_tokens"] >= max_tokens):
+            cached = None
+
+    # 同一版本的文件，且缓存的文本足够（或已是全文）时直接使用
+    head = session.head(url, allow_redirects=True)
+    if cached is not None and cached["content_key"] == _head_content_key(head):
+        return cached["text"]
+    pdf_file, content_key = _open_pdf(url, session, max_bytes, head)
+    if cached is not None and cached["content_key"] == content_key:
+        # 没有 ETag/Last-Modified 的服务器只能在下载后按内容比对
+        pdf_file.close()
+        return cached["text"]
+
+    texts = []
+    used_tokens = 0
+    complete = True
+    with pdf_file:
+        reader = PyPDF2.PdfReader(pdf_file)
+        page_count = len(reader.pages)
+        for page_index in range(page_count):
+            page_text = reader.pages[page_index].extract_text() or ""
+            if text_filter is not None:
+                page_text = text_filter(page_text)
+            if not page_text:
+                continue
+            texts.append(page_text)
+            used_tokens += num_tokens_from_string(page_text, encoding_name)
+            if used_tokens >= max_tokens:
+                complete = page_index == page_count - 1
+                break
+    text = "\n".join(texts)
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_path + ".tmp", "w", encoding="utf-8") as cache_file:
+            json.dump({"url": url, "content_key": content_key, "max_tokens": max_tokens, "complete": complete,
+                       "text": text}, cache_file, ensure_ascii=False)
+        os.replace(cache_path + ".tmp", cache_path)
+    return text
+
+
+if __name__ == "__main__":
+    print(extract_pdf_text("https://arxiv.org/pdf/1706.03762.pdf", max_tokens=300)[:500])
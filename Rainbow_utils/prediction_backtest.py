@@ -0,0 +1,260 @@
+import os
+import re
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from Rainbow_utils import indicator_engine
+from Rainbow_utils.lazy_import import lazy_import
+
+pd = lazy_import("pandas")
+
+# 预测涨跌幅："上涨2%-3%"、"涨幅约 5%"、"下跌1.5%"、"回调 2~3%" 等（"涨跌幅"为历史数据的表述，不计）
+_PCT_PATTERN = re.compile(
+    r"(上涨|涨幅|上升|上行|反弹|拉升|下跌|(?<!涨)跌幅|下降|下行|回调|回落)[^%％\d\n。；]{0,10}?"
+    r"(\d+(?:\.\d+)?)\s*[%％]?(?:\s*[-~～至到]\s*(\d+(?:\.\d+)?))?\s*[%％]")
+# 问题模板第 6 项为未来3天的操作建议与止盈/止损，回答中取最后一个第 6 项
+_FINAL_ITEM_PATTERN = re.compile(r"(?m)^[ \t#*>-]*(?:6|六)\s*[.、．:：)）](?!\d)")
+_FORECAST_PATTERN = re.compile(r"未来\s*(?:3|三)\s*[天日]|预测|预计|预期")
+_ADVICE_PATTERN = re.compile(r"综上|总结|建议|短期")
+_DOWN_WORDS = ("下跌", "跌幅", "下降", "下行", "回调", "回落")
+_UP_VOTES = ("看涨", "看多", "上涨", "买入", "增持", "上行")
+_DOWN_VOTES = ("看跌", "看空", "下跌", "卖出", "减持", "下行")
+# 止损/止盈价位（排除以百分比表示的）
+_STOP_PATTERN = re.compile(r"止损(?:位|价|价格|点)?[^\d\n。；%％]{0,10}?(\d+(?:\.\d+)?)(?!\s*[%％\d.])")
+_TAKE_PATTERN = re.compile(r"止盈(?:位|价|价格|点)?[^\d\n。；%％]{0,10}?(\d+(?:\.\d+)?)(?!\s*[%％\d.])")
+# 日志文件名：{stock_name}_{label}_response_{YYYYmmddHHMMSS}.txt
+_LOG_NAME_PATTERN = re.compile(r"^(?P<stock_name>.+)_(?P<label>[A-Za-z0-9]+)_response_(?P<timestamp>\d{14})\.txt$")
+# 提示词日志中历史行情段落的日期，最后一根K线即分析的截止日
+_HIST_SECTION_PATTERN = re.compile(r"当前股票历史行情数据:(.*?)(?:当前股票的K线技术指标:|$)", re.S)
+_DATE_PATTERN = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+# 响应写入日志后写入分析缓存的最长间隔（含模型调用耗时）
+_CACHE_WRITE_WINDOW = timedelta(minutes=15)
+
+
+def forecast_section(text):
+    """
+    Return the part of a response holding the forecast: the last item 6 of the question template
+    if the answer is numbered, otherwise the text from the first forecast phrase
+    ("未来3天", "预测", "预计", ...) or, lacking one, recommendation phrase ("综上", "建议", ...)
+    on. Empty when none is found.
+    """
+    items = list(_FINAL_ITEM_PATTERN.finditer(text))
+    if items:
+        return text[items[-1].start():]
+    anchor = _FORECAST_PATTERN.search(text) or _ADVICE_PATTERN.search(text)
+    return text[anchor.start():] if anchor else ""
+
+
+def parse_prediction(text):
+    """
+    Extract the predicted direction, percentage and stop-loss/take-profit prices from a response.
+
+    Only the forecast section (see forecast_section()) is considered, so the historical moves,
+    fund flows and news figures discussed before it are ignored. Its first signed percentage
+    ("上涨2%-3%" -> 2.5, "下跌1.5%" -> -1.5) gives the predicted change; without one, the
+    direction is voted from bullish/bearish keywords of the section.
+
+    Returns:
+    - dict: direction (1, -1, 0 or NaN), pct (NaN if absent), stop_loss and take_profit (NaN if absent)
+    """
+    pct = np.nan
+    section = forecast_section(text or "")
+    match = _PCT_PATTERN.search(section)
+    if match:
+        low = float(match.group(2))
+        high = float(match.group(3)) if match.group(3) else low
+        pct = (low + high) / 2 * (-1 if match.group(1) in _DOWN_WORDS else 1)
+    if not np.isnan(pct):
+        direction = float(np.sign(pct))
+    else:
+        votes = sum(section.count(word) for word in _UP_VOTES) - sum(section.count(word) for word in _DOWN_VOTES)
+        direction = float(np.sign(votes)) if section else np.nan
+    stop_match = _STOP_PATTERN.search(text or "")
+    take_match = _TAKE_PATTERN.search(text or "")
+    return {
+        "direction": direction,
+        "pct": pct,
+        "stop_loss": float(stop_match.group(1)) if stop_match else np.nan,
+        "take_profit": float(take_match.group(1)) if take_match else np.nan,
+    }
+
+
+def load_cached_predictions(analysis_cache):
+    """
+    Parse every response of an AnalysisCache.
+
+    Returns:
+    - pandas.DataFrame: symbol, end_date, model, prompt_version and the parsed prediction fields.
+    """
+    rows = []
+    for record in analysis_cache.entries():
+        entry = analysis_cache.get(record["symbol"], record["end_date"], record["model"], record["fingerprint"])
+        if entry is None:
+            continue
+        rows.append(dict({"symbol": record["symbol"], "end_date": str(record["end_date"]), "model": record["model"],
+                          "prompt_version": record.get("prompt_version", "unknown")},
+                         **parse_prediction(entry["response"])))
+    return pd.DataFrame(rows, columns=["symbol", "end_date", "model", "prompt_version", "direction", "pct",
+                                       "stop_loss", "take_profit"])
+
+
+def _prompt_end_date(prompt_path):
+    # 提示词日志中历史行情的最后交易日
+    if not os.path.exists(prompt_path):
+        return None
+    with open(prompt_path, "r", encoding="utf-8") as prompt_file:
+        section = _HIST_SECTION_PATTERN.search(prompt_file.read())
+    dates = _DATE_PATTERN.findall(section.group(1)) if section else []
+    return max("".join(date) for date in dates) if dates else None
+
+
+def load_log_predictions(log_dir, symbols_by_name, analysis_cache=None):
+    """
+    Parse the response files written to the log directory that have no analysis cache entry.
+
+    Every response is logged and cached, so a file is skipped when a cache entry of the same
+    symbol and label was written within _CACHE_WRITE_WINDOW after the file's timestamp. The
+    end date is the last bar of the history section of the matching prompt log
+    ({stock_name}_{timestamp}.txt); files without it are skipped. Labels are mapped to the
+    model of the latest cache entry with that label, so both sources group under one model key.
+
+    Parameters:
+    - log_dir (str): Directory with {stock_name}_{label}_response_{timestamp}.txt files.
+    - symbols_by_name (dict): Stock name -> code; files of unknown names are skipped.
+    - analysis_cache (AnalysisCache): Cache used for de-duplication and label mapping.
+
+    Returns:
+    - pandas.DataFrame: Same columns as load_cached_predictions().
+    """
+    records = analysis_cache.entries() if analysis_cache is not None else []
+    label_models = {}
+    cached_times = {}
+    for record in sorted(records, key=lambda record: record["created_at"]):
+        if record.get("label"):
+            label_models[record["label"]] = record["model"]
+            cached_times.setdefault((record["symbol"], record["label"]), []).append(
+                datetime.fromisoformat(record["created_at"]))
+    rows = []
+    for file_name in sorted(os.listdir(log_dir)) if os.path.isdir(log_dir) else []:
+        match = _LOG_NAME_PATTERN.match(file_name)
+        if not match or match.group("stock_name") not in symbols_by_name:
+            continue
+        symbol, label = symbols_by_name[match.group("stock_name")], match.group("label")
+        logged_at = datetime.strptime(match.group("timestamp"), "%Y%m%d%H%M%S")
+        if any(logged_at <= cached_at <= logged_at + _CACHE_WRITE_WINDOW
+               for cached_at in cached_times.get((symbol, label), [])):
+            continue
+        end_date = _prompt_end_date(os.path.join(log_dir, f"{match.group('stock_name')}_"
+                                                          f"{match.group('timestamp')}.txt"))
+        if end_date is None:
+            continue
+        with open(os.path.join(log_dir, file_name), "r", encoding="utf-8") as response_file:
+            prediction = parse_prediction(response_file.read())
+        rows.append(dict({"symbol": symbol, "end_date": end_date, "model": label_models.get(label, label),
+                          "prompt_version": "unknown"}, **prediction))
+    return pd.DataFrame(rows, columns=["symbol", "end_date", "model", "prompt_version", "direction", "pct",
+                                       "stop_loss", "take_profit"])
+
+
+def backtest_predictions(predictions, store, horizon=3, neutral_band=1.0, adjust=""):
+    """
+    Score predictions against the following bars of the local price store in one vectorized pass.
+
+    The base price is the close of the last bar on or before end_date; the outcome is the close
+    horizon bars later. A prediction is a hit when its direction matches the realized move
+    (moves within +-neutral_band % count as flat). Stop-loss/take-profit levels are checked
+    against the intraday lows/highs of the horizon, the level reached first wins.
+
+    Parameters:
+    - predictions (pandas.DataFrame): Output of load_cached_predictions()/load_log_predictions().
+    - store (StockPriceStore): Daily bars.
+    - horizon (int): Number of bars of the prediction.
+    - neutral_band (float): Flat band in percent.
+
+    Returns:
+    - pandas.DataFrame: predictions with base_close, realized_pct, scored, hit, abs_error,
+      take_hit and stop_hit columns; predictions without enough later bars are not scored.
+    """
+    result = predictions.reset_index(drop=True).copy()
+    if not len(result):
+        for column in ["base_close", "realized_pct", "scored", "hit", "abs_error", "take_hit", "stop_hit"]:
+            result[column] = pd.Series(dtype=float)
+        return result
+    end_dates = result["end_date"].astype(str).str.slice(0, 8).astype(int).to_numpy()
+    start_date = datetime.strptime(str(end_dates.min()), "%Y%m%d") - pd.Timedelta(days=30)
+    symbols, dates, arrays, mask = indicator_engine.stack_price_store(
+        store, sorted(result["symbol"].unique()), start_date.strftime("%Y%m%d"), "21000101", adjust)
+    packed_dates, order, valid = indicator_engine.pack(np.broadcast_to(dates.astype(float), mask.shape), mask)
+    close, high, low = (np.where(valid, np.take_along_axis(arrays[field], order, axis=1), np.nan)
+                        for field in ("close", "high", "low"))
+    lengths = valid.sum(axis=1)
+
+    rows = np.searchsorted(symbols, result["symbol"].to_numpy())
+    with np.errstate(invalid="ignore"):
+        base = (packed_dates[rows] <= end_dates[:, None]).sum(axis=1) - 1
+    positions = base[:, None] + np.arange(1, horizon + 1)[None, :]
+    scored = (base >= 0) & (positions[:, -1] < lengths[rows])
+    positions = np.clip(positions, 0, close.shape[1] - 1)
+    base_close = np.where(base >= 0, close[rows, np.maximum(base, 0)], np.nan)
+    window_high = high[rows[:, None], positions]
+    window_low = low[rows[:, None], positions]
+    final_close = close[rows, positions[:, -1]]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        realized_pct = np.where(scored, (final_close / base_close - 1) * 100, np.nan)
+        realized_direction = np.where(np.abs(realized_pct) <= neutral_band, 0, np.sign(realized_pct))
+        direction = result["direction"].to_numpy(dtype=float)
+        hit = np.where(scored & ~np.isnan(direction), (direction == realized_direction).astype(float), np.nan)
+        abs_error = np.where(scored, np.abs(result["pct"].to_numpy(dtype=float) - realized_pct), np.nan)
+        # 止盈/止损：以窗口内首次触及的价位为准，未设置的价位不计
+        take_profit = result["take_profit"].to_numpy(dtype=float)
+        stop_loss = result["stop_loss"].to_numpy(dtype=float)
+        long_side = ~(direction < 0)
+        take_reached = np.where(long_side[:, None], window_high >= take_profit[:, None],
+                                window_low <= take_profit[:, None])
+        stop_reached = np.where(long_side[:, None], window_low <= stop_loss[:, None],
+                                window_high >= stop_loss[:, None])
+    first_take = np.where(take_reached.any(axis=1), take_reached.argmax(axis=1), horizon)
+    first_stop = np.where(stop_reached.any(axis=1), stop_reached.argmax(axis=1), horizon)
+    take_hit = np.where(scored & ~np.isnan(take_profit), (first_take < horizon) & (first_take <= first_stop), np.nan)
+    stop_hit = np.where(scored & ~np.isnan(stop_loss), (first_stop < horizon) & (first_stop < first_take), np.nan)
+
+    result["base_close"] = base_close
+    result["realized_pct"] = realized_pct
+    result["scored"] = scored
+    result["hit"] = hit
+    result["abs_error"] = abs_error
+    result["take_hit"] = take_hit.astype(float)
+    result["stop_hit"] = stop_hit.astype(float)
+    return result
+
+
+def summarize_backtest(results, by=("model", "prompt_version")):
+    """
+    Aggregate backtest results per model and prompt version.
+
+    Returns:
+    - pandas.DataFrame: predictions, scored, hit_rate, mean_abs_error (percentage points),
+      mean_signed_return (realized move in the predicted direction), take_hit_rate, stop_hit_rate.
+    """
+    frame = results.copy()
+    frame["signed_return"] = frame["direction"] * frame["realized_pct"]
+    grouped = frame.groupby(list(by), dropna=False)
+    summary = pd.DataFrame({
+        "predictions": grouped.size(),
+        "scored": grouped["scored"].sum(),
+        "hit_rate": grouped["hit"].mean(),
+        "mean_abs_error": grouped["abs_error"].mean(),
+        "mean_signed_return": grouped["signed_return"].mean(),
+        "take_hit_rate": grouped["take_hit"].mean(),
+        "stop_hit_rate": grouped["stop_hit"].mean(),
+    })
+    return summary.reset_index().sort_values("hit_rate", ascending=False, na_position="last")
+
+
+if __name__ == "__main__":
+    for sample in ["预计未来3天上涨2%-3%，止盈位12.5元，止损位10.8元。", "短期可能回调 1.5%，建议减持，止损 5%",
+                   "整体看涨，建议逢低买入。", "最近一日涨跌幅为2.5%，主力资金净流入。预计未来3天上涨1%-2%。",
+                   "行业板块今日上涨3.2%。\n5. 技术面偏弱。\n6. 预测：未来3天可能下跌2%，止损位10.8元。"]:
+        print(parse_prediction(sample))
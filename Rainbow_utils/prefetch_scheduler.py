@@ -0,0 +1,226 @@
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# 默认计划：开盘前、盘中每 30 分钟、收盘后各预取一次
+DEFAULT_PREFETCH_PLAN = "at 09:00; every 30m 09:30-15:00; at 15:30"
+_RULE_PATTERN = re.compile(
+    r"^(?:at\s+(?P<at>\d{1,2}:\d{2})"
+    r"|every\s+(?P<every>\d+)\s*(?P<unit>[mh])\s+(?P<start>\d{1,2}:\d{2})-(?P<end>\d{1,2}:\d{2}))"
+    r"(?:\s+(?P<days>daily|weekdays))?$")
+
+
+def _parse_time(text):
+    hour, minute = text.split(":")
+    return int(hour), int(minute)
+
+
+class ScheduleRule:
+    """
+    One line of a prefetch plan: a fixed time of day, or a fixed interval inside a time window.
+
+    Parameters:
+    - at (tuple): (hour, minute) of a daily run.
+    - every (timedelta): Interval of the runs inside the window.
+    - window (tuple): ((hour, minute), (hour, minute)) of the interval runs, both ends included.
+    - weekdays_only (bool): Skip Saturdays and Sundays.
+    """
+
+    def __init__(self, at=None, every=None, window=None, weekdays_only=True):
+        self.at = at
+        self.every = every
+        self.window = window
+        self.weekdays_only = weekdays_only
+
+    def _day_times(self, day):
+        if self.at is not None:
+            return [day.replace(hour=self.at[0], minute=self.at[1])]
+        start = day.replace(hour=self.window[0][0], minute=self.window[0][1])
+        end = day.replace(hour=self.window[1][0], minute=self.window[1][1])
+        times = []
+        while start <= end:
+            times.append(start)
+            start += self.every
+        return times
+
+    def next_after(self, moment):
+        """
+        Return the first run time strictly after moment.
+        """
+        day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        for _ in range(8):
+            if not (self.weekdays_only and day.weekday() >= 5):
+                for run_time in self._day_times(day):
+                    if run_time > moment:
+                        return run_time
+            day += timedelta(days=1)
+        raise ValueError("Schedule rule never fires")
+
+
+def parse_plan(plan):
+    """
+    Parse a cron-like plan such as "at 15:30; every 30m 09:30-15:00" into ScheduleRules.
+
+    Every rule runs on weekdays unless it ends with "daily".
+
+    Raises:
+    - ValueError: A rule cannot be parsed.
+    """
+    rules = []
+    for text in filter(None, (part.strip() for part in plan.split(";"))):
+        match = _RULE_PATTERN.match(text)
+        if not match:
+            raise ValueError(f"Invalid prefetch plan rule: {text}")
+        weekdays_only = match.group("days") != "daily"
+        if match.group("at"):
+            rules.append(ScheduleRule(at=_parse_time(match.group("at")), weekdays_only=weekdays_only))
+        else:
+            amount = int(match.group("every"))
+            every = timedelta(minutes=amount) if match.group("unit") == "m" else timedelta(hours=amount)
+            rules.append(ScheduleRule(every=every, window=(_parse_time(match.group("start")),
+                                                           _parse_time(match.group("end"))),
+                                      weekdays_only=weekdays_only))
+    return rules
+
+
+def run_with_backoff(job, max_retries=3, backoff=2.0, max_backoff=60.0):
+    """
+    Call job(), retrying failures with exponential backoff and jitter; the last error is raised.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return job()
+        except Exception:
+            if attempt == max_retries:
+                raise
+            delay = min(backoff * 2 ** attempt, max_backoff)
+            time.sleep(delay * random.uniform(0.5, 1.0))
+
+
+class PrefetchScheduler:
+    """
+    Background thread that runs prefetch jobs according to a plan.
+
+    At every run time build_jobs() is called for the current list of (name, callable) jobs,
+    which are executed with bounded concurrency; every failing job is retried with backoff.
+    Runs that are missed (e.g. while the machine slept) are not replayed, only the next one
+    is scheduled.
+
+    Parameters:
+    - plan (str): Plan understood by parse_plan().
+    - build_jobs (callable): Returns the jobs of one run.
+    - max_workers (int): Maximum number of concurrently running jobs.
+    - max_retries (int): Retries of a failing job.
+    - backoff (float): Initial retry delay in seconds, doubled on every retry.
+    """
+
+    def __init__(self, plan, build_jobs, max_workers=4, max_retries=3, backoff=2.0):
+        self.rules = parse_plan(plan)
+        self.build_jobs = build_jobs
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.stop_event = threading.Event()
+        self.run_lock = threading.Lock()
+        self.trigger_lock = threading.Lock()
+        self.triggered = False
+        self.thread = None
+        self.last_run = None
+        self.next_run = None
+
+    def next_run_after(self, moment):
+        return min(rule.next_after(moment) for rule in self.rules)
+
+    def run_once(self):
+        """
+        Run all jobs now and return a summary dict (started, elapsed, ok, failed: name -> error).
+        """
+        with self.run_lock:
+            started = datetime.now()
+            jobs = list(self.build_jobs())
+            failed = {}
+
+            def run(job):
+                name, fetch = job
+                try:
+                    run_with_backoff(fetch, self.max_retries, self.backoff)
+                except Exception as e:
+                    failed[name] = str(e)
+
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="prefetch") as executor:
+                list(executor.map(run, jobs))
+            self.last_run = {"started": started.isoformat(timespec="seconds"),
+                             "elapsed": (datetime.now() - started).total_seconds(),
+                             "ok": len(jobs) - len(failed), "failed": failed}
+            return self.last_run
+
+    def _run_logged(self):
+        try:
+            summary = self.run_once()
+            print(f"预取完成：成功 {summary['ok']} 项，失败 {len(summary['failed'])} 项，"
+                  f"耗时 {summary['elapsed']:.1f} 秒")
+        except Exception as e:
+            print(f"预取失败: {e}")
+
+    def _loop(self):
+        while not self.stop_event.is_set():
+            self.next_run = self.next_run_after(datetime.now())
+            if self.stop_event.wait(max((self.next_run - datetime.now()).total_seconds(), 0)):
+                break
+            self._run_logged()
+
+    def _triggered_run(self):
+        try:
+            self._run_logged()
+        finally:
+            with self.trigger_lock:
+                self.triggered = False
+
+    def trigger(self):
+        """
+        Run all jobs now in a background thread, unless such a run is already in progress.
+
+        Returns:
+        - bool: True when a run was started.
+        """
+        with self.trigger_lock:
+            if self.triggered:
+                return False
+            self.triggered = True
+        threading.Thread(target=self._triggered_run, name="prefetch-run", daemon=True).start()
+        return True
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._loop, name="prefetch-scheduler", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def status(self):
+        """
+        Format the next run time and the result of the last run.
+        """
+        lines = [f"next run: {self.next_run:%Y-%m-%d %H:%M}" if self.next_run else "scheduler not running"]
+        if self.triggered or self.run_lock.locked():
+            lines.append("run in progress")
+        if self.last_run:
+            lines.append(f"last run: {self.last_run['started']}, {self.last_run['ok']} ok, "
+                         f"{len(self.last_run['failed'])} failed, {self.last_run['elapsed']:.1f}s")
+            lines.extend(f"  {name}: {error}" for name, error in sorted(self.last_run["failed"].items()))
+        return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    scheduler = PrefetchScheduler(DEFAULT_PREFETCH_PLAN, lambda: [("demo", lambda: time.sleep(0.1))])
+    moment = datetime(2023, 12, 15, 14, 50)
+    for _ in range(4):
+        moment = scheduler.next_run_after(moment)
+        print(moment)
+    print(scheduler.run_once())
@@ -0,0 +1,249 @@
+import csv
+import io
+import math
+import re
+
+from Rainbow_utils.lazy_import import lazy_import
+
+pd = lazy_import("pandas")
+tiktoken = lazy_import("tiktoken")
+
+# 各段落默认的 token 预算权重
+DEFAULT_SECTION_WEIGHTS = {
+    "stock_zyjs_ths_df": 1.5,
+    "single_industry_df": 0.5,
+    "concept_info_df": 0.5,
+    "stock_individual_info_em_df": 1.0,
+    "stock_zh_a_hist_df": 3.0,
+    "technical_indicators_df": 2.0,
+    "stock_news_em_df": 2.0,
+    "stock_individual_fund_flow_df": 1.5,
+    "stock_financial_analysis_indicator_df": 2.0,
+}
+# K线中可由其他列推算的冗余列
+PRICE_REDUNDANT_COLUMNS = ["成交额", "振幅", "涨跌额", "股票代码"]
+
+
+def format_number(value, digits=2):
+    """
+    Format a number compactly: rounded, without trailing zeros, large values in 万/亿.
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return str(value)
+    if abs(value) >= 1e8:
+        return f"{value / 1e8:.{digits}f}".rstrip("0").rstrip(".") + "亿"
+    if abs(value) >= 1e5:
+        return f"{value / 1e4:.{digits}f}".rstrip("0").rstrip(".") + "万"
+    if float(value).is_integer():
+        return str(int(value))
+    return f"{value:.{digits}f}".rstrip("0").rstrip(".")
+
+
+def _format_cell(value, digits):
+    if hasattr(value, "item") and not isinstance(value, str):
+        value = value.item()
+    if hasattr(value, "strftime"):
+        return value.strftime("%Y-%m-%d")
+    text = format_number(value, digits)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def table_lines(df, digits=2):
+    """
+    Render a DataFrame as CSV lines (header first) with compact numbers; all-empty columns are dropped.
+    """
+    df = df.dropna(axis=1, how="all")
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow([str(column) for column in df.columns])
+    for row in df.itertuples(index=False):
+        writer.writerow([_format_cell(value, digits) for value in row])
+    return buffer.getvalue().rstrip("\n").split("\n")
+
+
+def _weekly(df, date_column, aggregations):
+    frame = df.copy()
+    frame[date_column] = pd.to_datetime(frame[date_column])
+    frame["_week_last_day"] = frame[date_column]
+    aggregations = dict(aggregations, _week_last_day="last")
+    weekly = frame.set_index(date_column).resample("W-FRI").agg(aggregations).dropna(subset=["_week_last_day"])
+    weekly.insert(0, date_column, weekly.pop("_week_last_day").dt.date)
+    return weekly.reset_index(drop=True)
+
+
+def compact_price_history(df, daily_rows=30):
+    """
+    Compact daily K-line data: bars older than the last daily_rows are aggregated per week,
+    open/high/low are encoded as deltas to the close and derivable columns are dropped.
+
+    Returns:
+    - tuple: (DataFrame, note describing the encoding)
+    """
+    df = df.drop(columns=[column for column in PRICE_REDUNDANT_COLUMNS if column in df.columns])
+    older, recent = df.iloc[:-daily_rows], df.iloc[-daily_rows:]
+    if len(older):
+        aggregations = {"开盘": "first", "收盘": "last", "最高": "max", "最低": "min"}
+        aggregations.update({column: "sum" for column in ["成交量", "换手率"] if column in df.columns})
+        older = _weekly(older, "日期", {k: v for k, v in aggregations.items() if k in df.columns})
+        if "涨跌幅" in df.columns:
+            previous_close = older["收盘"].shift(1)
+            older["涨跌幅"] = (older["收盘"] / previous_close - 1) * 100
+        frame = pd.concat([older, recent[older.columns]], ignore_index=True)
+    else:
+        frame = recent.copy()
+    for column, name in [("开盘", "开-收"), ("最高", "高-收"), ("最低", "低-收")]:
+        if column in frame.columns:
+            frame[name] = frame.pop(column) - frame["收盘"]
+    frame = frame[["日期", "收盘", "开-收", "高-收", "低-收"]
+                  + [column for column in frame.columns if column not in ("日期", "收盘", "开-收", "高-收", "低-收")]]
+    note = "开/高/低以相对收盘价的差值表示"
+    if len(older):
+        note = f"最近{len(recent)}个交易日为日线，更早的数据按周汇总（日期为该周最后交易日）；" + note
+    return frame, note
+
+
+def compact_indicators(df, daily_rows=30):
+    """
+    Keep the last daily_rows indicator rows daily and the older ones as weekly closing values.
+    """
+    older, recent = df.iloc[:-daily_rows], df.iloc[-daily_rows:]
+    if not len(older):
+        return df, ""
+    older = _weekly(older, "日期", {column: "last" for column in df.columns if column != "日期"})
+    note = f"最近{len(recent)}个交易日为日值，更早的为周末值"
+    return pd.concat([older, recent], ignore_index=True), note
+
+
+def _keep_recent_from_end(df):
+    # 日期升序的表格保留末尾（最近）的行，降序的保留开头的行
+    if "日期" not in df.columns or len(df) < 2:
+        return False
+    dates = pd.to_datetime(df["日期"], errors="coerce")
+    return bool(dates.iloc[-1] >= dates.iloc[0])
+
+
+class PromptEncoder:
+    """
+    Render the sections of the stock analysis prompt within a total token budget.
+
+    Every section gets a share of the budget proportional to its weight; the budget left
+    unused by short sections is handed to the sections that need more. Tables are rendered
+    as compact CSV, price history and indicators are downsampled to weekly rows beyond the
+    last daily_rows bars, and a table over its budget keeps its most recent rows.
+
+    Parameters:
+    - total_tokens (int): Token budget of all sections together.
+    - weights (dict): Section name -> weight, defaults to DEFAULT_SECTION_WEIGHTS.
+    - encoding_name (str): tiktoken encoding used for counting.
+    - digits (int): Decimal places of numbers.
+    - daily_rows (int): Number of most recent bars kept as daily rows.
+    """
+
+    def __init__(self, total_tokens=6000, weights=None, encoding_name="cl100k_base", digits=2, daily_rows=30):
+        self.total_tokens = total_tokens
+        self.weights = dict(DEFAULT_SECTION_WEIGHTS, **(weights or {}))
+        self.encoding_name = encoding_name
+        self.digits = digits
+        self.daily_rows = daily_rows
+
+    def count_tokens(self, text):
+        return len(tiktoken.get_encoding(self.encoding_name).encode(text))
+
+    def render_lines(self, name, value):
+        """
+        Render one section into (fixed lines, droppable lines, keep-from-end flag).
+        """
+        if not isinstance(value, pd.DataFrame):
+            text = re.sub(r"[ \t]+", " ", str(value)).strip()
+            return [], [text], False
+        note = ""
+        if name == "stock_zh_a_hist_df" and "收盘" in value.columns:
+            value, note = compact_price_history(value, self.daily_rows)
+        elif name == "technical_indicators_df" and "日期" in value.columns:
+            value, note = compact_indicators(value, self.daily_rows)
+        lines = table_lines(value, self.digits)
+        header = ([f"（{note}）"] if note else []) + lines[:1]
+        return header, lines[1:], _keep_recent_from_end(value)
+
+    def _fit(self, fixed, rows, keep_from_end, budget):
+        encoding = tiktoken.get_encoding(self.encoding_name)
+        used = sum(len(encoding.encode(line + "\n")) for line in fixed)
+        if len(rows) == 1 and not fixed:
+            # 纯文本段落按 token 截断
+            tokens = encoding.encode(rows[0])
+            text = encoding.decode(tokens[:max(budget, 0)])
+            return text, min(len(tokens), max(budget, 0))
+        ordered = list(reversed(rows)) if keep_from_end else list(rows)
+        kept = []
+        for line in ordered:
+            cost = len(encoding.encode(line + "\n"))
+            if used + cost > budget:
+                break
+            kept.append(line)
+            used += cost
+        if keep_from_end:
+            kept.reverse()
+        return "\n".join(fixed + kept), used
+
+    def encode(self, sections):
+        """
+        Encode the prompt sections within the token budget.
+
+        Parameters:
+        - sections (dict): Section name -> DataFrame or text.
+
+        Returns:
+        - tuple: (dict section name -> rendered text, dict section name -> {"tokens", "budget", "full"})
+        """
+        rendered = {name: self.render_lines(name, value) for name, value in sections.items()}
+        full_tokens = {name: self.count_tokens("\n".join(fixed + rows)) for name, (fixed, rows, _) in rendered.items()}
+
+        # 按权重分配预算，短段落未用完的预算再分给超出预算的段落
+        weights = {name: self.weights.get(name, 1.0) for name in sections}
+        budgets = {}
+        remaining_names = set(sections)
+        remaining_tokens = self.total_tokens
+        while remaining_names:
+            total_weight = sum(weights[name] for name in remaining_names) or 1.0
+            shares = {name: remaining_tokens * weights[name] / total_weight for name in remaining_names}
+            fitting = {name for name in remaining_names if full_tokens[name] <= shares[name]}
+            if not fitting:
+                budgets.update({name: int(share) for name, share in shares.items()})
+                break
+            for name in fitting:
+                budgets[name] = full_tokens[name]
+                remaining_tokens -= full_tokens[name]
+            remaining_names -= fitting
+
+        texts, report = {}, {}
+        for name, (fixed, rows, keep_from_end) in rendered.items():
+            texts[name], used = self._fit(fixed, rows, keep_from_end, budgets[name])
+            report[name] = {"tokens": used, "budget": budgets[name], "full": full_tokens[name]}
+        return texts, report
+
+
+def format_token_report(report):
+    """
+    Format the per-section token report of PromptEncoder.encode() for the log.
+    """
+    lines = [f"prompt tokens: {sum(item['tokens'] for item in report.values())}"]
+    for name, item in report.items():
+        lines.append(f"  {name}: {item['tokens']} / budget {item['budget']} (uncompressed {item['full']})")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import numpy as np
+
+    dates = pd.bdate_range("2023-08-01", "2023-12-12")
+    close = 10 + np.cumsum(np.random.RandomState(3).normal(0, 0.2, len(dates)))
+    hist = pd.DataFrame({"日期": dates.date, "开盘": close - 0.05, "收盘": close, "最高": close + 0.2,
+                         "最低": close - 0.2, "成交量": 123456.0, "成交额": 1.5e8, "振幅": 3.1,
+                         "涨跌幅": 0.5, "涨跌额": 0.05, "换手率": 1.23})
+    encoder = PromptEncoder(total_tokens=1500)
+    texts, report = encoder.encode({"stock_zh_a_hist_df": hist, "stock_zyjs_ths_df": "主营业务：光热发电"})
+    print(texts["stock_zh_a_hist_df"])
+    print(format_token_report(report))
+    print("to_string tokens:", encoder.count_tokens(hist.to_string(index=False)))
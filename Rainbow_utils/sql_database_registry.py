@@ -0,0 +1,312 @@
+import copy
+import threading
+import time
+
+from langchain.utilities import SQLDatabase
+from loguru import logger
+from sqlalchemy import bindparam, create_engine, select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+
+from Rainbow_utils.sql_query_guard import is_select
+
+_TABLE_MARKERS_SQL = text(
+    "SELECT TABLE_NAME, CREATE_TIME, UPDATE_TIME, NOW() FROM information_schema.TABLES "
+    "WHERE TABLE_SCHEMA = :schema AND TABLE_TYPE = 'BASE TABLE'")
+_REFERENCED_MARKERS_SQL = text(
+    "SELECT TABLE_NAME, CREATE_TIME, UPDATE_TIME, NOW() FROM information_schema.TABLES "
+    "WHERE TABLE_SCHEMA = :schema AND TABLE_TYPE = 'BASE TABLE' AND TABLE_NAME IN :tables"
+).bindparams(bindparam("tables", expanding=True))
+
+
+def safe_uri(uri):
+    """
+    Render a connection URI for logging, with the password masked.
+    """
+    return make_url(uri).render_as_string(hide_password=True)
+
+
+class CachedSQLDatabase(SQLDatabase):
+    """
+    SQLDatabase whose table info (CREATE TABLE statement and sample rows) is built once per table.
+
+    The base class queries the sample rows of every requested table on each get_table_info()
+    call; here the text of each table is cached until invalidate_tables() is called.
+    """
+
+    def __init__(self, *args, query_cache=None, cache_namespace="", markers_source=None, query_guard=None,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self._table_info_cache = {}
+        self._table_info_lock = threading.Lock()
+        self._query_cache = query_cache
+        self._cache_namespace = cache_namespace
+        self._markers_source = markers_source
+        self._query_guard = query_guard
+
+    def _run_uncached(self, command, fetch):
+        if self._query_guard is not None and is_select(command):
+            return self._query_guard.run(self._engine, command, fetch, self._max_string_length)
+        return super().run(command, fetch)
+
+    def run(self, command, fetch="all"):
+        """
+        Execute a SQL command. SELECTs are served from the query cache when one is attached,
+        and otherwise executed through the query guard.
+        """
+        if self._query_cache is None or self._markers_source is None:
+            return self._run_uncached(command, fetch)
+        return self._query_cache.call(self._cache_namespace, command, fetch,
+                                      lambda: self._run_uncached(command, fetch),
+                                      self._all_tables, self._markers_source,
+                                      self._schema or self._engine.url.database)
+
+    def get_table_info(self, table_names=None):
+        all_table_names = self.get_usable_table_names()
+        if table_names is not None:
+            missing_tables = set(table_names).difference(all_table_names)
+            if missing_tables:
+                raise ValueError(f"table_names {missing_tables} not found in database")
+            all_table_names = table_names
+
+        tables = []
+        for table_name in all_table_names:
+            with self._table_info_lock:
+                table_info = self._table_info_cache.get(table_name)
+            if table_info is None:
+                table_info = super().get_table_info([table_name])
+                with self._table_info_lock:
+                    self._table_info_cache[table_name] = table_info
+            if table_info:
+                tables.append(table_info)
+        tables.sort()
+        return "\n\n".join(tables)
+
+    def invalidate_tables(self, table_names=None):
+        """
+        Drop the cached table info of table_names (default: all tables).
+        """
+        with self._table_info_lock:
+            if table_names is None:
+                self._table_info_cache.clear()
+            for table_name in table_names or []:
+                self._table_info_cache.pop(table_name, None)
+
+    def scoped(self, table_names):
+        """
+        Return a view of this database restricted to table_names.
+
+        The view shares the reflected metadata, the engine and the table info cache, so it
+        is created without touching the database.
+        """
+        view = copy.copy(self)
+        view._include_tables = set(table_names)
+        view._usable_tables = set(table_names)
+        return view
+
+    def describe_tables(self, sample_rows=3, max_value_length=50):
+        """
+        Compact per-table descriptions for retrieval: table comment, column types and comments,
+        and distinct sample values of every column.
+
+        Returns:
+        - dict: table name -> description
+        """
+        usable_tables = set(self.get_usable_table_names())
+        descriptions = {}
+        with self._engine.connect() as connection:
+            for table in self._metadata.sorted_tables:
+                if table.name not in usable_tables:
+                    continue
+                try:
+                    rows = connection.execute(select(table).limit(sample_rows)).fetchall()
+                except SQLAlchemyError:
+                    rows = []
+                lines = [f"table {table.name}" + (f": {table.comment}" if table.comment else "")]
+                for position, column in enumerate(table.columns):
+                    try:
+                        column_type = column.type.compile(self._engine.dialect)
+                    except Exception:
+                        column_type = ""
+                    values = sorted({str(row[position])[:max_value_length] for row in rows
+                                     if row[position] is not None})
+                    lines.append(f"column {column.name} {column_type}".rstrip()
+                                 + (f": {column.comment}" if column.comment else "")
+                                 + (f" (e.g. {', '.join(values)})" if values else ""))
+                descriptions[table.name] = "\n".join(lines)
+        return descriptions
+
+
+class SQLDatabaseRegistry:
+    """
+    Process-wide pooled engines and reflected databases, keyed by connection URI.
+
+    Every URI gets one engine with a sized connection pool (pre-ping validates pooled
+    connections before use) and one CachedSQLDatabase, so the schema is reflected once.
+    At most every check_interval seconds the per-table CREATE_TIME/UPDATE_TIME of
+    information_schema.TABLES is compared with the last snapshot (MySQL only): row changes
+    drop the cached table info (sample rows) of the changed tables, added/dropped/recreated
+    tables trigger a new reflection. DDL that leaves CREATE_TIME untouched (e.g. instant
+    ALTER TABLE) and other dialects need an explicit refresh().
+
+    Parameters:
+    - pool_size (int): Connections kept open per URI.
+    - max_overflow (int): Additional connections allowed under load.
+    - pool_recycle (int): Seconds after which a pooled connection is replaced.
+    - check_interval (float): Minimum seconds between two change checks of a database.
+    - sample_rows_in_table_info (int): Sample rows embedded in the table info.
+    - query_cache (QueryResultCache): Result cache shared by the databases, None disables it.
+    - query_guard (QueryGuard): Cost guard and row cap of SELECTs, None disables it.
+    """
+
+    def __init__(self, pool_size=5, max_overflow=10, pool_recycle=3600, check_interval=30.0,
+                 sample_rows_in_table_info=3, query_cache=None, query_guard=None):
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_recycle = pool_recycle
+        self.check_interval = check_interval
+        self.sample_rows_in_table_info = sample_rows_in_table_info
+        self.query_cache = query_cache
+        self.query_guard = query_guard
+        self.engines = {}
+        self.databases = {}
+        self.lock = threading.Lock()
+        self.uri_locks = {}
+
+    def engine(self, uri):
+        """
+        Return the pooled engine of uri, creating it on first use.
+        """
+        with self.lock:
+            engine = self.engines.get(uri)
+            if engine is None:
+                options = {"pool_pre_ping": True, "pool_recycle": self.pool_recycle}
+                if make_url(uri).get_backend_name() != "sqlite":
+                    options.update(pool_size=self.pool_size, max_overflow=self.max_overflow)
+                engine = create_engine(uri, **options)
+                self.engines[uri] = engine
+            return engine
+
+    def _uri_lock(self, uri):
+        with self.lock:
+            return self.uri_locks.setdefault(uri, threading.Lock())
+
+    def query_markers(self, uri, table_names=None):
+        """
+        Query table name -> (CREATE_TIME, UPDATE_TIME) of the base tables of the database of uri.
+
+        With information_schema_stats_expiry = 0 every listed table is opened to read its
+        statistics, so the query cache passes only the tables a statement references.
+        Partitioned InnoDB tables always report a NULL UPDATE_TIME: writes to them do not
+        change the markers, and cached results of such tables are bounded only by the TTL.
+
+        Parameters:
+        - uri (str): SQLAlchemy connection URI.
+        - table_names (iterable): Tables to query, default all base tables.
+
+        Returns:
+        - tuple: (markers, server time); markers is None for dialects without
+          information_schema.TABLES timestamps.
+        """
+        engine = self.engine(uri)
+        if engine.dialect.name != "mysql":
+            return None, None
+        with engine.connect() as connection:
+            try:
+                # MySQL 8 默认缓存 information_schema 统计信息 24 小时，需读取实时值
+                connection.execute(text("SET SESSION information_schema_stats_expiry = 0"))
+            except SQLAlchemyError:
+                pass
+            if table_names is None:
+                rows = connection.execute(_TABLE_MARKERS_SQL, {"schema": engine.url.database}).fetchall()
+            else:
+                rows = connection.execute(_REFERENCED_MARKERS_SQL, {"schema": engine.url.database,
+                                                                    "tables": list(table_names)}).fetchall()
+        return {row[0]: (row[1], row[2]) for row in rows}, rows[0][3] if rows else None
+
+    def table_markers(self, uri):
+        """
+        Query table name -> (CREATE_TIME, UPDATE_TIME) of the database of uri.
+
+        Returns:
+        - dict, or None for dialects without information_schema.TABLES timestamps.
+        """
+        return self.query_markers(uri)[0]
+
+    def _reflect(self, uri):
+        start_time = time.monotonic()
+        markers = self.table_markers(uri)
+        database = CachedSQLDatabase(self.engine(uri), sample_rows_in_table_info=self.sample_rows_in_table_info,
+                                     query_cache=self.query_cache, cache_namespace=uri,
+                                     markers_source=lambda tables: self.query_markers(uri, tables),
+                                     query_guard=self.query_guard)
+        logger.info(f"反射数据库结构 {safe_uri(uri)}：{len(database.get_usable_table_names())} 张表，"
+                    f"耗时 {time.monotonic() - start_time:.2f} 秒")
+        return {"database": database, "markers": markers, "checked_at": time.monotonic()}
+
+    def _check(self, uri, entry):
+        markers = self.table_markers(uri)
+        entry["checked_at"] = time.monotonic()
+        previous = entry["markers"]
+        if markers is None or markers == previous:
+            return entry
+        if set(markers) != set(previous) or any(markers[name][0] != previous[name][0] for name in markers):
+            # 表增删或重建：重新反射
+            return self._reflect(uri)
+        changed = [name for name in markers if markers[name] != previous[name]]
+        entry["database"].invalidate_tables(changed)
+        entry["markers"] = markers
+        logger.info(f"数据已变化，刷新表信息缓存：{', '.join(changed)}")
+        return entry
+
+    def database(self, uri, refresh=False):
+        """
+        Return the cached CachedSQLDatabase of uri, reflecting or re-validating it when due.
+
+        Parameters:
+        - uri (str): SQLAlchemy connection URI including the database name.
+        - refresh (bool): Reflect the schema again unconditionally.
+        """
+        with self._uri_lock(uri):
+            entry = self.databases.get(uri)
+            if entry is None or refresh:
+                entry = self._reflect(uri)
+            elif time.monotonic() - entry["checked_at"] >= self.check_interval:
+                entry = self._check(uri, entry)
+            self.databases[uri] = entry
+            return entry["database"]
+
+    def refresh(self, uri=None):
+        """
+        Forget the reflected schema and table info of uri (default: all databases).
+        """
+        with self.lock:
+            for key in [uri] if uri is not None else list(self.databases):
+                self.databases.pop(key, None)
+
+    def dispose(self):
+        """
+        Close the pooled connections of every engine.
+        """
+        with self.lock:
+            self.databases.clear()
+            engines, self.engines = list(self.engines.values()), {}
+        for engine in engines:
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as root:
+        demo_uri = f"sqlite:///{os.path.join(root, 'demo.db')}"
+        registry = SQLDatabaseRegistry(check_interval=0)
+        with registry.engine(demo_uri).begin() as connection:
+            connection.execute(text("CREATE TABLE stock (code TEXT, name TEXT)"))
+            connection.execute(text("INSERT INTO stock VALUES ('002665', '首航高科')"))
+        for _ in range(2):
+            start_time = time.monotonic()
+            db = registry.database(demo_uri)
+            print(db.get_table_info(), f"\n{time.monotonic() - start_time:.4f}s")
+        registry.dispose()
@@ -0,0 +1,222 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# 字符串常量与带引号的标识符原样保留（可能区分大小写）
+_QUOTED_PATTERN = re.compile(r"('(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`)")
+_COMMENT_PATTERN = re.compile(r"--[^\n]*|#[^\n]*|/\*.*?\*/", re.S)
+_KEYWORDS = {
+    "select", "distinct", "from", "where", "and", "or", "not", "in", "is", "null", "like", "between", "as",
+    "join", "inner", "left", "right", "outer", "cross", "on", "using", "group", "by", "order", "asc", "desc",
+    "having", "limit", "offset", "union", "all", "with", "case", "when", "then", "else", "end", "exists",
+    "count", "sum", "avg", "min", "max",
+}
+# 结果不确定或有副作用的语句不缓存
+_VOLATILE_PATTERN = re.compile(
+    r"\b(?:now|rand|uuid|uuid_short|sysdate|curdate|curtime|unix_timestamp|utc_date|utc_time|utc_timestamp"
+    r"|last_insert_id|connection_id|found_rows|row_count|sleep|get_lock|benchmark)\s*\("
+    r"|\b(?:current_date|current_time|current_timestamp|localtime|localtimestamp)\b"
+    r"|\bfor\s+update\b|\block\s+in\s+share\s+mode\b|\binto\b|@", re.I)
+
+
+_IDENTIFIER = r"(?:`[^`]*`|[A-Za-z_][\w$]*)"
+# 表名（可带库名），以及可选的别名
+_TABLE_REFERENCE_PATTERN = re.compile(rf"({_IDENTIFIER})(?:\.({_IDENTIFIER}))?(?:\s+(?:AS\s+)?{_IDENTIFIER})?")
+
+
+def _split_quoted(sql):
+    # 奇数位为引号内的部分
+    return _QUOTED_PATTERN.split(sql)
+
+
+def normalize_sql(sql):
+    """
+    Normalize SQL text for cache keys: comments removed, whitespace collapsed, keywords upper-cased,
+    trailing semicolons dropped. Literals and quoted identifiers are kept verbatim.
+    """
+    parts = _split_quoted(sql)
+    for position in range(0, len(parts), 2):
+        text = _COMMENT_PATTERN.sub(" ", parts[position])
+        text = re.sub(r"\s*([,()=<>+\-*/])\s*", r"\1", text)
+        text = re.sub(r"\s+", " ", text)
+        parts[position] = re.sub(r"[A-Za-z_][\w$]*", lambda word: word.group(0).upper()
+                                 if word.group(0).lower() in _KEYWORDS else word.group(0), text)
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def _unquote(identifier):
+    return identifier[1:-1] if identifier.startswith("`") else identifier
+
+
+def table_references(normalized_sql):
+    """
+    Return (schema, table) of every identifier following FROM or JOIN in normalized SQL,
+    comma-separated FROM lists included; schema is None when the name is not qualified.
+
+    Derived tables are skipped (their own FROM clauses are found separately). FROM inside
+    functions such as EXTRACT(YEAR FROM column) yields the column name, which is never a
+    known table, so such statements are conservatively treated as uncacheable.
+    """
+    # 字符串常量替换为空串，只保留反引号标识符，避免匹配到常量中的 FROM
+    parts = _split_quoted(normalized_sql)
+    unquoted = "".join(part if position % 2 == 0 or part.startswith("`") else "''"
+                       for position, part in enumerate(parts))
+    references = []
+    for keyword in re.finditer(r"\b(?:FROM|JOIN)\b\s*", unquoted):
+        position = keyword.end()
+        while True:
+            reference = _TABLE_REFERENCE_PATTERN.match(unquoted, position)
+            if reference is None:
+                break
+            first, second = reference.group(1), reference.group(2)
+            references.append((_unquote(first), _unquote(second)) if second else (None, _unquote(first)))
+            position = reference.end()
+            if not unquoted.startswith(",", position):
+                break
+            position += 1
+    return references
+
+
+def is_cacheable(normalized_sql):
+    """
+    Only single, deterministic SELECT statements are cached.
+    """
+    if not re.match(r"^(?:SELECT|WITH)\b", normalized_sql):
+        return False
+    unquoted = " ".join(_split_quoted(normalized_sql)[::2])
+    return ";" not in unquoted and not _VOLATILE_PATTERN.search(unquoted)
+
+
+class QueryResultCache:
+    """
+    LRU cache of SQL query results keyed by normalized SQL and the change markers of the referenced tables.
+
+    The markers ((CREATE_TIME, UPDATE_TIME) per table, see SQLDatabaseRegistry.query_markers())
+    of the referenced tables are read on every lookup, so writing to a referenced table changes
+    the key and the stale result is never served again; it ages out of the LRU. Tables without
+    an UPDATE_TIME (partitioned InnoDB tables) are only bounded by the TTL. Statements where
+    any name after FROM or JOIN is not a base table of the schema (views, CTEs, tables of
+    other schemas), or that reference tables updated within the last settle seconds
+    (UPDATE_TIME has a one-second resolution), are executed without caching.
+
+    Parameters:
+    - max_bytes (int): Total size of the cached results.
+    - max_result_bytes (int): Larger results are not cached.
+    - ttl (float): Seconds a result is served at most.
+    - settle (float): Minimum age in seconds of the last update of every referenced table.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, max_result_bytes=256 * 1024, ttl=600, settle=2):
+        self.max_bytes = max_bytes
+        self.max_result_bytes = max_result_bytes
+        self.ttl = ttl
+        self.settle = settle
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.stats = {"hit": 0, "miss": 0, "uncacheable": 0, "evicted": 0}
+
+    def _count(self, outcome):
+        with self.lock:
+            self.stats[outcome] += 1
+
+    def _key(self, namespace, normalized, fetch, table_names, markers_source, schema):
+        references = table_references(normalized)
+        if not references or any(reference_schema is not None and reference_schema != schema
+                                 for reference_schema, _ in references):
+            return None
+        tables = sorted({table for _, table in references})
+        if any(table not in table_names for table in tables):
+            return None
+        markers, server_time = markers_source(tables)
+        if markers is None or any(table not in markers for table in tables):
+            return None
+        for table in tables:
+            updated = markers[table][1]
+            if updated is not None and server_time is not None \
+                    and (server_time - updated).total_seconds() < self.settle:
+                return None
+        return namespace, normalized, fetch, tuple((table, markers[table]) for table in tables)
+
+    def _store(self, key, value):
+        size = len(value.encode("utf-8"))
+        if size > self.max_result_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[2]
+            self.entries[key] = (time.monotonic() + self.ttl, value, size)
+            self.size += size
+            while self.size > self.max_bytes and self.entries:
+                self.size -= self.entries.popitem(last=False)[1][2]
+                self.stats["evicted"] += 1
+
+    def call(self, namespace, command, fetch, execute, table_names, markers_source, schema=None):
+        """
+        Return execute() through the cache.
+
+        Parameters:
+        - namespace (str): Identifies the database (e.g. its URI).
+        - command (str): SQL statement.
+        - fetch (str): "all" or "one", part of the key.
+        - execute (callable): Runs the statement and returns the result text.
+        - table_names (iterable): Base tables of the database.
+        - markers_source (callable): markers_source(tables) returns (markers, server time) of the
+          referenced tables, markers None if unsupported.
+        - schema (str): Name of the database; tables qualified with another schema are not cached.
+        """
+        normalized = normalize_sql(command)
+        key = self._key(namespace, normalized, fetch, table_names, markers_source, schema) \
+            if is_cacheable(normalized) else None
+        if key is None:
+            self._count("uncacheable")
+            return execute()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() < entry[0]:
+                self.entries.move_to_end(key)
+                self.stats["hit"] += 1
+                return entry[1]
+            if entry is not None:
+                self.size -= self.entries.pop(key)[2]
+            self.stats["miss"] += 1
+        value = execute()
+        self._store(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def report(self):
+        """
+        Format the hit rate and size of the cache for the log.
+        """
+        with self.lock:
+            stats, entries, size = dict(self.stats), len(self.entries), self.size
+        lookups = stats["hit"] + stats["miss"]
+        hit_rate = stats["hit"] / lookups if lookups else 0.0
+        return (f"query cache: {stats['hit']} hit, {stats['miss']} miss ({hit_rate:.0%} hit rate), "
+                f"{stats['uncacheable']} uncacheable, {stats['evicted']} evicted, "
+                f"{entries} entries, {size / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    from datetime import datetime, timedelta
+
+    samples = ["select  count(*) from stock_price -- 行数\n where code = '002665';",
+               "SELECT COUNT(*)\nFROM stock_price WHERE code='002665'",
+               "SELECT NOW(), code FROM stock_price"]
+    for sample in samples:
+        print(repr(normalize_sql(sample)), is_cacheable(normalize_sql(sample)))
+
+    now = datetime(2023, 12, 15, 15, 0)
+    markers = {"stock_price": (now - timedelta(days=1), now - timedelta(minutes=5))}
+    cache = QueryResultCache()
+    for sample in samples[:2]:
+        print(cache.call("demo", sample, "all", lambda: "[(242,)]", ["stock_price"], lambda tables: (markers, now)))
+    markers["stock_price"] = (markers["stock_price"][0], now - timedelta(minutes=1))
+    print(cache.call("demo", samples[0], "all", lambda: "[(243,)]", ["stock_price"], lambda tables: (markers, now)))
+    print(cache.report())
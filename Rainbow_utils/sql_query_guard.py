@@ -0,0 +1,152 @@
+import re
+
+from langchain.utilities.sql_database import truncate_word
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from Rainbow_utils.sql_query_cache import normalize_sql
+
+# 聚合、排序、去重、连接等需要读完整个输入才能返回结果，追加 LIMIT 无法缩短扫描
+_BLOCKING_PATTERN = re.compile(r"\b(?:GROUP BY|ORDER BY|DISTINCT|JOIN|UNION|COUNT|SUM|AVG|MIN|MAX)\b|\(SELECT\b")
+_TRAILING_LIMIT_PATTERN = re.compile(r"\b(?:LIMIT\s*\d+(?:\s*(?:,|OFFSET)\s*\d+)?|FOR UPDATE|LOCK IN SHARE MODE)$",
+                                     re.I)
+
+
+class QueryRejected(SQLAlchemyError):
+    """
+    Raised for statements whose estimated cost exceeds the guard; the SQL tools report it to the agent.
+    """
+
+
+def is_select(command):
+    return bool(re.match(r"^(?:SELECT|WITH)\b", normalize_sql(command)))
+
+
+def estimate_rows_examined(plan):
+    """
+    Estimate the rows examined by a MySQL plan (rows of EXPLAIN as dicts).
+
+    Tables of one SELECT are joined as nested loops: every table is read once per row
+    surviving the tables before it (rows x filtered %), so cartesian joins multiply.
+    """
+    total = 0.0
+    prefixes = {}
+    for step in plan:
+        rows = float(step.get("rows") or 0)
+        filtered = float(step.get("filtered") or 100) / 100
+        prefix = prefixes.get(step.get("id"), 1.0)
+        total += prefix * rows
+        prefixes[step.get("id")] = prefix * max(rows * filtered, 1.0)
+    return total
+
+
+class QueryGuard:
+    """
+    Protect the database and the app's memory from expensive LLM-generated SELECTs.
+
+    Before execution a MySQL statement is EXPLAINed. Above max_rows_examined it is rejected
+    with a hint to narrow or aggregate it, unless it is a plain single-table scan, which
+    LIMIT stops early. Every SELECT without a trailing LIMIT is rewritten to fetch one row
+    more than max_rows. MySQL enforces MAX_EXECUTION_TIME for the statement (MariaDB
+    max_statement_time). Rows are streamed from a server-side cursor and formatted until
+    max_rows or max_bytes is reached, so a large result is never fully materialized.
+
+    Parameters:
+    - max_rows_examined (float): Largest EXPLAIN estimate accepted, 0 disables the check.
+    - max_execution_time (int): Statement timeout in milliseconds, 0 disables it.
+    - max_rows (int): Rows returned at most.
+    - max_bytes (int): Size of the returned text at most.
+    """
+
+    def __init__(self, max_rows_examined=1_000_000, max_execution_time=30_000, max_rows=100,
+                 max_bytes=16 * 1024):
+        self.max_rows_examined = max_rows_examined
+        self.max_execution_time = max_execution_time
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+
+    def _set_timeout(self, connection):
+        for statement in (f"SET SESSION MAX_EXECUTION_TIME = {int(self.max_execution_time)}",
+                          f"SET SESSION max_statement_time = {self.max_execution_time / 1000:.3f}"):
+            try:
+                connection.execute(text(statement))
+                return
+            except SQLAlchemyError:
+                continue
+        logger.warning("数据库不支持语句超时设置")
+
+    def check(self, connection, command, normalized):
+        """
+        EXPLAIN command and raise QueryRejected if it is too expensive to run even with a LIMIT.
+
+        Returns:
+        - float: Estimated rows examined.
+        """
+        plan = [{key.lower(): value for key, value in row._mapping.items()}
+                for row in connection.execute(text(f"EXPLAIN {command}"))]
+        estimate = estimate_rows_examined(plan)
+        if self.max_rows_examined and estimate > self.max_rows_examined:
+            if len(plan) > 1 or _BLOCKING_PATTERN.search(normalized):
+                tables = ", ".join(sorted({str(step["table"]) for step in plan if step.get("table")}))
+                raise QueryRejected(
+                    f"Query rejected: EXPLAIN estimates {estimate:,.0f} rows examined on {tables} "
+                    f"(limit {self.max_rows_examined:,.0f}). Add selective WHERE conditions on indexed "
+                    f"columns, make sure every join has a join condition, or aggregate (COUNT/SUM/GROUP BY) "
+                    f"in a narrower query.")
+            logger.info(f"大表扫描（估计 {estimate:,.0f} 行）以 LIMIT 执行")
+        return estimate
+
+    def run(self, engine, command, fetch="all", max_string_length=300):
+        """
+        Run a SELECT with the guard and return the result text in SQLDatabase.run() format.
+
+        Raises:
+        - QueryRejected: The plan exceeds the cost limit.
+        - sqlalchemy.exc.SQLAlchemyError: The statement failed or timed out.
+        """
+        normalized = normalize_sql(command)
+        max_rows = 1 if fetch == "one" else self.max_rows
+        statement = command.strip().rstrip(";")
+        if not _TRAILING_LIMIT_PATTERN.search(normalized):
+            # 换行后追加，避免被末尾的行注释吞掉
+            statement = f"{statement}\nLIMIT {max_rows + 1}"
+
+        with engine.connect() as connection:
+            if engine.dialect.name == "mysql":
+                if self.max_execution_time:
+                    self._set_timeout(connection)
+                self.check(connection, command.strip().rstrip(";"), normalized)
+            result = connection.execution_options(stream_results=True).execute(text(statement))
+            rows = []
+            size = 2
+            truncated = None
+            try:
+                for row in result:
+                    if len(rows) >= max_rows:
+                        truncated = f"{max_rows} rows"
+                        break
+                    formatted = repr(tuple(truncate_word(value, length=max_string_length) for value in row))
+                    if rows and size + len(formatted) + 2 > self.max_bytes:
+                        truncated = f"{self.max_bytes} bytes"
+                        break
+                    rows.append(formatted)
+                    size += len(formatted) + 2
+            finally:
+                result.close()
+        if not rows:
+            return ""
+        output = "[" + ", ".join(rows) + "]"
+        if truncated and fetch != "one":
+            output += (f"\n(Result truncated to the first {len(rows)} rows, output limit {truncated}. "
+                       f"Aggregate or filter the query if the complete result is needed.)")
+        return output
+
+
+if __name__ == "__main__":
+    # 两表笛卡尔积：每张表 1 万行
+    cartesian = [{"id": 1, "table": "a", "rows": 10000, "filtered": 100},
+                 {"id": 1, "table": "b", "rows": 10000, "filtered": 100}]
+    indexed = [{"id": 1, "table": "a", "rows": 10000, "filtered": 10},
+               {"id": 1, "table": "b", "rows": 1, "filtered": 100}]
+    print(estimate_rows_examined(cartesian), estimate_rows_examined(indexed))
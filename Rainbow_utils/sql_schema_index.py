@@ -0,0 +1,120 @@
+import hashlib
+import os
+import pickle
+import re
+import threading
+
+import numpy as np
+from loguru import logger
+
+
+def _fingerprint(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class SchemaIndex:
+    """
+    Embedding index of the tables of one database, used to pick the tables relevant to a question.
+
+    Every table is described by its name, comment, columns (types and comments) and sample
+    values (CachedSQLDatabase.describe_tables()) and embedded once. Vectors are persisted in
+    cache_path keyed by the description text, so rebuilding after a schema change or a restart
+    only embeds new or changed tables.
+
+    Parameters:
+    - embeddings (langchain Embeddings): Model with embed_documents()/embed_query().
+    - cache_path (str): Pickle file of description fingerprint -> vector, None disables persistence.
+    - sample_rows (int): Rows read per table for sample values.
+    """
+
+    def __init__(self, embeddings, cache_path=None, sample_rows=3):
+        self.embeddings = embeddings
+        self.cache_path = cache_path
+        self.sample_rows = sample_rows
+        self.table_names = []
+        self.matrix = np.zeros((0, 0))
+
+    def _load_vectors(self):
+        if self.cache_path and os.path.exists(self.cache_path):
+            try:
+                with open(self.cache_path, "rb") as cache_file:
+                    return pickle.load(cache_file)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                pass
+        return {}
+
+    def _save_vectors(self, vectors):
+        if not self.cache_path:
+            return
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        tmp_path = f"{self.cache_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as cache_file:
+            pickle.dump(vectors, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.cache_path)
+
+    def build(self, database):
+        """
+        Describe and embed every usable table of database (a CachedSQLDatabase).
+        """
+        descriptions = database.describe_tables(self.sample_rows)
+        fingerprints = {name: _fingerprint(text) for name, text in descriptions.items()}
+        vectors = self._load_vectors()
+        missing = [name for name in descriptions if fingerprints[name] not in vectors]
+        if missing:
+            embedded = self.embeddings.embed_documents([descriptions[name] for name in missing])
+            vectors.update({fingerprints[name]: np.asarray(vector, dtype=np.float32)
+                            for name, vector in zip(missing, embedded)})
+            self._save_vectors(vectors)
+        self.table_names = sorted(descriptions)
+        matrix = np.array([vectors[fingerprints[name]] for name in self.table_names], dtype=np.float32)
+        if len(matrix):
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        self.matrix = matrix
+        logger.info(f"表结构索引：{len(self.table_names)} 张表，新嵌入 {len(missing)} 张")
+        return self
+
+    def search(self, question, top_k=8):
+        """
+        Return the names of the top_k tables most similar to question.
+
+        Tables whose name appears literally in the question are always included first.
+        """
+        if not self.table_names:
+            return []
+        words = set(re.findall(r"\w+", question.lower()))
+        named = [name for name in self.table_names if name.lower() in words]
+        query = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        scores = self.matrix @ (query / max(np.linalg.norm(query), 1e-12))
+        ranked = [self.table_names[position] for position in np.argsort(-scores, kind="stable")]
+        selected = named + [name for name in ranked if name not in named]
+        return selected[:max(top_k, len(named))]
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    from sqlalchemy import text
+
+    from Rainbow_utils.sql_database_registry import SQLDatabaseRegistry
+
+    class KeywordEmbeddings:
+        # 演示用的词袋向量，实际使用 OpenAIEmbeddings/HuggingFaceEmbeddings
+        vocabulary = ["stock", "price", "close", "news", "title", "user", "order", "amount"]
+
+        def embed_documents(self, texts):
+            return [self.embed_query(text) for text in texts]
+
+        def embed_query(self, text):
+            return [text.lower().count(word) + 1e-3 for word in self.vocabulary]
+
+    with tempfile.TemporaryDirectory() as root:
+        demo_uri = f"sqlite:///{os.path.join(root, 'demo.db')}"
+        registry = SQLDatabaseRegistry()
+        with registry.engine(demo_uri).begin() as connection:
+            connection.execute(text("CREATE TABLE stock_price (code TEXT, close_price REAL)"))
+            connection.execute(text("CREATE TABLE stock_news (code TEXT, title TEXT)"))
+            connection.execute(text("CREATE TABLE user_order (user_id INT, amount REAL)"))
+        index = SchemaIndex(KeywordEmbeddings(), os.path.join(root, "vectors.pkl")).build(registry.database(demo_uri))
+        print(index.search("latest close price of each stock", top_k=1))
+        print(index.search("total order amount per user", top_k=1))
+        registry.dispose()
@@ -0,0 +1,76 @@
+"""
+Startup profile of the RainbowGPT launchpad.
+
+Imports the target module in a fresh interpreter with ``-X importtime``, prints the
+per-package cumulative import time and fails (exit code 1) when the total import time
+exceeds the startup budget.
+
+Usage:
+    python Rainbow_utils/startup_profile.py [--module RainbowGPT_Launchpad_UI] [--budget 5] [--top 25]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+
+# 默认启动时间预算（秒），可通过环境变量覆盖
+DEFAULT_STARTUP_BUDGET = float(os.getenv("RAINBOW_STARTUP_BUDGET", "8"))
+
+IMPORTTIME_PATTERN = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_imports(module_name, cwd=None):
+    """
+    Import module_name in a subprocess and collect the -X importtime report.
+
+    Args:
+    - module_name (str): Module to import.
+    - cwd (str): Working directory of the subprocess.
+
+    Returns:
+    - Tuple containing (total seconds, {top-level package: cumulative seconds}).
+    """
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+                               cwd=cwd, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module_name} failed:\n{completed.stderr[-2000:]}")
+
+    per_package = defaultdict(float)
+    total_us = 0
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if not match:
+            continue
+        cumulative_us, indent, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        # 只统计最外层的导入，避免嵌套导入重复计时
+        if indent == 1:
+            per_package[name.split(".")[0]] += cumulative_us / 1e6
+            total_us += cumulative_us
+    return total_us / 1e6, dict(per_package)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the import time of the RainbowGPT launchpad.")
+    parser.add_argument("--module", default="RainbowGPT_Launchpad_UI")
+    parser.add_argument("--budget", type=float, default=DEFAULT_STARTUP_BUDGET,
+                        help="Startup import-time budget in seconds")
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    total, per_package = profile_imports(args.module, cwd=project_root)
+
+    print(f"{'package':<40}{'seconds':>10}")
+    for name, seconds in sorted(per_package.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{name:<40}{seconds:>10.3f}")
+    print(f"{'TOTAL':<40}{total:>10.3f}  (budget {args.budget:.3f})")
+
+    if total > args.budget:
+        print(f"Startup import time {total:.3f}s exceeds the budget of {args.budget:.3f}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from Rainbow_utils.lazy_import import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+ak = lazy_import("akshare")
+
+DEFAULT_STORE_ROOT = os.getenv("RAINBOW_MARKET_DATA_DIR", "./data/market_data")
+
+# 日线字段（按年分区的 numpy 结构化数组，日期存为 YYYYMMDD 整数）
+PRICE_FIELDS = [
+    ("date", "<i4"),
+    ("open", "<f8"),
+    ("close", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("volume", "<f8"),
+    ("amount", "<f8"),
+    ("amplitude", "<f8"),
+    ("pct_change", "<f8"),
+    ("change", "<f8"),
+    ("turnover", "<f8"),
+]
+# akshare stock_zh_a_hist 的列名 -> 存储字段
+AKSHARE_COLUMNS = {
+    "日期": "date",
+    "开盘": "open",
+    "收盘": "close",
+    "最高": "high",
+    "最低": "low",
+    "成交量": "volume",
+    "成交额": "amount",
+    "振幅": "amplitude",
+    "涨跌幅": "pct_change",
+    "涨跌额": "change",
+    "换手率": "turnover",
+}
+
+_symbol_locks = {}
+_symbol_locks_guard = threading.Lock()
+
+
+def symbol_lock(key):
+    with _symbol_locks_guard:
+        return _symbol_locks.setdefault(key, threading.Lock())
+
+
+def _to_int_date(date_str):
+    return int(str(date_str).replace("-", ""))
+
+
+def _to_date_str(date_int):
+    return f"{int(date_int):08d}"
+
+
+def _shift_date(date_int, days):
+    date_object = datetime.strptime(_to_date_str(date_int), "%Y%m%d") + timedelta(days=days)
+    return int(date_object.strftime("%Y%m%d"))
+
+
+class StockPriceStore:
+    """
+    Local columnar store of A-share daily bars.
+
+    Every symbol (and adjust mode) keeps one structured numpy array per year in
+    {root}/{adjust}/{symbol}/{year}.npy plus a meta.json with the date range already
+    fetched. Reads memory-map the partitions under the symbol lock and copy out only the
+    requested window, so no mapping outlives the lock and append() can replace a partition
+    file (Windows refuses to replace a file that is still mapped). update() downloads only
+    the date ranges that are not covered yet.
+    """
+
+    def __init__(self, root=DEFAULT_STORE_ROOT):
+        self.root = root
+
+    @property
+    def dtype(self):
+        return np.dtype(PRICE_FIELDS)
+
+    def symbol_dir(self, symbol, adjust=""):
+        return os.path.join(self.root, adjust or "none", str(symbol))
+
+    def _meta_path(self, symbol, adjust):
+        return os.path.join(self.symbol_dir(symbol, adjust), "meta.json")
+
+    def load_meta(self, symbol, adjust=""):
+        meta_path = self._meta_path(symbol, adjust)
+        if not os.path.exists(meta_path):
+            return {}
+        with open(meta_path, "r", encoding="utf-8") as meta_file:
+            return json.load(meta_file)
+
+    def _save_meta(self, symbol, adjust, meta):
+        meta_path = self._meta_path(symbol, adjust)
+        tmp_path = meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as meta_file:
+            json.dump(meta, meta_file)
+        os.replace(tmp_path, meta_path)
+
+    def symbols(self, adjust=""):
+        """
+        List the symbols that have data in the store.
+        """
+        adjust_dir = os.path.join(self.root, adjust or "none")
+        if not os.path.isdir(adjust_dir):
+            return []
+        return sorted(name for name in os.listdir(adjust_dir)
+                      if os.path.isdir(os.path.join(adjust_dir, name)))
+
+    def years(self, symbol, adjust=""):
+        symbol_dir = self.symbol_dir(symbol, adjust)
+        if not os.path.isdir(symbol_dir):
+            return []
+        return sorted(int(name[:-4]) for name in os.listdir(symbol_dir)
+                      if name.endswith(".npy") and name[:-4].isdigit())
+
+    def read_year(self, symbol, year, adjust=""):
+        """
+        Memory-map the partition of one year; returns an empty array when it does not exist.
+
+        The caller must hold symbol_lock((symbol, adjust)) and drop the map before releasing it.
+        """
+        path = os.path.join(self.symbol_dir(symbol, adjust), f"{year}.npy")
+        if not os.path.exists(path):
+            return np.empty(0, dtype=self.dtype)
+        return np.load(path, mmap_mode="r")
+
+    def read_arrays(self, symbol, start_date, end_date, adjust=""):
+        """
+        Return the slices (one per year partition) covering [start_date, end_date].
+
+        Parameters:
+        - symbol (str): Stock code, e.g. 002665.
+        - start_date (str): YYYYMMDD.
+        - end_date (str): YYYYMMDD.
+        - adjust (str): akshare adjust mode ("", "qfq", "hfq").
+
+        Returns:
+        - list of numpy structured arrays, copied out of the memory-mapped partitions.
+        """
+        start, end = _to_int_date(start_date), _to_int_date(end_date)
+        slices = []
+        with symbol_lock((symbol, adjust)):
+            for year in self.years(symbol, adjust):
+                if year < start // 10000 or year > end // 10000:
+                    continue
+                bars = self.read_year(symbol, year, adjust)
+                left = np.searchsorted(bars["date"], start, side="left")
+                right = np.searchsorted(bars["date"], end, side="right")
+                if right > left:
+                    slices.append(np.array(bars[left:right]))
+                del bars
+        return slices
+
+    def read(self, symbol, start_date, end_date, adjust=""):
+        """
+        Return the bars of [start_date, end_date] as one structured array.
+
+        Only the pages of the window are read from the partitions; windows spanning several
+        years are concatenated.
+        """
+        slices = self.read_arrays(symbol, start_date, end_date, adjust)
+        if not slices:
+            return np.empty(0, dtype=self.dtype)
+        if len(slices) == 1:
+            return slices[0]
+        return np.concatenate(slices)
+
+    def read_frame(self, symbol, start_date, end_date, adjust=""):
+        """
+        Return the bars of [start_date, end_date] as a DataFrame with the akshare column names.
+        """
+        bars = self.read(symbol, start_date, end_date, adjust)
+        frame = pd.DataFrame({column: bars[field] for column, field in AKSHARE_COLUMNS.items()})
+        frame["日期"] = pd.to_datetime(frame["日期"].astype(str), format="%Y%m%d").dt.date
+        return frame
+
+    def frame_to_bars(self, frame):
+        """
+        Convert an akshare stock_zh_a_hist DataFrame into a sorted structured array.
+        """
+        bars = np.zeros(len(frame), dtype=self.dtype)
+        for column, field in AKSHARE_COLUMNS.items():
+            if column not in frame.columns:
+                continue
+            if field == "date":
+                bars[field] = pd.to_datetime(frame[column]).dt.strftime("%Y%m%d").astype(int).to_numpy()
+            else:
+                bars[field] = pd.to_numeric(frame[column], errors="coerce").to_numpy(dtype="f8")
+        return np.sort(bars, order="date")
+
+    def append(self, symbol, frame, adjust=""):
+        """
+        Merge new bars into the year partitions; bars of an existing date are replaced.
+        """
+        new_bars = self.frame_to_bars(frame)
+        if len(new_bars) == 0:
+            return
+        symbol_dir = self.symbol_dir(symbol, adjust)
+        os.makedirs(symbol_dir, exist_ok=True)
+        for year in np.unique(new_bars["date"] // 10000):
+            year_bars = new_bars[new_bars["date"] // 10000 == year]
+            existing = np.array(self.read_year(symbol, int(year), adjust))
+            existing = existing[~np.isin(existing["date"], year_bars["date"])]
+            merged = np.sort(np.concatenate([existing, year_bars]), order="date")
+            path = os.path.join(symbol_dir, f"{int(year)}.npy")
+            tmp_path = path + ".tmp.npy"
+            np.save(tmp_path, merged)
+            os.replace(tmp_path, path)
+
+    def missing_ranges(self, symbol, start_date, end_date, adjust=""):
+        """
+        Return the (start, end) YYYYMMDD ranges to fetch so that [start_date, end_date] is covered.
+        """
+        start, end = _to_int_date(start_date), _to_int_date(end_date)
+        meta = self.load_meta(symbol, adjust)
+        if not meta:
+            return [(_to_date_str(start), _to_date_str(end))]
+        covered_start, covered_end = int(meta["start"]), int(meta["end"])
+        # 已覆盖范围始终保持连续，请求区间与其不相邻时连同中间的空档一起获取
+        ranges = []
+        if start < covered_start:
+            ranges.append((_to_date_str(start), _to_date_str(_shift_date(covered_start, -1))))
+        if end > covered_end:
+            ranges.append((_to_date_str(_shift_date(covered_end, 1)), _to_date_str(end)))
+        return ranges
+
+    def update(self, symbol, start_date, end_date, adjust="", fetch=None):
+        """
+        Fetch only the missing date ranges of [start_date, end_date] and append them.
+
+        Parameters:
+        - symbol (str): Stock code.
+        - start_date (str): YYYYMMDD.
+        - end_date (str): YYYYMMDD.
+        - adjust (str): akshare adjust mode.
+        - fetch (callable): fetch(symbol, start_date, end_date, adjust) -> DataFrame,
+          defaults to ak.stock_zh_a_hist.
+
+        Returns:
+        - int: Number of network calls made.
+        """
+        if fetch is None:
+            def fetch(symbol, start_date, end_date, adjust):
+                return ak.stock_zh_a_hist(symbol=symbol, period="daily", start_date=start_date,
+                                          end_date=end_date, adjust=adjust)
+
+        with symbol_lock((symbol, adjust)):
+            ranges = self.missing_ranges(symbol, start_date, end_date, adjust)
+            meta = self.load_meta(symbol, adjust)
+            today = int(datetime.now().strftime("%Y%m%d"))
+            covered = dict(meta)
+            for range_start, range_end in ranges:
+                frame = fetch(symbol, range_start, range_end, adjust)
+                if frame is None or not len(frame):
+                    # 空结果可能是停牌、节假日，也可能是接口临时失败，不计入已覆盖范围，下次重新获取
+                    continue
+                self.append(symbol, frame, adjust)
+                # 当天的K线可能尚未收盘，不计入已覆盖范围，下次会重新获取
+                range_end = min(_to_int_date(range_end), _shift_date(today, -1))
+                if range_end < _to_int_date(range_start):
+                    # 只获取到今天的K线，没有已收盘的日期可计入覆盖范围
+                    continue
+                if not covered:
+                    covered = {"start": range_start, "end": _to_date_str(range_end)}
+                elif _to_int_date(range_start) < int(covered["start"]):
+                    covered["start"] = range_start
+                else:
+                    covered["end"] = _to_date_str(max(range_end, int(covered["end"])))
+            if covered != meta:
+                os.makedirs(self.symbol_dir(symbol, adjust), exist_ok=True)
+                self._save_meta(symbol, adjust, covered)
+            return len(ranges)
+
+    def get_daily_bars(self, symbol, start_date, end_date, adjust="", fetch=None):
+        """
+        Drop-in replacement of ak.stock_zh_a_hist(period="daily") backed by the local store.
+        """
+        self.update(symbol, start_date, end_date, adjust, fetch=fetch)
+        return self.read_frame(symbol, start_date, end_date, adjust)
+
+
+if __name__ == "__main__":
+    store = StockPriceStore()
+    print(store.get_daily_bars("002665", "20230805", "20231212"))
+    print(store.read_arrays("002665", "20231101", "20231130"))
@@ -0,0 +1,230 @@
+import ast
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from Rainbow_utils import indicator_engine
+from Rainbow_utils.lazy_import import lazy_import
+
+pd = lazy_import("pandas")
+
+SCREEN_FIELDS = ("open", "high", "low", "close", "volume", "amount", "turnover")
+
+# 预置选股条件：筛选表达式及排序得分表达式
+PRESET_SCREENS = {
+    "macd_golden_cross": {
+        "filter": "cross_over(MACD, SIGNAL)",
+        "score": "(MACD - SIGNAL) / close",
+    },
+    "rsi_oversold": {
+        "filter": "RSI < 30",
+        "score": "30 - RSI",
+    },
+    "above_ma20_volume_spike": {
+        "filter": "(close > ma(close, 20)) & (ref(close, 1) <= ref(ma(close, 20), 1)) "
+                  "& (volume > 2 * ref(ma(volume, 20), 1))",
+        "score": "volume / ref(ma(volume, 20), 1)",
+    },
+    "boll_lower_rebound": {
+        "filter": "(ref(close, 1) < ref(BOLL_LOWER, 1)) & (close > BOLL_LOWER)",
+        "score": "(close - BOLL_LOWER) / close",
+    },
+}
+
+
+def ref(values, periods=1):
+    """
+    Value periods bars earlier (bars of each symbol, suspensions skipped), NaN before the first bar.
+    """
+    shifted = np.full(values.shape, np.nan)
+    if periods < values.shape[-1]:
+        shifted[..., periods:] = values[..., :values.shape[-1] - periods]
+    return shifted
+
+
+def cross_over(fast, slow):
+    return (fast > slow) & (ref(fast) <= ref(slow))
+
+
+def cross_under(fast, slow):
+    return (fast < slow) & (ref(fast) >= ref(slow))
+
+
+def change(values, periods=1):
+    """
+    Percentage change over periods bars.
+    """
+    return (values / ref(values, periods) - 1) * 100
+
+
+# 表达式中可用的函数
+SCREEN_FUNCTIONS = {
+    "ma": indicator_engine.rolling_mean,
+    "ema": indicator_engine.ema,
+    "std": indicator_engine.rolling_std,
+    "hhv": indicator_engine.rolling_max,
+    "llv": indicator_engine.rolling_min,
+    "ref": ref,
+    "change": change,
+    "cross_over": cross_over,
+    "cross_under": cross_under,
+    "abs": np.abs,
+    "maximum": np.maximum,
+    "minimum": np.minimum,
+}
+_ALLOWED_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.BoolOp, ast.Call, ast.Name, ast.Load,
+                  ast.Constant, ast.operator, ast.unaryop, ast.cmpop, ast.boolop)
+
+
+def compile_expression(expression):
+    """
+    Compile a screen expression, allowing only arithmetic, comparisons and SCREEN_FUNCTIONS calls.
+
+    Raises:
+    - ValueError: The expression contains attribute access, subscripts or other constructs.
+    """
+    tree = ast.parse(expression, mode="eval")
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ValueError(f"Unsupported syntax in screen expression: {type(node).__name__}")
+        if isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name) and node.func.id in SCREEN_FUNCTIONS):
+            raise ValueError(f"Unknown function in screen expression: {ast.unparse(node.func)}")
+    return compile(tree, "<screen>", "eval")
+
+
+class MarketPanel:
+    """
+    Daily bars and indicators of many symbols as dense (symbols, bars) arrays.
+
+    Every row holds the bars of one symbol left-aligned in trading order (suspension days
+    removed, see indicator_engine.pack), so ref(x, 1) is always the previous bar of the same
+    symbol and the latest bar of a row is at column lengths - 1.
+
+    Parameters:
+    - symbols (list): Symbols of the rows.
+    - dates (numpy.ndarray): Packed bar dates, shape (symbols, bars).
+    - arrays (dict): Field or indicator name -> packed array.
+    - lengths (numpy.ndarray): Number of bars of each symbol.
+    """
+
+    def __init__(self, symbols, dates, arrays, lengths):
+        self.symbols = symbols
+        self.dates = dates
+        self.arrays = arrays
+        self.lengths = lengths
+
+    @classmethod
+    def from_store(cls, store, start_date, end_date, adjust="", symbols=None, max_workers=8, **params):
+        """
+        Load symbols (default: every symbol in the store) and compute the indicators in one pass.
+        """
+        symbols = list(symbols) if symbols is not None else store.symbols(adjust)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            bars = list(executor.map(lambda symbol: store.read(symbol, start_date, end_date, adjust), symbols))
+        symbols, dates, arrays, mask = indicator_engine.stack_bars(dict(zip(symbols, bars)), SCREEN_FIELDS)
+        indicators = indicator_engine.compute_indicators(arrays["high"], arrays["low"], arrays["close"], mask,
+                                                         **params)
+        mask = mask & ~np.isnan(arrays["close"])
+        arrays.update(indicators)
+        packed_dates, order, valid = indicator_engine.pack(np.broadcast_to(dates.astype(float), mask.shape), mask)
+        packed = {name: np.take_along_axis(values, order, axis=1) for name, values in arrays.items()}
+        packed = {name: np.where(valid, values, np.nan) for name, values in packed.items()}
+        return cls(symbols, packed_dates, packed, valid.sum(axis=1))
+
+    def latest(self, values):
+        """
+        Value at the latest bar of every symbol (NaN for symbols without bars).
+        """
+        values = np.broadcast_to(values, self.dates.shape)
+        columns = np.maximum(self.lengths - 1, 0)
+        latest = values[np.arange(len(self.symbols)), columns]
+        if latest.dtype == bool:
+            return latest & (self.lengths > 0)
+        return np.where(self.lengths > 0, latest, np.nan)
+
+    def evaluate(self, expression):
+        """
+        Evaluate an expression over all symbols and bars.
+        """
+        namespace = dict(SCREEN_FUNCTIONS, **self.arrays)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return eval(compile_expression(expression), {"__builtins__": {}}, namespace)
+
+    def screen(self, filter_expression, score_expression=None, top_n=20, min_bars=60, latest_only=True):
+        """
+        Select the symbols whose latest bar satisfies filter_expression, ranked by score_expression.
+
+        Parameters:
+        - filter_expression (str): Boolean expression, e.g. "cross_over(MACD, SIGNAL) & (RSI < 50)".
+        - score_expression (str): Ranking expression (higher first); defaults to the latest change in %.
+        - top_n (int): Number of candidates returned.
+        - min_bars (int): Minimum history of a symbol.
+        - latest_only (bool): Skip symbols without a bar on the latest market date (suspended).
+
+        Returns:
+        - pandas.DataFrame: symbol, date, close, pct_change and score of the candidates.
+        """
+        selected = self.latest(np.asarray(self.evaluate(filter_expression), dtype=bool))
+        selected &= self.lengths >= min_bars
+        latest_dates = self.latest(self.dates)
+        if latest_only and len(self.symbols):
+            selected &= latest_dates == np.nanmax(latest_dates)
+        close = self.arrays["close"]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            scores = self.latest(self.evaluate(score_expression or "change(close)"))
+            pct_change = self.latest(change(close))
+        rows = np.flatnonzero(selected)
+        rows = rows[np.argsort(-np.nan_to_num(scores[rows], nan=-np.inf), kind="stable")][:top_n]
+        return pd.DataFrame({
+            "symbol": [self.symbols[row] for row in rows],
+            "date": [str(int(latest_dates[row])) for row in rows],
+            "close": self.latest(close)[rows],
+            "pct_change": pct_change[rows],
+            "score": scores[rows],
+        })
+
+
+def sync_price_store(store, symbols, start_date, end_date, adjust="", max_workers=8, fetch=None):
+    """
+    Bring the local store up to date for many symbols (only missing ranges are downloaded).
+
+    Returns:
+    - dict: symbol -> error message of the symbols that failed.
+    """
+    def update(symbol):
+        try:
+            store.update(symbol, start_date, end_date, adjust, fetch=fetch)
+        except Exception as e:
+            return symbol, str(e)
+        return symbol, None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return {symbol: error for symbol, error in executor.map(update, symbols) if error}
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    from Rainbow_utils.stock_price_store import StockPriceStore
+
+    # 基准测试：5000 只股票 x 250 个交易日的本地存储
+    random = np.random.RandomState(11)
+    dates = pd.bdate_range("2023-01-02", periods=250)
+    with tempfile.TemporaryDirectory() as root:
+        store = StockPriceStore(root)
+        for i in range(5000):
+            close = 10 * np.exp(np.cumsum(random.normal(0, 0.02, len(dates))))
+            frame = pd.DataFrame({"日期": dates, "开盘": close, "收盘": close, "最高": close * 1.01,
+                                  "最低": close * 0.99, "成交量": random.randint(1e4, 1e6, len(dates)),
+                                  "成交额": close * 1e6, "振幅": 2.0, "涨跌幅": 0.0, "涨跌额": 0.0, "换手率": 1.0})
+            store.append(f"{i:06d}", frame)
+        start_time = time.perf_counter()
+        panel = MarketPanel.from_store(store, "20230101", "20231231")
+        load_elapsed = time.perf_counter() - start_time
+        for name, preset in PRESET_SCREENS.items():
+            start_time = time.perf_counter()
+            result = panel.screen(preset["filter"], preset["score"], top_n=5)
+            print(f"{name}: {len(result)} candidates in {(time.perf_counter() - start_time) * 1000:.0f} ms")
+            print(result.to_string(index=False))
+        print(f"loaded {len(panel.symbols)} symbols with indicators in {load_elapsed:.2f} s")
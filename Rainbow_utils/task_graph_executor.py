@@ -0,0 +1,159 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from loguru import logger
+
+# 任务状态
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_TIMEOUT = "timeout"
+STATUS_SKIPPED = "skipped"
+
+
+class TaskGraphExecutor:
+    """
+    A small deadline-driven task-graph executor.
+
+    Each task is a callable with an optional list of dependencies, its own timeout and a
+    default value. Independent tasks run concurrently in a thread pool; a task starts once
+    all of its dependencies finished successfully and receives their results as positional
+    arguments (in the order the dependencies were declared). A task that fails, exceeds its
+    own timeout or the global latency budget is abandoned and resolves to its default value,
+    and tasks depending on it are skipped. run() therefore never blocks longer than the
+    global budget, whatever the branches do.
+
+    Parameters:
+    - name (str): Name of the graph, used in the timing log.
+    - total_timeout (float): Global latency budget in seconds.
+    - max_workers (int): Maximum number of concurrently running tasks.
+    """
+
+    def __init__(self, name="task_graph", total_timeout=30.0, max_workers=None):
+        self.name = name
+        self.total_timeout = total_timeout
+        self.max_workers = max_workers
+        self.tasks = {}
+        self.results = {}
+        self.status = {}
+        self.timings = {}
+        self.errors = {}
+
+    def add_task(self, name, func, deps=(), timeout=None, default=None):
+        """
+        Register a task in the graph.
+
+        Parameters:
+        - name (str): Unique task name.
+        - func (callable): Called with the results of deps as positional arguments.
+        - deps (iterable): Names of the tasks this task depends on.
+        - timeout (float): Per-task timeout in seconds, None means only the global budget applies.
+        - default: Result used when the task fails, times out or is skipped.
+
+        Returns:
+        - TaskGraphExecutor: self, so calls can be chained.
+        """
+        if name in self.tasks:
+            raise ValueError(f"Duplicate task name: {name}")
+        for dep in deps:
+            if dep not in self.tasks:
+                raise ValueError(f"Task {name} depends on unknown task: {dep}")
+        self.tasks[name] = {"func": func, "deps": tuple(deps), "timeout": timeout, "default": default}
+        return self
+
+    def _finish(self, name, status, result=None, error=None, elapsed=0.0):
+        task = self.tasks[name]
+        self.status[name] = status
+        self.results[name] = result if status == STATUS_OK else task["default"]
+        self.timings[name] = elapsed
+        if error is not None:
+            self.errors[name] = error
+
+    def run(self):
+        """
+        Run all registered tasks within the global latency budget.
+
+        Returns:
+        - dict: Task name -> result (or the task's default value when it did not succeed).
+        """
+        self.results, self.status, self.timings, self.errors = {}, {}, {}, {}
+        graph_start = time.monotonic()
+        graph_deadline = graph_start + self.total_timeout
+        pending = list(self.tasks)
+        running = {}
+        executor = ThreadPoolExecutor(max_workers=self.max_workers or max(len(self.tasks), 1),
+                                      thread_name_prefix=self.name)
+        try:
+            while pending or running:
+                # 提交依赖已满足的任务，依赖失败的任务直接跳过
+                for name in list(pending):
+                    deps = self.tasks[name]["deps"]
+                    if any(dep in self.status and self.status[dep] != STATUS_OK for dep in deps):
+                        pending.remove(name)
+                        self._finish(name, STATUS_SKIPPED)
+                    elif all(self.status.get(dep) == STATUS_OK for dep in deps):
+                        pending.remove(name)
+                        task = self.tasks[name]
+                        started_at = time.monotonic()
+                        deadline = graph_deadline
+                        if task["timeout"] is not None:
+                            deadline = min(deadline, started_at + task["timeout"])
+                        args = [self.results[dep] for dep in deps]
+                        future = executor.submit(task["func"], *args)
+                        running[future] = (name, started_at, deadline)
+
+                if not running:
+                    if pending:
+                        # 剩余任务的依赖永远无法满足
+                        for name in pending:
+                            self._finish(name, STATUS_SKIPPED)
+                        pending = []
+                    break
+
+                now = time.monotonic()
+                next_deadline = min(deadline for _, _, deadline in running.values())
+                done, _ = wait(list(running), timeout=max(next_deadline - now, 0), return_when=FIRST_COMPLETED)
+
+                now = time.monotonic()
+                for future in done:
+                    name, started_at, _ = running.pop(future)
+                    try:
+                        self._finish(name, STATUS_OK, result=future.result(), elapsed=now - started_at)
+                    except Exception as e:
+                        self._finish(name, STATUS_FAILED, error=e, elapsed=now - started_at)
+                # 超时的分支直接放弃，不再等待其线程结束
+                for future, (name, started_at, deadline) in list(running.items()):
+                    if now >= deadline:
+                        running.pop(future)
+                        future.cancel()
+                        self._finish(name, STATUS_TIMEOUT, elapsed=now - started_at)
+
+                if now >= graph_deadline:
+                    for name in pending:
+                        self._finish(name, STATUS_TIMEOUT)
+                    pending = []
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        self.log_timings(time.monotonic() - graph_start)
+        return self.results
+
+    def log_timings(self, total_elapsed):
+        """
+        Log the status and elapsed time of every task.
+        """
+        lines = [f"{self.name} finished in {total_elapsed:.2f}s (budget {self.total_timeout:.2f}s)"]
+        for name in self.tasks:
+            status = self.status.get(name, STATUS_SKIPPED)
+            line = f"  {name}: {status} {self.timings.get(name, 0.0):.2f}s"
+            if name in self.errors:
+                line += f" ({self.errors[name]})"
+            lines.append(line)
+        logger.info("\n".join(lines))
+
+
+if __name__ == "__main__":
+    graph = TaskGraphExecutor(name="demo", total_timeout=2)
+    graph.add_task("fast", lambda: "fast result", timeout=1)
+    graph.add_task("slow", lambda: time.sleep(5) or "slow result", timeout=1, default="")
+    graph.add_task("combine", lambda fast: fast.upper(), deps=["fast"])
+    print(graph.run())
@@ -0,0 +1,143 @@
+import csv
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+
+class RateLimiter:
+    """
+    Limit the call rate and concurrency of an API shared by several worker threads.
+
+    Use as a context manager around each call: at most max_concurrent calls run at the same
+    time and consecutive calls start at least 60 / calls_per_minute seconds apart.
+
+    Parameters:
+    - calls_per_minute (float): Maximum number of call starts per minute, 0 disables the rate limit.
+    - max_concurrent (int): Maximum number of calls in flight.
+    """
+
+    def __init__(self, calls_per_minute=20, max_concurrent=2):
+        self.interval = 60.0 / calls_per_minute if calls_per_minute else 0.0
+        self.semaphore = threading.BoundedSemaphore(max_concurrent)
+        self.lock = threading.Lock()
+        self.next_start = 0.0
+
+    def __enter__(self):
+        self.semaphore.acquire()
+        with self.lock:
+            now = time.monotonic()
+            start_at = max(now, self.next_start)
+            self.next_start = start_at + self.interval
+        if start_at > now:
+            time.sleep(start_at - now)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.semaphore.release()
+        return False
+
+
+def guess_market(symbol):
+    """
+    Guess the exchange (sh, sz or bj) of an A-share code from its prefix.
+    """
+    if symbol.startswith(("6", "9")):
+        return "sh"
+    if symbol.startswith(("4", "8")):
+        return "bj"
+    return "sz"
+
+
+def load_watchlist(path):
+    """
+    Read a watchlist CSV with the columns symbol, stock_name, market and concept.
+
+    Parameters:
+    - path (str): Path of the CSV file (utf-8, a BOM is allowed).
+
+    Returns:
+    - list of dict, one per symbol, in file order and without duplicates.
+    """
+    watchlist = []
+    seen = set()
+    with open(path, "r", encoding="utf-8-sig", newline="") as watchlist_file:
+        for row in csv.DictReader(watchlist_file):
+            # 股票代码统一补齐为 6 位，未填写市场时按代码前缀推断
+            symbol = (row.get("symbol") or "").strip()
+            if not symbol or symbol.zfill(6) in seen:
+                continue
+            symbol = symbol.zfill(6)
+            seen.add(symbol)
+            market = (row.get("market") or "").strip().lower() or guess_market(symbol)
+            watchlist.append({
+                "symbol": symbol,
+                "stock_name": (row.get("stock_name") or symbol).strip(),
+                "market": market,
+                "concept": (row.get("concept") or "").strip(),
+            })
+    return watchlist
+
+
+class BatchProgress:
+    """
+    Append-only progress log of a batch run, so an interrupted batch can be restarted.
+
+    Every finished symbol is appended to progress.jsonl in the batch directory; a restarted
+    batch skips the symbols already recorded as done.
+
+    Parameters:
+    - output_dir (str): Directory of the batch reports.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, "progress.jsonl")
+        self.lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+
+    def completed(self):
+        """
+        Return the symbols already analyzed successfully.
+        """
+        if not os.path.exists(self.path):
+            return set()
+        done = set()
+        with open(self.path, "r", encoding="utf-8") as progress_file:
+            for line in progress_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 进程中断时可能留下不完整的最后一行
+                    continue
+                if record.get("status") == "done":
+                    done.add(record["symbol"])
+        return done
+
+    def write_report(self, file_name, content):
+        """
+        Write one report atomically into the batch directory and return its path.
+        """
+        path = os.path.join(self.output_dir, file_name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as report_file:
+            report_file.write(content)
+        os.replace(tmp_path, path)
+        return path
+
+    def record(self, symbol, status, **details):
+        record = {"symbol": symbol, "status": status, "time": datetime.now().isoformat(timespec="seconds")}
+        record.update(details)
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as progress_file:
+                progress_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                progress_file.flush()
+
+
+if __name__ == "__main__":
+    limiter = RateLimiter(calls_per_minute=120, max_concurrent=2)
+    start_time = time.monotonic()
+    for i in range(3):
+        with limiter:
+            print(f"call {i} at {time.monotonic() - start_time:.2f}s")